@@ -1,156 +1,175 @@
-import os
-import sys
-
-# Suppress stdout and stderr
-sys.stdout = open(os.devnull, "w")
-sys.stderr = open(os.devnull, "w")
-
-import copy
+import math
 import numpy as np
-import pygame
 from Game2048 import Game2048
-from Game2048 import (
-    WIDTH,
-    HEIGHT,
-)
+from HeuristicGame2048 import HeuristicGame2048
+from JitEngine import LineScore, rollout_simulator
+from RolloutPolicy import RANDOM, RandomPolicy
+from TableHeuristic import TableHeuristic
+from EvalCache import EvalCache, is_symmetric
 from joblib import Parallel, delayed
 import time
 
-# Restore stdout and stderr after imports
-sys.stdout = sys.__stdout__
-sys.stderr = sys.__stderr__
+# Anytime search with a time budget: rollouts given to every remaining first
+# move per batch, and how many standard errors a move must lead by to stop the
+# search early
+ANYTIME_ROUND_ROLLOUTS = 10
+ANYTIME_CONFIDENCE = 2.0
 
 
 class AdvancedMonteCarloAgent:
-    def random_move(self, game):
-        moves = game.get_valid_moves()
-        if moves:
-            return np.random.choice(moves)
-        return None
-
-    def heuristic_score(self, game):
-        board = game.get_state()
-        empty_cells = np.sum(board == 0)
-        max_tile = np.max(board)
-
-        def monotonicity(board):
-            def check_line(line):
-                score = 0
-                for i in range(1, len(line)):
-                    if line[i] > line[i - 1]:
-                        score += line[i] - line[i - 1]
-                    elif line[i] < line[i - 1]:
-                        score += line[i - 1] - line[i]
-                return score
-
-            score = 0
-            for i in range(4):
-                score += check_line(board[i, :]) + check_line(board[:, i])
-
-            return score
-
-        def smoothness(board):
-            score = 0
-            for i in range(4):
-                for j in range(4):
-                    if board[i, j] == 0:
-                        continue
-                    value = np.log2(board[i, j])
-                    for direction in [(0, 1), (1, 0)]:
-                        next_i, next_j = i + direction[0], j + direction[1]
-                        if (
-                            0 <= next_i < 4
-                            and 0 <= next_j < 4
-                            and board[next_i, next_j] > 0
-                        ):
-                            next_value = np.log2(board[next_i, next_j])
-                            score -= abs(value - next_value)
-            return score
-
-        def weighted_tiles(board):
-            weight_matrix = np.array(
-                [
-                    [1, 1, 1, 1],
-                    [1, 1, 1, 1],
-                    [1, 1, 1, 1],
-                    [1, 1, 1, 1],
-                    # [7, 6, 5, 4],
-                    # [6, 5, 4, 3],
-                    # [5, 4, 3, 2],
-                    # [4, 3, 2, 1]
-                    # [4**6, 4**5, 4**4, 4**3],
-                    # [4**5, 4**4, 4**3, 4**2],
-                    # [4**4, 4**3, 4**2, 4**1],
-                    # [4**3, 4**2, 4**1, 4**0]
-                    # [4**15, 4**14, 4**13, 4**12],
-                    # [4**8, 4**9, 4**10, 4**11],
-                    # [4**7, 4**6, 4**5, 4**4],
-                    # [4**0, 4**1, 4**2, 4**3]
-                ]
+    def __init__(
+        self,
+        weights=None,
+        weight_matrix=None,
+        parallel=None,
+        rng=None,
+        anytime=False,
+        time_budget=None,
+        incremental=False,
+        cache_bytes=None,
+        size=4,
+        rollout_policy=None,
+        batch=False,
+    ):
+        # See TableHeuristic.DEFAULT_WEIGHTS for the component names. Boards
+        # other than 4x4 (``size``) are scored without the packed tables and
+        # only support move(), not the batch or anytime searches
+        self.evaluator = TableHeuristic(weights, weight_matrix, size)
+        # The same heuristic as tables for the JIT rollout kernel
+        self.line_score = None
+        if size == 4:
+            self.line_score = LineScore.from_heuristic(self.evaluator)
+        # Optional shared worker pool (e.g. a joblib Parallel) for move-level
+        # parallelism; None runs the first moves one after the other
+        self.parallel = parallel
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # With anytime=True, move() spends its searches_per_move budget (or
+        # time_budget seconds per move, if given) through anytime_move
+        self.anytime = anytime
+        self.time_budget = time_budget
+        # With batch=True, move() simulates all rollouts of a decision in one
+        # batch through batch_move
+        self.batch = batch
+        self.last_rollouts = 0
+        # With incremental=True, rollouts play on a HeuristicGame2048
+        self.incremental = incremental
+        # With cache_bytes, heuristic_score goes through a bounded cache that
+        # shares entries between symmetric boards when the weights allow it
+        self.eval_cache = None
+        if cache_bytes is not None:
+            self.eval_cache = EvalCache(
+                self.evaluator.score,
+                cache_bytes,
+                symmetric=is_symmetric(self.evaluator.weight_matrix),
             )
-            score = np.sum(weight_matrix * board)
-            return score
-
-        def clustering_penalty(board):
-            penalty = 0
-            for i in range(4):
-                for j in range(4):
-                    if board[i, j] > 0:
-                        penalty += min(
-                            [
-                                abs(board[i, j] - board[i + di, j + dj])
-                                for di in [-1, 0, 1]
-                                for dj in [-1, 0, 1]
-                                if 0 <= i + di < 4
-                                and 0 <= j + dj < 4
-                                and (di != 0 or dj != 0)
-                            ]
-                        )
-            return penalty
-
-        # Weighted sum of heuristic components
-        heuristic = (
-            (0.4 * empty_cells)
-            + (1.2 * max_tile)
-            - (0.2 * monotonicity(board))
-            + (0.3 * smoothness(board))
-            + (0.5 * weighted_tiles(board))
-            - (0.4 * clustering_penalty(board))
+        # Picks the moves of every rollout, uniformly random by default (see
+        # RolloutPolicy.py)
+        self.rollout_policy = (
+            rollout_policy if rollout_policy is not None else RandomPolicy()
         )
+        if size != 4:
+            if self.rollout_policy.kind != RANDOM:
+                raise ValueError(
+                    "Only RandomPolicy rollouts run on boards other than 4x4"
+                )
+            if anytime or incremental or batch:
+                raise ValueError(
+                    "anytime, incremental and batch only run on 4x4 boards, "
+                    f"not {size}x{size}"
+                )
+
+    def _check_packed(self, game, method):
+        # The batch searches play packed 4x4 boards on the heuristic tables
+        if self.line_score is None or game.size != 4:
+            raise ValueError(f"{method} only runs on 4x4 boards")
+
+    def __getstate__(self):
+        # The pool belongs to the parent process, workers always run serially
+        state = self.__dict__.copy()
+        state["parallel"] = None
+        return state
+
+    def rollout_game(self, game, rng):
+        # A HeuristicGame2048 copy keeps the heuristic components up to date
+        # as the rollouts play on it, instead of rescanning every board
+        if self.incremental:
+            return HeuristicGame2048.from_game(game, self.evaluator, rng)
+        return game.clone(rng=rng)
 
-        return heuristic
+    def heuristic_score(self, game):
+        if game.size != 4:
+            return self.evaluator.score_board(game.board)
+        if isinstance(game, HeuristicGame2048) and game.evaluator is self.evaluator:
+            return game.heuristic_score()
+        if self.eval_cache is not None:
+            return self.eval_cache(game.get_packed_state())
+        return self.evaluator.score(game.get_packed_state())
+
+    def batch_heuristic_score(self, boards):
+        # heuristic_score for a (N,) array of packed boards
+        return self.evaluator.batch_score(boards)
 
     def simulate(self, game, search_length):
-        simulated_game = copy.deepcopy(game)
+        # Play on the given game and undo afterwards instead of copying it
+        snapshot = game.snapshot()
         total_score = 0
 
         for _ in range(search_length):
-            move = self.random_move(simulated_game)
+            move = self.rollout_policy(game)
             if move:
-                simulated_game.move(move)
-                total_score += self.heuristic_score(simulated_game)
+                game.move(move)
+                total_score += self.heuristic_score(game)
             else:
                 break  # No valid move, game over
 
+        game.restore(snapshot)
+        return total_score
+
+    def simulate_move(self, game, move, rng, searches_per_move, search_length):
+        # Total score of the rollouts after the first move ``move``. A method
+        # rather than a closure, so a pool task pickles only the agent (whose
+        # tables are rebuilt in the worker) and the game
+        total_score = 0
+        cloned_game = self.rollout_game(game, rng)
+        snapshot = cloned_game.snapshot()
+        for _ in range(searches_per_move):
+            cloned_game.move(move)
+            score = self.simulate(cloned_game, search_length)
+            total_score += score
+            cloned_game.restore(snapshot)
         return total_score
 
     def move(self, game, searches_per_move, search_length):
+        if self.anytime:
+            return self.anytime_move(
+                game,
+                search_length,
+                searches_per_move * len(game.get_valid_moves()),
+                self.time_budget,
+            )
+        if self.batch:
+            return self.batch_move(game, searches_per_move, search_length)
+
         first_moves = game.get_valid_moves()
         scores = np.zeros(len(first_moves))
 
-        def simulate_move(move):
-            total_score = 0
-            for _ in range(searches_per_move):
-                cloned_game = copy.deepcopy(game)
-                cloned_game.move(move)
-                score = self.simulate(cloned_game, search_length)
-                total_score += score
-            return total_score
-
-        # Parallelize the move simulations
-        scores = Parallel(n_jobs=-1)(
-            delayed(simulate_move)(move) for move in first_moves
-        )
+        # One independent stream per first move, so the rollouts are the same
+        # whether they run serially or in worker processes
+        rngs = self.rng.spawn(len(first_moves))
+
+        # Parallelize the move simulations on the shared pool, if any
+        if self.parallel is not None:
+            scores = self.parallel(
+                delayed(self.simulate_move)(
+                    game, move, rng, searches_per_move, search_length
+                )
+                for move, rng in zip(first_moves, rngs)
+            )
+        else:
+            scores = [
+                self.simulate_move(game, move, rng, searches_per_move, search_length)
+                for move, rng in zip(first_moves, rngs)
+            ]
 
         # Prioritize moves leading to higher scores
         best_move_index = np.argmax(scores)
@@ -159,45 +178,165 @@ class AdvancedMonteCarloAgent:
 
         return game.get_state(), best_move
 
+    def batch_move(self, game, searches_per_move, search_length):
+        # Same decision as move, with all rollouts simulated in one batch
+        self._check_packed(game, "batch_move")
+        first_moves = game.get_valid_moves()
+        simulator, score_fn = rollout_simulator(
+            self.rng, self.batch_heuristic_score, self.line_score
+        )
+        scores = simulator.evaluate_first_moves(
+            game.get_packed_state(),
+            first_moves,
+            searches_per_move,
+            search_length,
+            score_fn,
+            self.rollout_policy,
+        )
+
+        best_move_index = np.argmax(scores)
+        best_move = first_moves[best_move_index]
+        game.move(best_move)
+
+        return game.get_state(), best_move
+
+    def anytime_move(
+        self,
+        game,
+        search_length,
+        rollout_budget=None,
+        time_budget=None,
+        round_rollouts=ANYTIME_ROUND_ROLLOUTS,
+        confidence=ANYTIME_CONFIDENCE,
+    ):
+        """
+        Pick a move within ``rollout_budget`` rollouts or ``time_budget``
+        seconds, using successive halving: the budget is split into
+        log2(len(first_moves)) rounds and after each round only the better
+        half of the first moves keeps being simulated. The search stops as
+        soon as one move leads all others by ``confidence`` standard errors,
+        and a forced move is played without any search. With a time budget
+        the rollouts run in batches of ``round_rollouts`` per move.
+        """
+        self._check_packed(game, "anytime_move")
+        first_moves = game.get_valid_moves()
+        if len(first_moves) == 1:
+            self.last_rollouts = 0
+            game.move(first_moves[0])
+            return game.get_state(), first_moves[0]
+
+        if rollout_budget is None and time_budget is None:
+            rollout_budget = 40 * len(first_moves)
+        if time_budget is None and rollout_budget < len(first_moves):
+            raise ValueError("rollout_budget must allow one rollout per first move")
+
+        simulator, score_fn = rollout_simulator(
+            self.rng, self.batch_heuristic_score, self.line_score
+        )
+        board = game.get_packed_state()
+        totals = np.zeros(len(first_moves))
+        squares = np.zeros(len(first_moves))
+        counts = np.zeros(len(first_moves))
+        survivors = np.arange(len(first_moves))
+        rounds = math.ceil(math.log2(len(first_moves)))
+        start = time.perf_counter()
+
+        def progress():
+            if time_budget is not None:
+                return (time.perf_counter() - start) / time_budget
+            return counts.sum() / rollout_budget
+
+        spent = False
+        for round_index in range(rounds):
+            clear_winner = False
+            # Every round runs at least one batch, then until its budget share
+            while not clear_winner:
+                per_move = round_rollouts
+                if time_budget is None:
+                    # Batches cost far more than rollouts, so one batch fills
+                    # the round's share, within what is left of the budget
+                    share = rollout_budget * (round_index + 1) // rounds
+                    per_move = max((share - int(counts.sum())) // len(survivors), 1)
+                    if counts.sum() + per_move * len(survivors) > rollout_budget:
+                        spent = True
+                        break
+                rollouts = simulator.first_move_rollouts(
+                    board,
+                    [first_moves[i] for i in survivors],
+                    per_move,
+                    search_length,
+                    score_fn,
+                    self.rollout_policy,
+                )
+                totals[survivors] += rollouts.sum(axis=1)
+                squares[survivors] += (rollouts**2).sum(axis=1)
+                counts[survivors] += per_move
+
+                means = totals[survivors] / counts[survivors]
+                errors = np.sqrt(
+                    np.maximum(squares[survivors] / counts[survivors] - means**2, 0)
+                    / counts[survivors]
+                )
+                best = np.argmax(means)
+                upper = np.delete(means + confidence * errors, best)
+                clear_winner = means[best] - confidence * errors[best] > upper.max()
+                if progress() >= (round_index + 1) / rounds:
+                    break
+
+            if spent:
+                break
+            if clear_winner:
+                survivors = survivors[[best]]
+                break
+            # Keep the better half of the first moves for the next round
+            order = np.argsort(-means, kind="stable")
+            survivors = survivors[order[: math.ceil(len(survivors) / 2)]]
+
+        self.last_rollouts = int(counts.sum())
+        means = totals[survivors] / counts[survivors]
+        best_move = first_moves[survivors[np.argmax(means)]]
+        game.move(best_move)
+
+        return game.get_state(), best_move
+
 
 # Main loop with AI playing
 def main():
     # Initialize game and agent
+    from GameRenderer import create_screen, handle_quit_events
+
     game = Game2048()
-    agent = AdvancedMonteCarloAgent()
+    with Parallel(n_jobs=-1) as parallel:
+        agent = AdvancedMonteCarloAgent(parallel=parallel)
 
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("2048 AI")
-    game.reset()
+        screen = create_screen("2048 AI")
+        game.reset()
 
-    number_of_searches = 40  # Increase the number of searches for better decisions
-    search_length = 10  # Simulate longer sequences of moves
-    win_shown = False  # Flag to check if winning message has been shown
+        number_of_searches = 40  # Increase the number of searches for better decisions
+        search_length = 10  # Simulate longer sequences of moves
+        win_shown = False  # Flag to check if winning message has been shown
 
-    while not game.is_game_over():
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+        while not game.is_game_over():
+            handle_quit_events()
 
-        # AI plays the move
-        final_board, best_move = agent.move(game, number_of_searches, search_length)
-        print(f"Best move: {best_move}")
-        print(f"Final board:\n{final_board}")
+            # AI plays the move
+            final_board, best_move = agent.move(game, number_of_searches, search_length)
+            print(f"Best move: {best_move}")
+            print(f"Final board:\n{final_board}")
 
-        if game.is_win() and not win_shown:
-            win_shown = True  # Set the flag to True after detecting the win
+            if game.is_win() and not win_shown:
+                win_shown = True  # Set the flag to True after detecting the win
 
-        # Draw the board after AI move
-        game.draw_board(screen)
+            # Draw the board after AI move
+            game.draw_board(screen)
 
-    if game.is_game_over():
-        if win_shown:
-            print("Game over after winning!")
-        else:
-            print("Game over!")
+        if game.is_game_over():
+            if win_shown:
+                print("Game over after winning!")
+            else:
+                print("Game over!")
 
-    print(game.get_score())
+        print(game.get_score())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+"""
+Vectorized rollouts over many packed boards at once.
+
+Boards are held in a (N,) uint64 array using the layout from Bitboard.py. Every
+step (valid move masks, random move selection, merges, tile spawns and
+game-over masks) is applied to all N boards with NumPy operations, so the
+rollouts of a whole Monte Carlo decision run in a single call.
+"""
+
+import numpy as np
+import Bitboard
+from RolloutPolicy import RANDOM
+
+ROW_LEFT = np.array(Bitboard.ROW_LEFT_TABLE, dtype=np.uint64)
+ROW_RIGHT = np.array(Bitboard.ROW_RIGHT_TABLE, dtype=np.uint64)
+SCORE_LEFT = np.array(Bitboard.SCORE_LEFT_TABLE, dtype=np.int64)
+SCORE_RIGHT = np.array(Bitboard.SCORE_RIGHT_TABLE, dtype=np.int64)
+COL_UP = np.array(Bitboard.COL_UP_TABLE, dtype=np.uint64)
+COL_DOWN = np.array(Bitboard.COL_DOWN_TABLE, dtype=np.uint64)
+REVERSE_ROW = np.array(Bitboard.REVERSE_ROW_TABLE, dtype=np.uint64)
+SYMMETRY_DIRECTIONS = np.array(Bitboard.SYMMETRY_DIRECTIONS)
+
+ROW_SHIFTS = np.arange(0, 64, 16, dtype=np.uint64)
+CELL_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+
+def batch_ranks(boards):
+    """Return the (N, 16) log2 tile ranks of the packed boards."""
+    return ((boards[:, None] >> CELL_SHIFTS) & np.uint64(0xF)).astype(np.int64)
+
+
+def batch_max_tile(boards):
+    max_rank = batch_ranks(boards).max(axis=1)
+    return np.where(max_rank > 0, 1 << max_rank, 0)
+
+
+def batch_empty_cells(boards):
+    return (batch_ranks(boards) == 0).sum(axis=1)
+
+
+def _move_rows(boards, row_table, score_table):
+    rows = (boards[:, None] >> ROW_SHIFTS) & np.uint64(0xFFFF)
+    result = np.bitwise_or.reduce(row_table[rows] << ROW_SHIFTS, axis=1)
+    return result, score_table[rows].sum(axis=1)
+
+
+def _move_cols(boards, col_table, score_table):
+    rows = (Bitboard.transpose(boards)[:, None] >> ROW_SHIFTS) & np.uint64(0xFFFF)
+    result = np.bitwise_or.reduce(col_table[rows] << (ROW_SHIFTS // 4), axis=1)
+    return result, score_table[rows].sum(axis=1)
+
+
+def batch_all_moves(boards):
+    """Return the (N, 4) boards and score increments for left/right/up/down."""
+    moves = [
+        _move_rows(boards, ROW_LEFT, SCORE_LEFT),
+        _move_rows(boards, ROW_RIGHT, SCORE_RIGHT),
+        _move_cols(boards, COL_UP, SCORE_LEFT),
+        _move_cols(boards, COL_DOWN, SCORE_RIGHT),
+    ]
+    results = np.stack([result for result, _ in moves], axis=1)
+    scores = np.stack([score for _, score in moves], axis=1)
+    return results, scores
+
+
+def batch_flip_horizontal(boards):
+    rows = (boards[:, None] >> ROW_SHIFTS) & np.uint64(0xFFFF)
+    return np.bitwise_or.reduce(REVERSE_ROW[rows] << ROW_SHIFTS, axis=1)
+
+
+def batch_symmetries(boards):
+    """Return the (N, 8) symmetric boards, ordered like Bitboard.symmetries."""
+    variants = []
+    for variant in (boards, Bitboard.transpose(boards)):
+        horizontal = batch_flip_horizontal(variant)
+        variants += [
+            variant,
+            horizontal,
+            Bitboard.flip_vertical(variant),
+            Bitboard.flip_vertical(horizontal),
+        ]
+    return np.stack(variants, axis=1)
+
+
+def batch_canonical(boards):
+    """Bitboard.canonical for a (N,) array: the smallest boards and their indices."""
+    variants = batch_symmetries(boards)
+    index = np.argmin(variants, axis=1)
+    return variants[np.arange(len(boards)), index], index
+
+
+class BatchSimulator:
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def add_new_tiles(self, boards, mask=None):
+        """Spawn one tile (2 with p=0.9, else 4) on every masked board with space."""
+        empty = batch_ranks(boards) == 0
+        counts = empty.sum(axis=1)
+        if mask is not None:
+            counts = np.where(mask, counts, 0)
+
+        # Pick the k-th empty cell of each board, k uniform in [0, counts)
+        pick = (self.rng.random(len(boards)) * counts).astype(np.int64)
+        cell = np.argmax(
+            empty & (np.cumsum(empty, axis=1) == pick[:, None] + 1), axis=1
+        )
+        rank = np.where(self.rng.random(len(boards)) < 0.9, 1, 2).astype(np.uint64)
+        spawned = boards | (rank << (cell.astype(np.uint64) * np.uint64(4)))
+        return np.where(counts > 0, spawned, boards)
+
+    def move(self, boards, directions):
+        """Apply one direction index per board, spawning a tile where it moved."""
+        results, scores = batch_all_moves(boards)
+        index = np.arange(len(boards))
+        new_boards = results[index, directions]
+        moved = new_boards != boards
+        return self.add_new_tiles(new_boards, moved), scores[index, directions], moved
+
+    def random_moves(self, boards, policy=None):
+        """
+        Play a uniformly random valid move on every board, or the move a
+        RolloutPolicy picks.
+
+        Returns the new boards, the score increments and the alive mask; boards
+        without a valid move are left untouched and reported as not alive.
+        """
+        results, scores = batch_all_moves(boards)
+        valid = results != boards[:, None]
+        alive = valid.any(axis=1)
+
+        if policy is None or policy.kind == RANDOM:
+            # Uniform choice among valid moves: argmax of random keys on valid slots
+            keys = np.where(valid, self.rng.random(valid.shape), -1.0)
+            directions = np.argmax(keys, axis=1)
+        else:
+            directions = policy.batch_directions(
+                results, scores, valid, self.rng.random(len(boards))
+            )
+        index = np.arange(len(boards))
+        new_boards = np.where(alive, results[index, directions], boards)
+        new_boards = self.add_new_tiles(new_boards, alive)
+        return new_boards, np.where(alive, scores[index, directions], 0), alive
+
+    def rollout(self, boards, search_length, score_fn, policy=None):
+        """
+        Run ``search_length`` moves of the rollout ``policy`` (random by
+        default) on every board, summing ``score_fn(boards)`` after each move
+        until the board's game is over.
+        """
+        boards = np.asarray(boards, dtype=np.uint64)
+        total_scores = np.zeros(len(boards))
+        alive = np.ones(len(boards), dtype=bool)
+
+        for _ in range(search_length):
+            boards, _, moved = self.random_moves(boards, policy)
+            alive &= moved
+            if not alive.any():
+                break  # No valid move left on any board
+            total_scores += np.where(alive, score_fn(boards), 0)
+
+        return total_scores
+
+    def first_move_rollouts(
+        self,
+        board,
+        first_moves,
+        searches_per_move,
+        search_length,
+        score_fn,
+        policy=None,
+    ):
+        """
+        Run ``searches_per_move`` rollouts after every first move of a
+        decision, all simulated together in one batch, and return the
+        (len(first_moves), searches_per_move) rollout scores.
+        """
+        directions = np.repeat(
+            [Bitboard.DIRECTION_INDEX[move] for move in first_moves],
+            searches_per_move,
+        )
+        boards = np.full(len(directions), board, dtype=np.uint64)
+        boards, _, _ = self.move(boards, directions)
+        total_scores = self.rollout(boards, search_length, score_fn, policy)
+        return total_scores.reshape(len(first_moves), searches_per_move)
+
+    def evaluate_first_moves(
+        self,
+        board,
+        first_moves,
+        searches_per_move,
+        search_length,
+        score_fn,
+        policy=None,
+    ):
+        """Total rollout score of every first move, see first_move_rollouts."""
+        return self.first_move_rollouts(
+            board, first_moves, searches_per_move, search_length, score_fn, policy
+        ).sum(axis=1)
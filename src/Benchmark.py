@@ -0,0 +1,489 @@
+"""
+Performance benchmarks for the 2048 engine, agents and simulation runner.
+
+Every benchmark runs on boards from a seeded corpus, so two runs measure the
+same work. Results are printed as JSON and can be saved as a baseline; later
+runs compared against that baseline report every metric that regressed.
+
+Run from the src folder:
+    python Benchmark.py                        # full run, print JSON
+    python Benchmark.py --quick                # shorter run
+    python Benchmark.py --save-baseline        # store results as the baseline
+    python Benchmark.py --baseline FILE        # compare against a baseline
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from Game2048 import Game2048, SIZE
+from BitboardGame2048 import BitboardGame2048
+from BatchSimulator import BatchSimulator, batch_max_tile
+from JitEngine import (
+    JIT_AVAILABLE,
+    JitSimulator,
+    LineScore,
+    rollout_simulator,
+    warm_up,
+)
+from MonteCarloAgent import MonteCarloAgent
+from EnhancedMonteCarloAgent import EnhancedMonteCarloAgent
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from ExpectimaxAgent import ExpectimaxAgent
+from NTupleAgent import NTupleAgent
+from MCTSAgent import MCTSAgent
+from QLearningAgent import train_2048_agent, train_2048_agent_vectorized
+from Simulation import run_single_simulation
+from TableHeuristic import TableHeuristic
+from RolloutPolicy import CornerPolicy, EpsilonGreedyPolicy, GreedyPolicy
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(SRC_DIR, "benchmark_baseline.json")
+
+ENGINES = [Game2048, BitboardGame2048]
+BOARD_SIZES = [3, 4, 5, 6]
+DIRECTIONS = ["left", "right", "up", "down"]
+
+IMPORT_MODULES = [
+    "Game2048",
+    "BitboardGame2048",
+    "BatchSimulator",
+    "JitEngine",
+    "AdvancedMonteCarloAgent",
+    "Simulation",
+]
+
+IMPORT_CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, "pygame" in sys.modules, "matplotlib" in sys.modules)
+"""
+
+
+def make_board_corpus(size=200, seed=2048, board_size=SIZE):
+    """Boards sampled from seeded random games, from opening to game over."""
+    rng = np.random.default_rng(seed)
+    boards = []
+    game = Game2048(rng, size=board_size)
+    while len(boards) < size:
+        if game.is_game_over():
+            game.reset()
+        game.move(rng.choice(game.get_valid_moves()))
+        boards.append(game.get_state())
+    return boards
+
+
+def measure(func, items, min_seconds=0.2):
+    """Call ``func`` on every item, repeating the pass for at least ``min_seconds``."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            func(item)
+        calls += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return calls / elapsed
+
+
+def benchmark_engines(boards, min_seconds):
+    results = {}
+    for engine in ENGINES:
+        game = engine()
+        snapshots = []
+        for board in boards:
+            game.board = board
+            snapshots.append(game.snapshot())
+
+        def move(item):
+            snapshot, direction = item
+            game.restore(snapshot)
+            game.move(direction)
+
+        def get_valid_moves(snapshot):
+            game.restore(snapshot)
+            game.get_valid_moves()
+
+        def is_game_over(snapshot):
+            game.restore(snapshot)
+            game.is_game_over()
+
+        move_items = [
+            (snapshot, DIRECTIONS[i % 4]) for i, snapshot in enumerate(snapshots)
+        ]
+        results[engine.__name__] = {
+            "move_per_second": measure(move, move_items, min_seconds),
+            "get_valid_moves_per_second": measure(
+                get_valid_moves, snapshots, min_seconds
+            ),
+            "is_game_over_per_second": measure(is_game_over, snapshots, min_seconds),
+        }
+    return results
+
+
+def benchmark_board_sizes(corpus_size, min_seconds, seed):
+    """Game2048 and the NumPy heuristic on every board size."""
+    results = {}
+    for board_size in BOARD_SIZES:
+        heuristic = TableHeuristic(size=board_size)
+        boards = make_board_corpus(corpus_size, seed, board_size)
+        game = Game2048(size=board_size)
+        snapshots = []
+        for board in boards:
+            game.board = board
+            snapshots.append(game.snapshot())
+
+        def move(item):
+            snapshot, direction = item
+            game.restore(snapshot)
+            game.move(direction)
+
+        def get_valid_moves(snapshot):
+            game.restore(snapshot)
+            game.get_valid_moves()
+
+        move_items = [
+            (snapshot, DIRECTIONS[i % 4]) for i, snapshot in enumerate(snapshots)
+        ]
+        results[f"{board_size}x{board_size}"] = {
+            "move_per_second": measure(move, move_items, min_seconds),
+            "get_valid_moves_per_second": measure(
+                get_valid_moves, snapshots, min_seconds
+            ),
+            "score_board_per_second": measure(
+                heuristic.score_board, boards, min_seconds
+            ),
+        }
+    return results
+
+
+def benchmark_heuristics(boards, min_seconds):
+    games = []
+    for board in boards:
+        game = Game2048()
+        game.board = board
+        games.append(game)
+    packed = [game.get_packed_state() for game in games]
+    packed_array = np.array(packed, dtype=np.uint64)
+
+    enhanced = EnhancedMonteCarloAgent()
+    advanced = AdvancedMonteCarloAgent()
+    expectimax = ExpectimaxAgent()
+
+    def batch(boards):
+        advanced.batch_heuristic_score(boards)
+
+    batch_rate = measure(batch, [packed_array], min_seconds) * len(packed_array)
+    return {
+        "EnhancedMonteCarloAgent": {
+            "evaluations_per_second": measure(
+                enhanced.heuristic_score, games, min_seconds
+            )
+        },
+        "AdvancedMonteCarloAgent": {
+            "evaluations_per_second": measure(
+                advanced.heuristic_score, games, min_seconds
+            ),
+            "batch_evaluations_per_second": batch_rate,
+        },
+        "ExpectimaxAgent": {
+            "evaluations_per_second": measure(
+                expectimax.heuristic_score, packed, min_seconds
+            )
+        },
+    }
+
+
+def benchmark_agents(boards, searches_per_move, search_length, decisions, seed):
+    # Only boards that still have a decision to make
+    boards = [board for board in boards if len(_game_from(board).get_valid_moves())]
+    boards = boards[:decisions]
+
+    agents = {
+        "MonteCarloAgent": (MonteCarloAgent, "move"),
+        "MonteCarloAgent.batch": (MonteCarloAgent, "batch_move"),
+        "EnhancedMonteCarloAgent": (EnhancedMonteCarloAgent, "move"),
+        "EnhancedMonteCarloAgent.batch": (EnhancedMonteCarloAgent, "batch_move"),
+        "AdvancedMonteCarloAgent": (AdvancedMonteCarloAgent, "move"),
+        "AdvancedMonteCarloAgent.batch": (AdvancedMonteCarloAgent, "batch_move"),
+        "AdvancedMonteCarloAgent.anytime": (
+            functools.partial(AdvancedMonteCarloAgent, anytime=True),
+            "move",
+        ),
+        "MCTSAgent": (MCTSAgent, "move"),
+    }
+
+    # Compile or load the JIT kernels, then play one untimed decision per
+    # agent, so the timings measure decisions rather than startup
+    warm_up()
+    results = {}
+    for name, (agent_class, method) in agents.items():
+        agent = agent_class(rng=np.random.default_rng(seed))
+        getattr(agent, method)(_game_from(boards[0]), searches_per_move, search_length)
+        start = time.perf_counter()
+        for board in boards:
+            getattr(agent, method)(_game_from(board), searches_per_move, search_length)
+        results[name] = {
+            "decisions_per_second": len(boards) / (time.perf_counter() - start)
+        }
+
+    agent = ExpectimaxAgent()
+    agent.move(_game_from(boards[0]))
+    start = time.perf_counter()
+    for board in boards:
+        agent.move(_game_from(board))
+    results["ExpectimaxAgent"] = {
+        "decisions_per_second": len(boards) / (time.perf_counter() - start)
+    }
+    return results
+
+
+def benchmark_games(games, searches_per_move, search_length, seed):
+    seeds = np.random.SeedSequence(seed).spawn(games)
+    results = {}
+    agents = {
+        "AdvancedMonteCarloAgent": AdvancedMonteCarloAgent(),
+        "AdvancedMonteCarloAgent.batch": AdvancedMonteCarloAgent(batch=True),
+    }
+    for name, agent in agents.items():
+        start = time.perf_counter()
+        for game_seed in seeds:
+            run_single_simulation(agent, (searches_per_move, search_length), game_seed)
+        results[name] = {"games_per_second": games / (time.perf_counter() - start)}
+    return results
+
+
+def benchmark_batch_rollouts(boards, searches_per_move, search_length, min_seconds):
+    simulator = BatchSimulator(np.random.default_rng(0))
+    packed = [_game_from(board).get_packed_state() for board in boards]
+
+    def rollout(board):
+        simulator.evaluate_first_moves(
+            board, DIRECTIONS, searches_per_move, search_length, batch_max_tile
+        )
+
+    rate = measure(rollout, packed, min_seconds)
+    results = {"rollouts_per_second": rate * 4 * searches_per_move}
+
+    if JIT_AVAILABLE:
+        jit_simulator = JitSimulator(np.random.default_rng(0))
+        line_score = LineScore.max_tile()
+
+        def jit_rollout(board):
+            jit_simulator.evaluate_first_moves(
+                board, DIRECTIONS, searches_per_move, search_length, line_score
+            )
+
+        jit_rollout(packed[0])  # Compile, or load the cached kernels
+        rate = measure(jit_rollout, packed, min_seconds)
+        results["jit_rollouts_per_second"] = rate * 4 * searches_per_move
+
+    # Rollout policies on the active engine, scored like the rollouts above
+    policies = {
+        "greedy": GreedyPolicy(),
+        "corner": CornerPolicy(),
+        "epsilon_greedy": EpsilonGreedyPolicy(
+            LineScore.from_heuristic(TableHeuristic())
+        ),
+    }
+    simulator, score_fn = rollout_simulator(
+        np.random.default_rng(0), batch_max_tile, LineScore.max_tile()
+    )
+    results["policy"] = {}
+    for name, policy in policies.items():
+
+        def policy_rollout(board):
+            simulator.evaluate_first_moves(
+                board, DIRECTIONS, searches_per_move, search_length, score_fn, policy
+            )
+
+        policy_rollout(packed[0])
+        rate = measure(policy_rollout, packed, min_seconds)
+        results["policy"][name] = {"rollouts_per_second": rate * 4 * searches_per_move}
+    return results
+
+
+def benchmark_training(episodes, seed):
+    agent = NTupleAgent()
+    game = Game2048(np.random.default_rng(seed))
+    start = time.perf_counter()
+    for _ in range(episodes):
+        agent.learn_episode(game)
+    results = {
+        "NTupleAgent": {
+            "episodes_per_second": episodes / (time.perf_counter() - start),
+            "weight_bytes": agent.nbytes,
+        }
+    }
+
+    # Q-learning episodes are short, so it gets more of them
+    trainers = {
+        "QLearningAgent": train_2048_agent,
+        "QLearningAgent.vectorized": train_2048_agent_vectorized,
+    }
+    for name, train in trainers.items():
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            train(episodes * 10, seed=seed)
+        results[name] = {
+            "episodes_per_second": episodes * 10 / (time.perf_counter() - start)
+        }
+    return results
+
+
+def _game_from(board):
+    game = Game2048(np.random.default_rng(0))
+    game.board = board.copy()
+    return game
+
+
+def benchmark_import_time(module, repeats=5):
+    """
+    Import ``module`` in fresh interpreters, like a joblib worker would, and
+    report the best import time, the best whole-process time and whether
+    pygame or matplotlib got pulled in.
+    """
+    import_times = []
+    process_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_CODE.format(module=module)],
+            cwd=SRC_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        process_times.append(time.perf_counter() - start)
+        import_times.append(float(output[0]))
+
+    return {
+        "import_seconds": min(import_times),
+        "process_seconds": min(process_times),
+        "imports_pygame": output[1] == "True",
+        "imports_matplotlib": output[2] == "True",
+    }
+
+
+def benchmark_game_setup(repeats=1000):
+    """Per-game overhead of creating and resetting a headless Game2048."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        game = Game2048()
+        game.reset()
+    return {"setup_seconds": (time.perf_counter() - start) / repeats}
+
+
+def run_benchmarks(quick=False, seed=2048):
+    boards = make_board_corpus(100 if quick else 400, seed)
+    min_seconds = 0.1 if quick else 0.5
+    searches_per_move, search_length = (10, 5) if quick else (40, 10)
+
+    return {
+        "config": {
+            "quick": quick,
+            "seed": seed,
+            "boards": len(boards),
+            "searches_per_move": searches_per_move,
+            "search_length": search_length,
+        },
+        "engine": benchmark_engines(boards, min_seconds),
+        "heuristic": benchmark_heuristics(boards, min_seconds),
+        "sizes": benchmark_board_sizes(len(boards) // 4, min_seconds, seed),
+        "agent": benchmark_agents(
+            boards, searches_per_move, search_length, 10 if quick else 30, seed
+        ),
+        "batch": benchmark_batch_rollouts(
+            boards[:20], searches_per_move, search_length, min_seconds
+        ),
+        "game": benchmark_games(1 if quick else 3, 5, 5, seed),
+        "training": benchmark_training(5 if quick else 50, seed),
+        "import": {
+            module: benchmark_import_time(module, 2 if quick else 5)
+            for module in IMPORT_MODULES
+        },
+        "setup": benchmark_game_setup(),
+    }
+
+
+def flatten(results, prefix=""):
+    metrics = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{prefix}{key}/"))
+        elif isinstance(value, float):
+            metrics[f"{prefix}{key}"] = value
+    return metrics
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Return the metrics that are more than ``tolerance`` worse than the
+    baseline: ``*_per_second`` metrics must not drop and ``*_seconds``
+    metrics must not grow.
+    """
+    current = flatten(results)
+    regressions = {}
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        if new is None or old == 0:
+            continue
+        if name.endswith("_per_second"):
+            change = new / old - 1
+            regressed = change < -tolerance
+        elif name.endswith("_seconds"):
+            change = new / old - 1
+            regressed = change > tolerance
+        else:
+            continue
+        if regressed:
+            regressions[name] = {"baseline": old, "current": new, "change": change}
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--quick", action="store_true", help="shorter run")
+    parser.add_argument("--seed", type=int, default=2048)
+    parser.add_argument("--output", help="write the results JSON to this file")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const=DEFAULT_BASELINE,
+        help="save the results as the baseline (default: %(const)s)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.quick, args.seed)
+    print(json.dumps(results, indent=2))
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against {}:".format(args.baseline))
+            print(json.dumps(regressions, indent=2))
+            sys.exit(1)
+        print("No regressions against {}".format(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Packed 64-bit representation of a 4x4 2048 board.
+
+Each cell is stored as a 4-bit nibble holding log2 of the tile value (0 for an
+empty cell). Cell (row, col) lives in nibble ``row * 4 + col``, so a row is a
+16-bit chunk and ``board >> (16 * row) & 0xFFFF`` extracts it. The highest
+representable tile is 2**15 = 32768; two 32768 tiles are not merged.
+
+All four moves are resolved through 65536-entry lookup tables indexed by a
+16-bit row, which also hold the score increment of the merge.
+"""
+
+import numpy as np
+
+SIZE = 4
+DIRECTIONS = ["left", "right", "up", "down"]
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+MAX_RANK = 15
+
+
+def _build_row_tables():
+    rows = np.arange(1 << 16, dtype=np.int64)
+    tiles = (rows[:, None] >> np.array([0, 4, 8, 12])) & 0xF
+
+    # Slide: stable-sort non-empty tiles to the front of the row
+    order = np.argsort(tiles == 0, axis=1, kind="stable")
+    tiles = np.take_along_axis(tiles, order, axis=1)
+
+    # Merge: same walk as Game2048.slide_and_merge, done for every row at once
+    result = np.zeros_like(tiles)
+    score = np.zeros(len(rows), dtype=np.int64)
+    previous = np.zeros(len(rows), dtype=np.int64)
+    new_index = np.zeros(len(rows), dtype=np.int64)
+    index = np.arange(len(rows))
+    for i in range(SIZE):
+        value = tiles[:, i]
+        merge = (value != 0) & (value == previous) & (value < MAX_RANK)
+        place = (value != 0) & ~merge
+        result[index[merge], new_index[merge] - 1] += 1
+        score[merge] += 1 << (value[merge] + 1)
+        result[index[place], new_index[place]] = value[place]
+        new_index += place
+        previous = np.where(merge, 0, np.where(place, value, previous))
+
+    left = (result << np.array([0, 4, 8, 12])).sum(axis=1)
+    return left, score
+
+
+def reverse_row(row):
+    return (
+        ((row & 0xF) << 12)
+        | ((row & 0xF0) << 4)
+        | ((row >> 4) & 0xF0)
+        | ((row >> 12) & 0xF)
+    )
+
+
+def _spread_column(row):
+    # Turn the 4 nibbles of a 16-bit row into column 0 of a 64-bit board
+    return (row & 0xF) | (row & 0xF0) << 12 | (row & 0xF00) << 24 | (row & 0xF000) << 36
+
+
+_left, _score = _build_row_tables()
+_reversed = reverse_row(np.arange(1 << 16, dtype=np.int64))
+_right = reverse_row(_left[_reversed])
+
+# Row tables for left/right and column tables for up/down, indexed by 16-bit row
+ROW_LEFT_TABLE = _left.tolist()
+ROW_RIGHT_TABLE = _right.tolist()
+SCORE_LEFT_TABLE = _score.tolist()
+SCORE_RIGHT_TABLE = _score[_reversed].tolist()
+COL_UP_TABLE = _spread_column(_left).tolist()
+COL_DOWN_TABLE = _spread_column(_right).tolist()
+REVERSE_ROW_TABLE = _reversed.tolist()
+# Bit 0 set if left changes the row, bit 1 if right does
+ROW_VALID_TABLE = (
+    (_left != np.arange(1 << 16)) | (_right != np.arange(1 << 16)) << 1
+).tolist()
+
+del _left, _score, _reversed, _right
+
+
+def encode_board(board):
+    return encode_values(np.asarray(board).ravel().tolist())
+
+
+def encode_values(values):
+    """encode_board of a row-major list of tile values."""
+    packed = 0
+    for i, value in enumerate(values):
+        if value:
+            packed |= (int(value).bit_length() - 1) << (4 * i)
+    return packed
+
+
+def decode_board(packed):
+    ranks = np.array([(packed >> (4 * i)) & 0xF for i in range(16)], dtype=int)
+    return np.where(ranks > 0, 1 << ranks, 0).reshape(SIZE, SIZE)
+
+
+def transpose(board):
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def move_left(board):
+    result = 0
+    score = 0
+    for i in range(0, 64, 16):
+        row = (board >> i) & ROW_MASK
+        result |= ROW_LEFT_TABLE[row] << i
+        score += SCORE_LEFT_TABLE[row]
+    return result, score
+
+
+def move_right(board):
+    result = 0
+    score = 0
+    for i in range(0, 64, 16):
+        row = (board >> i) & ROW_MASK
+        result |= ROW_RIGHT_TABLE[row] << i
+        score += SCORE_RIGHT_TABLE[row]
+    return result, score
+
+
+def move_up(board):
+    t = transpose(board)
+    result = 0
+    score = 0
+    for i in range(SIZE):
+        row = (t >> (16 * i)) & ROW_MASK
+        result |= COL_UP_TABLE[row] << (4 * i)
+        score += SCORE_LEFT_TABLE[row]
+    return result, score
+
+
+def move_down(board):
+    t = transpose(board)
+    result = 0
+    score = 0
+    for i in range(SIZE):
+        row = (t >> (16 * i)) & ROW_MASK
+        result |= COL_DOWN_TABLE[row] << (4 * i)
+        score += SCORE_RIGHT_TABLE[row]
+    return result, score
+
+
+MOVE_FUNCTIONS = [move_left, move_right, move_up, move_down]
+
+
+def execute_move(board, direction):
+    """Return the board and score increment after ``direction``, without spawning."""
+    return MOVE_FUNCTIONS[DIRECTION_INDEX[direction]](board)
+
+
+def _row_valid(board):
+    return (
+        ROW_VALID_TABLE[board & ROW_MASK]
+        | ROW_VALID_TABLE[(board >> 16) & ROW_MASK]
+        | ROW_VALID_TABLE[(board >> 32) & ROW_MASK]
+        | ROW_VALID_TABLE[(board >> 48) & ROW_MASK]
+    )
+
+
+def valid_move_mask(board):
+    """4-bit mask of the moves that change the board, bit i for DIRECTIONS[i]."""
+    return _row_valid(board) | _row_valid(transpose(board)) << 2
+
+
+# Valid directions for each valid_move_mask value
+MASK_MOVES = [
+    [direction for i, direction in enumerate(DIRECTIONS) if mask >> i & 1]
+    for mask in range(16)
+]
+
+
+def empty_cells(board):
+    return [i for i in range(16) if not (board >> (4 * i)) & 0xF]
+
+
+def max_rank(board):
+    return max((board >> (4 * i)) & 0xF for i in range(16))
+
+
+def flip_horizontal(board):
+    """Mirror the board left to right."""
+    return (
+        REVERSE_ROW_TABLE[board & ROW_MASK]
+        | REVERSE_ROW_TABLE[(board >> 16) & ROW_MASK] << 16
+        | REVERSE_ROW_TABLE[(board >> 32) & ROW_MASK] << 32
+        | REVERSE_ROW_TABLE[(board >> 48) & ROW_MASK] << 48
+    )
+
+
+def flip_vertical(board):
+    """Mirror the board top to bottom."""
+    return (
+        (board & ROW_MASK) << 48
+        | ((board >> 16) & ROW_MASK) << 32
+        | ((board >> 32) & ROW_MASK) << 16
+        | (board >> 48) & ROW_MASK
+    )
+
+
+def symmetries(board):
+    """The 8 boards equivalent to ``board`` under rotations and reflections."""
+    boards = []
+    for variant in (board, transpose(board)):
+        horizontal = flip_horizontal(variant)
+        boards += [
+            variant,
+            horizontal,
+            flip_vertical(variant),
+            flip_vertical(horizontal),
+        ]
+    return boards
+
+
+def _symmetry_directions():
+    # Direction index permutation for each entry of symmetries(): moving
+    # ``d`` on the board is moving ``permutation[d]`` on the symmetric board
+    identity = [0, 1, 2, 3]
+    horizontal = [1, 0, 2, 3]  # left <-> right
+    vertical = [0, 1, 3, 2]  # up <-> down
+    transposed = [2, 3, 0, 1]  # left <-> up, right <-> down
+    flips = [identity, horizontal, vertical, [vertical[d] for d in horizontal]]
+    return [
+        [flip[base[d]] for d in range(4)]
+        for base in (identity, transposed)
+        for flip in flips
+    ]
+
+
+SYMMETRY_DIRECTIONS = _symmetry_directions()
+
+
+def canonical(board):
+    """Return the smallest symmetric board and its index in symmetries()."""
+    boards = symmetries(board)
+    best = min(boards)
+    return best, boards.index(best)
@@ -0,0 +1,110 @@
+from Game2048 import Game2048
+from Bitboard import (
+    MASK_MOVES,
+    decode_board,
+    empty_cells,
+    encode_board,
+    execute_move,
+    max_rank,
+    valid_move_mask,
+)
+
+
+class BitboardGame2048(Game2048):
+    """Drop-in Game2048 backend that keeps the board packed in a 64-bit integer."""
+
+    def __init__(self, rng=None, size=4):
+        if size != 4:
+            raise ValueError(
+                f"BitboardGame2048 only plays 4x4 boards, not {size}x{size}"
+            )
+        super().__init__(rng)
+
+    def reset(self):
+        self.bitboard = 0
+        self.add_new_tile()
+        self.add_new_tile()
+        self.score = 0
+        return self.board
+
+    @property
+    def board(self):
+        return decode_board(self.bitboard)
+
+    @board.setter
+    def board(self, board):
+        self.bitboard = encode_board(board)
+
+    def spawn_tile(self, board):
+        """Return ``board`` with a new tile, drawn like Game2048.add_new_tile."""
+        # Same random draws as Game2048 so a seeded run spawns the same tiles
+        empty = empty_cells(board)
+        if empty:
+            cell = empty[int(self.rng.random() * len(empty))]
+            rank = 1 if self.rng.random() < 0.9 else 2
+            board |= rank << (4 * cell)
+            self.last_spawn = (cell, 1 << rank)
+        else:
+            self.last_spawn = None
+        return board
+
+    def add_new_tile(self):
+        self.bitboard = self.spawn_tile(self.bitboard)
+
+    def place_tile(self, cell, value):
+        self.bitboard |= (int(value).bit_length() - 1) << (4 * cell)
+
+    def peek_move(self, direction):
+        new_board, score_increment = execute_move(self.bitboard, direction)
+        return decode_board(new_board), score_increment
+
+    def move(self, direction):
+        new_board, score_increment = execute_move(self.bitboard, direction)
+        moved = new_board != self.bitboard
+
+        if moved:
+            # One board update for the slide and the spawn
+            self.bitboard = self.spawn_tile(new_board)
+            self.score += score_increment
+        else:
+            self.last_spawn = None
+
+        return moved
+
+    def apply_move(self, direction, spawn):
+        new_board, score_increment = execute_move(self.bitboard, direction)
+        if spawn is not None:
+            cell, value = spawn
+            new_board |= (int(value).bit_length() - 1) << (4 * cell)
+        self.bitboard = new_board
+        self.score += score_increment
+        self.last_spawn = spawn
+
+    def valid_move_mask(self):
+        # The tables make this O(1) already, no cache needed
+        return valid_move_mask(self.bitboard)
+
+    def get_valid_moves(self):
+        return list(MASK_MOVES[valid_move_mask(self.bitboard)])
+
+    def is_game_over(self):
+        return valid_move_mask(self.bitboard) == 0
+
+    def snapshot(self):
+        return self.bitboard, self.score
+
+    def restore(self, snapshot):
+        self.bitboard, self.score = snapshot
+
+    def get_state(self):
+        return decode_board(self.bitboard)
+
+    def get_packed_state(self):
+        return self.bitboard
+
+    def is_win(self):
+        return max_rank(self.bitboard) >= 11
+
+    def get_max_tile(self):
+        rank = max_rank(self.bitboard)
+        return 1 << rank if rank else 0
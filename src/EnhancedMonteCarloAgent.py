@@ -1,55 +1,144 @@
 import numpy as np
 from Game2048 import Game2048
-import copy
+from Bitboard import encode_board
+from HeuristicGame2048 import HeuristicGame2048
+from BatchSimulator import batch_empty_cells, batch_max_tile
+from JitEngine import LineScore, rollout_simulator
+from RolloutPolicy import RandomPolicy
+from TableHeuristic import TableHeuristic
 from joblib import Parallel, delayed
 
 
 class EnhancedMonteCarloAgent:
+    def __init__(
+        self,
+        parallel=None,
+        rng=None,
+        incremental=False,
+        rollout_policy=None,
+        batch=False,
+    ):
+        # Optional shared worker pool (e.g. a joblib Parallel) for move-level
+        # parallelism; None runs the first moves one after the other
+        self.parallel = parallel
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # With incremental=True, rollouts play on a HeuristicGame2048 that
+        # keeps the empty cell count and the max tile up to date
+        self.incremental = incremental
+        self.evaluator = TableHeuristic() if incremental else None
+        # The same heuristic as tables for the JIT rollout kernel
+        self.line_score = LineScore.empty_and_max()
+        # Picks the moves of every rollout, uniformly random by default (see
+        # RolloutPolicy.py)
+        self.rollout_policy = (
+            rollout_policy if rollout_policy is not None else RandomPolicy()
+        )
+        # With batch=True, move() simulates all rollouts of a decision in one
+        # batch through batch_move
+        self.batch = batch
+
+    def __getstate__(self):
+        # The pool belongs to the parent process, workers always run serially
+        state = self.__dict__.copy()
+        state["parallel"] = None
+        return state
+
     def initialize_game(self):
         return Game2048()
 
-    def random_move(self, game):
-        moves = game.get_valid_moves()
-        if moves:
-            return np.random.choice(moves)
-        return None
+    def rollout_game(self, game, rng):
+        # A HeuristicGame2048 copy keeps the heuristic components up to date
+        # as the rollouts play on it, instead of rescanning every board
+        if self.incremental:
+            return HeuristicGame2048.from_game(game, self.evaluator, rng)
+        return game.clone(rng=rng)
 
     def heuristic_score(self, game):
+        if isinstance(game, HeuristicGame2048):
+            return game.empty_cells + max(game.row_max)
         board = game.get_state()
         empty_cells = np.sum(board == 0)
         max_tile = np.max(board)
         return empty_cells + max_tile
 
+    def batch_heuristic_score(self, boards):
+        # heuristic_score for a (N,) array of packed boards
+        return batch_empty_cells(boards) + batch_max_tile(boards)
+
     def simulate(self, game, search_length):
-        simulated_game = copy.deepcopy(game)
+        # Play on the given game and undo afterwards instead of copying it
+        snapshot = game.snapshot()
         total_score = 0
 
         for _ in range(search_length):
-            move = self.random_move(simulated_game)
+            move = self.rollout_policy(game)
             if move:
-                simulated_game.move(move)
-                total_score += self.heuristic_score(simulated_game)
+                game.move(move)
+                total_score += self.heuristic_score(game)
             else:
                 break  # No valid move, game over
 
+        game.restore(snapshot)
+        return total_score
+
+    def simulate_move(self, game, move, rng, searches_per_move, search_length):
+        # Total score of the rollouts after the first move ``move``. A method
+        # rather than a closure, so a pool task pickles only the agent (whose
+        # tables are rebuilt in the worker) and the game
+        total_score = 0
+        cloned_game = self.rollout_game(game, rng)
+        snapshot = cloned_game.snapshot()
+        for _ in range(searches_per_move):
+            cloned_game.move(move)
+            score = self.simulate(cloned_game, search_length)
+            total_score += score
+            cloned_game.restore(snapshot)
         return total_score
 
     def move(self, game, searches_per_move, search_length):
+        if self.batch:
+            return self.batch_move(game, searches_per_move, search_length)
+
         first_moves = game.get_valid_moves()
         scores = np.zeros(len(first_moves))
 
-        def simulate_move(move):
-            total_score = 0
-            for _ in range(searches_per_move):
-                cloned_game = copy.deepcopy(game)
-                cloned_game.move(move)
-                score = self.simulate(cloned_game, search_length)
-                total_score += score
-            return total_score
-
-        # Parallelize the move simulations
-        scores = Parallel(n_jobs=-1)(
-            delayed(simulate_move)(move) for move in first_moves
+        # One independent stream per first move, so the rollouts are the same
+        # whether they run serially or in worker processes
+        rngs = self.rng.spawn(len(first_moves))
+
+        # Parallelize the move simulations on the shared pool, if any
+        if self.parallel is not None:
+            scores = self.parallel(
+                delayed(self.simulate_move)(
+                    game, move, rng, searches_per_move, search_length
+                )
+                for move, rng in zip(first_moves, rngs)
+            )
+        else:
+            scores = [
+                self.simulate_move(game, move, rng, searches_per_move, search_length)
+                for move, rng in zip(first_moves, rngs)
+            ]
+
+        best_move_index = np.argmax(scores)
+        best_move = first_moves[best_move_index]
+        game.move(best_move)
+
+        return game.get_state(), best_move
+
+    def batch_move(self, game, searches_per_move, search_length):
+        # Same decision as move, with all rollouts simulated in one batch
+        first_moves = game.get_valid_moves()
+        simulator, score_fn = rollout_simulator(
+            self.rng, self.batch_heuristic_score, self.line_score
+        )
+        scores = simulator.evaluate_first_moves(
+            encode_board(game.get_state()),
+            first_moves,
+            searches_per_move,
+            search_length,
+            score_fn,
+            self.rollout_policy,
         )
 
         best_move_index = np.argmax(scores)
@@ -60,19 +149,25 @@ class EnhancedMonteCarloAgent:
 
 
 # Test the EnhancedMonteCarloAgent class
-agent = EnhancedMonteCarloAgent()
-game = agent.initialize_game()
-
-number_of_searches = 40  # Increase the number of searches for better decisions
-search_length = 10  # Simulate longer sequences of moves
-
-while not game.is_game_over():
-    final_board, best_move = agent.move(game, number_of_searches, search_length)
-    print(f"Best move: {best_move}")
-    print(f"Final board:\n{final_board}")
-    if game.is_win():
-        print("You won!")
-        break
-
-if game.is_game_over() and not game.is_win():
-    print("Game over!")
+def main():
+    with Parallel(n_jobs=-1) as parallel:
+        agent = EnhancedMonteCarloAgent(parallel=parallel)
+        game = agent.initialize_game()
+
+        number_of_searches = 40  # Increase the number of searches for better decisions
+        search_length = 10  # Simulate longer sequences of moves
+
+        while not game.is_game_over():
+            final_board, best_move = agent.move(game, number_of_searches, search_length)
+            print(f"Best move: {best_move}")
+            print(f"Final board:\n{final_board}")
+            if game.is_win():
+                print("You won!")
+                break
+
+        if game.is_game_over() and not game.is_win():
+            print("Game over!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Bounded cache of heuristic scores keyed by packed board.
+
+The rollouts of one decision, and of consecutive decisions, keep reaching the
+same boards and their rotations and reflections. When the heuristic is
+symmetric the cache keys a board by the smallest of its 8 symmetric boards
+(Bitboard.symmetries), so all 8 share one entry; otherwise by the board
+itself.
+
+Entries are evicted with the CLOCK algorithm: every entry has a reference
+bit that is set on a hit, and on a miss with a full cache a hand sweeps the
+slots, clearing set bits, and evicts the first entry whose bit is clear. The
+number of entries is derived from a memory cap.
+"""
+
+import numpy as np
+from Bitboard import symmetries
+
+# Approximate memory per cached board in CPython (about 122 bytes measured
+# with tracemalloc): its dict entry, the key and value objects and its share
+# of the slot lists
+ENTRY_BYTES = 128
+
+
+def is_symmetric(weight_matrix):
+    """True if the matrix is unchanged by all 8 rotations and reflections."""
+    matrix = np.asarray(weight_matrix)
+    variants = [matrix, matrix.T]
+    return all(
+        np.array_equal(matrix, flipped)
+        for variant in variants
+        for flipped in (variant, variant[:, ::-1], variant[::-1], variant[::-1, ::-1])
+    )
+
+
+class EvalCache:
+    def __init__(self, score_fn, max_bytes=64 << 20, symmetric=True):
+        self.score_fn = score_fn
+        self.symmetric = symmetric
+        self.max_bytes = max_bytes
+        self.capacity = max(1, max_bytes // ENTRY_BYTES)
+        self.clear()
+
+    def clear(self):
+        self.slots = {}  # key -> slot
+        self.keys = []
+        self.values = []
+        self.referenced = bytearray()
+        self.hand = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getstate__(self):
+        # Worker processes start from an empty cache with the same settings
+        # instead of receiving a copy of every entry
+        state = self.__dict__.copy()
+        state.update(
+            slots={},
+            keys=[],
+            values=[],
+            referenced=bytearray(),
+            hand=0,
+            hits=0,
+            misses=0,
+            evictions=0,
+        )
+        return state
+
+    def __call__(self, board):
+        """Score of a packed board, computed by ``score_fn`` on a miss."""
+        key = min(symmetries(board)) if self.symmetric else board
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.hits += 1
+            self.referenced[slot] = 1
+            return self.values[slot]
+
+        self.misses += 1
+        value = self.score_fn(board)
+        if len(self.keys) < self.capacity:
+            self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            self.values.append(value)
+            self.referenced.append(0)
+            return value
+
+        referenced = self.referenced
+        hand = self.hand
+        while referenced[hand]:
+            referenced[hand] = 0
+            hand = (hand + 1) % self.capacity
+        del self.slots[self.keys[hand]]
+        self.slots[key] = hand
+        self.keys[hand] = key
+        self.values[hand] = value
+        self.hand = (hand + 1) % self.capacity
+        self.evictions += 1
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.keys),
+            "capacity": self.capacity,
+            "approx_bytes": len(self.keys) * ENTRY_BYTES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
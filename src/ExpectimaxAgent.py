@@ -0,0 +1,189 @@
+import numpy as np
+from Game2048 import Game2048
+from Bitboard import (
+    DIRECTIONS,
+    MOVE_FUNCTIONS,
+    ROW_MASK,
+    empty_cells,
+    encode_board,
+    transpose,
+)
+import time
+
+# Row heuristic weights
+LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+
+SPAWN_PROBABILITIES = ((1, 0.9), (2, 0.1))  # (rank, probability) for 2 and 4
+
+# (minimum empty cells, search depth): fewer empty cells means a more
+# dangerous position but also a smaller branching factor, so search deeper
+DEPTH_SCHEDULE = ((6, 1), (3, 2), (0, 3))
+
+
+def _build_heuristic_table():
+    rows = np.arange(1 << 16, dtype=np.int64)
+    line = ((rows[:, None] >> np.array([0, 4, 8, 12])) & 0xF).astype(float)
+
+    empty = (line == 0).sum(axis=1)
+    tile_sum = np.where(line > 0, line**SUM_POWER, 0).sum(axis=1)
+
+    # Count runs of equal non-empty tiles, ignoring empty cells in between
+    merges = np.zeros(len(rows))
+    counter = np.zeros(len(rows))
+    previous = np.zeros(len(rows))
+    for i in range(4):
+        rank = line[:, i]
+        tile = rank != 0
+        same = tile & (previous == rank)
+        flush = tile & ~same & (counter > 0)
+        merges += np.where(flush, 1 + counter, 0)
+        counter = np.where(same, counter + 1, np.where(flush, 0, counter))
+        previous = np.where(tile, rank, previous)
+    merges += np.where(counter > 0, 1 + counter, 0)
+
+    power = line**MONOTONICITY_POWER
+    decreasing = np.clip(power[:, :-1] - power[:, 1:], 0, None).sum(axis=1)
+    increasing = np.clip(power[:, 1:] - power[:, :-1], 0, None).sum(axis=1)
+
+    return (
+        LOST_PENALTY
+        + EMPTY_WEIGHT * empty
+        + MERGES_WEIGHT * merges
+        - MONOTONICITY_WEIGHT * np.minimum(decreasing, increasing)
+        - SUM_WEIGHT * tile_sum
+    ).tolist()
+
+
+HEURISTIC_TABLE = _build_heuristic_table()
+
+
+class ExpectimaxAgent:
+    """
+    Expectimax search over packed boards.
+
+    Chance nodes average over every empty cell with a 2 (p=0.9) or a 4
+    (p=0.1); decision nodes take the best move. Branches whose probability
+    drops under ``probability_cutoff`` are scored by the heuristic directly,
+    and chance node values are kept in a bounded transposition table.
+    """
+
+    def __init__(
+        self,
+        depth_schedule=DEPTH_SCHEDULE,
+        probability_cutoff=0.0001,
+        table_size=500000,
+    ):
+        self.depth_schedule = depth_schedule
+        self.probability_cutoff = probability_cutoff
+        self.table_size = table_size
+        self.transposition_table = {}
+
+    def heuristic_score(self, board):
+        t = transpose(board)
+        return (
+            HEURISTIC_TABLE[board & ROW_MASK]
+            + HEURISTIC_TABLE[(board >> 16) & ROW_MASK]
+            + HEURISTIC_TABLE[(board >> 32) & ROW_MASK]
+            + HEURISTIC_TABLE[(board >> 48) & ROW_MASK]
+            + HEURISTIC_TABLE[t & ROW_MASK]
+            + HEURISTIC_TABLE[(t >> 16) & ROW_MASK]
+            + HEURISTIC_TABLE[(t >> 32) & ROW_MASK]
+            + HEURISTIC_TABLE[(t >> 48) & ROW_MASK]
+        )
+
+    def search_depth(self, board):
+        empty = len(empty_cells(board))
+        for min_empty, depth in self.depth_schedule:
+            if empty >= min_empty:
+                return depth
+        return self.depth_schedule[-1][1]
+
+    def store(self, board, depth, value):
+        table = self.transposition_table
+        if len(table) >= self.table_size:
+            # Evict the oldest entry (dicts keep insertion order)
+            del table[next(iter(table))]
+        table[board] = (depth, value)
+
+    def expect_value(self, board, depth, probability):
+        if depth == 0 or probability < self.probability_cutoff:
+            return self.heuristic_score(board)
+
+        entry = self.transposition_table.get(board)
+        if entry is not None and entry[0] >= depth:
+            return entry[1]
+
+        empty = empty_cells(board)
+        probability /= len(empty)
+        total = 0.0
+        for cell in empty:
+            for rank, spawn_probability in SPAWN_PROBABILITIES:
+                total += spawn_probability * self.max_value(
+                    board | (rank << (4 * cell)),
+                    depth,
+                    probability * spawn_probability,
+                )
+        value = total / len(empty)
+
+        self.store(board, depth, value)
+        return value
+
+    def max_value(self, board, depth, probability):
+        best = 0.0  # No valid move: game over
+        for move_function in MOVE_FUNCTIONS:
+            new_board, _ = move_function(board)
+            if new_board != board:
+                best = max(best, self.expect_value(new_board, depth - 1, probability))
+        return best
+
+    def move(self, game, searches_per_move=None, search_length=None, *, depth=None):
+        # The search arguments of the Monte Carlo agents are accepted so the
+        # agent plugs into the same game loops; the depth comes from the board
+        board = encode_board(game.get_state())
+        if depth is None:
+            depth = self.search_depth(board)
+
+        best_move = None
+        best_score = -1.0
+        for direction, move_function in zip(DIRECTIONS, MOVE_FUNCTIONS):
+            new_board, _ = move_function(board)
+            if new_board == board:
+                continue
+            score = self.expect_value(new_board, depth, 1.0)
+            if score > best_score:
+                best_score = score
+                best_move = direction
+
+        game.move(best_move)
+
+        return game.get_state(), best_move
+
+
+def main():
+    game = Game2048()
+    agent = ExpectimaxAgent()
+    game.reset()
+
+    while not game.is_game_over():
+        final_board, best_move = agent.move(game)
+        print(f"Best move: {best_move}")
+        print(f"Final board:\n{final_board}")
+
+    if game.is_win():
+        print("You won!")
+    else:
+        print("Game over!")
+
+    print(game.get_score())
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    main()
+    print("--- %s seconds ---" % (time.time() - start_time))
@@ -1,15 +1,14 @@
-import os
-import sys
+"""
+Headless 2048 engine.
 
-sys.stdout = open(os.devnull, "w")
-sys.stderr = open(os.devnull, "w")
+This module has no pygame dependency so it can be imported cheaply by
+simulation workers. Drawing goes through the optional GameRenderer frontend,
+which is imported lazily the first time a board is drawn.
+"""
 
+import copy
 import numpy as np
-import random
-import pygame
-
-sys.stdout = sys.__stdout__
-sys.stderr = sys.__stderr__
+from Bitboard import MASK_MOVES, encode_board, encode_values, valid_move_mask
 
 # Colors
 BACKGROUND_COLOR = (30, 30, 30)
@@ -35,35 +34,61 @@ TILE_COLORS = {
 }
 FONT_COLOR = (119, 110, 101)
 
-# Initialize Pygame
-pygame.init()
-
 # Game Constants
 SIZE = 4
 WIDTH = 400
 HEIGHT = 400
 TILE_SIZE = WIDTH // SIZE
-FONT = pygame.font.SysFont("arial", 24)
-BOLD_FONT = pygame.font.SysFont("arial", 24, bold=True)
+
+
+def _line_mask(board):
+    # Bit 0: some row can move left, bit 1: some row can move right
+    nonzero = board != 0
+    merge = nonzero[:, 1:] & (board[:, 1:] == board[:, :-1])
+    left = (~nonzero[:, :-1] & nonzero[:, 1:]) | merge
+    right = (nonzero[:, :-1] & ~nonzero[:, 1:]) | merge
+    return int(left.any()) | int(right.any()) << 1
+
+
+def array_valid_move_mask(board):
+    """valid_move_mask of a square board of tile values, of any size."""
+    return _line_mask(board) | _line_mask(board.T) << 2
 
 
 class Game2048:
-    def __init__(self):
+    def __init__(self, rng=None, size=SIZE):
+        # Tile spawns come from this generator only, so a seeded game always
+        # gets the same spawn sequence for the same moves
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Boards of any size play on the NumPy board; 4x4 boards also use the
+        # packed 64-bit tables of Bitboard.py for move legality
+        self.size = size
+        self._valid_mask = None
+        # (cell, value) of the tile spawned by the last move, None if it spawned none
+        self.last_spawn = None
         self.reset()
         self.score = 0
 
     def reset(self):
-        self.board = np.zeros((4, 4), dtype=int)
+        self.board = np.zeros((self.size, self.size), dtype=int)
         self.add_new_tile()
         self.add_new_tile()
         self.score = 0
         return self.board
 
     def add_new_tile(self):
-        empty_cells = list(zip(*np.nonzero(self.board == 0)))
-        if empty_cells:
-            x, y = random.choice(empty_cells)
-            self.board[x, y] = 2 if random.random() < 0.9 else 4
+        empty_cells = np.flatnonzero(self.board == 0)
+        if len(empty_cells):
+            cell = empty_cells[int(self.rng.random() * len(empty_cells))]
+            value = 2 if self.rng.random() < 0.9 else 4
+            self.board.flat[cell] = value
+            self.last_spawn = (int(cell), value)
+        else:
+            self.last_spawn = None
+
+    def place_tile(self, cell, value):
+        """Put a tile of ``value`` on ``cell`` (row-major index)."""
+        self.board.flat[cell] = value
 
     def slide_and_merge(self, row):
         new_row = np.zeros_like(row)
@@ -84,61 +109,105 @@ class Game2048:
 
         return new_row, score_increment
 
-    def move(self, direction):
-        moved = False
+    def peek_move(self, direction):
+        """Return the board and score increment of a move without applying it."""
+        new_board = self.board.copy()
         total_score_increment = 0
 
-        for i in range(4):
+        for i in range(self.size):
             if direction == "left":
-                new_row, score_increment = self.slide_and_merge(self.board[i])
-                if not np.array_equal(self.board[i], new_row):
-                    moved = True
-                    self.board[i] = new_row
-                    total_score_increment += score_increment
+                new_row, score_increment = self.slide_and_merge(new_board[i])
+                new_board[i] = new_row
             elif direction == "right":
-                new_row, score_increment = self.slide_and_merge(self.board[i][::-1])
-                new_row = new_row[::-1]
-                if not np.array_equal(self.board[i], new_row):
-                    moved = True
-                    self.board[i] = new_row
-                    total_score_increment += score_increment
+                new_row, score_increment = self.slide_and_merge(new_board[i][::-1])
+                new_board[i] = new_row[::-1]
             elif direction == "up":
-                new_row, score_increment = self.slide_and_merge(self.board[:, i])
-                if not np.array_equal(self.board[:, i], new_row):
-                    moved = True
-                    self.board[:, i] = new_row
-                    total_score_increment += score_increment
+                new_row, score_increment = self.slide_and_merge(new_board[:, i])
+                new_board[:, i] = new_row
             elif direction == "down":
-                new_row, score_increment = self.slide_and_merge(self.board[:, i][::-1])
-                new_row = new_row[::-1]
-                if not np.array_equal(self.board[:, i], new_row):
-                    moved = True
-                    self.board[:, i] = new_row
-                    total_score_increment += score_increment
+                new_row, score_increment = self.slide_and_merge(new_board[:, i][::-1])
+                new_board[:, i] = new_row[::-1]
+            else:
+                continue
+            total_score_increment += score_increment
+
+        return new_board, total_score_increment
+
+    def move(self, direction):
+        new_board, score_increment = self.peek_move(direction)
+        moved = not np.array_equal(self.board, new_board)
 
         if moved:
+            self.board[:] = new_board
             self.add_new_tile()
-            self.score += total_score_increment
+            self.score += score_increment
+        else:
+            self.last_spawn = None
 
         return moved
 
+    def apply_move(self, direction, spawn):
+        """
+        move() with a given spawn instead of a random one, for replaying
+        recorded games. ``spawn`` is a (cell, value) pair or None.
+        """
+        new_board, score_increment = self.peek_move(direction)
+        self.board[:] = new_board
+        if spawn is not None:
+            self.place_tile(*spawn)
+        self.score += score_increment
+        self.last_spawn = spawn
+
+    def valid_move_mask(self):
+        """4-bit mask of the valid moves, bit i for left/right/up/down."""
+        # Cached for the packed board it was computed on, so any change to the
+        # board (moves, spawns, restore or direct edits) invalidates it
+        if self.size != SIZE:
+            return array_valid_move_mask(self.board)
+        values = self.board.ravel().tolist()
+        # The packed tables cap tiles at 32768 and never merge two of them
+        if max(values) >= 32768:
+            return array_valid_move_mask(self.board)
+        packed = encode_values(values)
+        cached = self._valid_mask
+        if cached is None or cached[0] != packed:
+            cached = self._valid_mask = (packed, valid_move_mask(packed))
+        return cached[1]
+
     def get_valid_moves(self):
-        valid_moves = []
-        for direction in ["left", "right", "up", "down"]:
-            copy_board = self.board.copy()
-            copy_score = self.score
-            if self.move(direction):
-                valid_moves.append(direction)
-                self.board = copy_board
-                self.score = copy_score
-        return valid_moves
+        return list(MASK_MOVES[self.valid_move_mask()])
 
     def is_game_over(self):
-        return len(self.get_valid_moves()) == 0
+        return self.valid_move_mask() == 0
+
+    def snapshot(self):
+        return self.board.copy(), self.score
+
+    def restore(self, snapshot):
+        board, self.score = snapshot
+        self.board = board.copy()
+
+    def clone(self, rng=None):
+        """
+        Cheap copy of the game for search, instead of copy.deepcopy. Pass
+        ``rng`` so the clone's spawns don't draw from this game's generator.
+        """
+        clone = copy.copy(self)
+        clone.restore(self.snapshot())
+        if rng is not None:
+            clone.rng = rng
+        return clone
 
     def get_state(self):
         return self.board.copy()
 
+    def get_packed_state(self):
+        """
+        Board packed into 4-bit log2 nibbles, row-major: the 64-bit layout of
+        Bitboard.py on 4x4 boards, a longer Python int on larger ones.
+        """
+        return encode_board(self.board)
+
     def move_left(self):
         return self.move("left")
 
@@ -158,40 +227,14 @@ class Game2048:
         return np.max(self.board)
 
     def draw_board(self, screen):
-        screen.fill(BACKGROUND_COLOR)
-        for i in range(SIZE):
-            for j in range(SIZE):
-                value = self.board[i][j]
-                color = TILE_COLORS.get(value, EMPTY_TILE_COLOR)
-                pygame.draw.rect(
-                    screen, color, (j * TILE_SIZE, i * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                )
-                if value != 0:
-                    text_surface = BOLD_FONT.render(
-                        str(value), True, FONT_COLOR if value <= 4 else (255, 255, 255)
-                    )
-                    text_rect = text_surface.get_rect(
-                        center=(
-                            j * TILE_SIZE + TILE_SIZE / 2,
-                            i * TILE_SIZE + TILE_SIZE / 2,
-                        )
-                    )
-                    screen.blit(text_surface, text_rect)
-
-        self.draw_winning_message(screen) if self.is_win() else None
-        pygame.display.flip()
+        from GameRenderer import draw_board
+
+        draw_board(self, screen)
 
     def draw_winning_message(self, screen):
-        # Create a semi-transparent overlay
-        overlay = pygame.Surface((WIDTH, HEIGHT))
-        overlay.set_alpha(200)  # Set transparency level (0-255)
-        overlay.fill((0, 0, 0))  # Fill it with black color
-        screen.blit(overlay, (0, 0))
+        from GameRenderer import draw_winning_message
 
-        # Render the winning text
-        winning_text = BOLD_FONT.render("You won!", True, (255, 255, 255))
-        text_rect = winning_text.get_rect(center=(WIDTH / 2, HEIGHT / 2))
-        screen.blit(winning_text, text_rect)
+        draw_winning_message(screen)
 
     def get_score(self):
         return self.score
@@ -199,34 +242,9 @@ class Game2048:
 
 # Main loop
 def main():
-    # Initialize game
-    game = Game2048()
-
-    # Suppress stdout
-    sys.stdout = open(os.devnull, "w")
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("2048")
-    game.reset()
-
-    while not game.is_game_over():
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    game.move("left")
-                elif event.key == pygame.K_RIGHT:
-                    game.move("right")
-                elif event.key == pygame.K_UP:
-                    game.move("up")
-                elif event.key == pygame.K_DOWN:
-                    game.move("down")
-
-        game.draw_board(screen)
-
-    # Restore stdout
-    sys.stdout = sys.__stdout__
+    from GameRenderer import main as play
+
+    play()
 
 
 if __name__ == "__main__":
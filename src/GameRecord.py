@@ -0,0 +1,206 @@
+"""
+Compact binary records of played games.
+
+A record directory holds three flat binary files that only ever grow:
+
+    games.bin        GAME_DTYPE, one entry per finished game
+    moves.bin        MOVE_DTYPE, 7 bytes per move of every game
+    checkpoints.bin  uint64 packed boards: the board before every
+                     CHECKPOINT_INTERVAL-th move of every game
+
+A move entry holds the direction index, the cell and log2 value of the tile
+spawned after the move and the score the move gained. Starting from a game's
+first checkpoint (the board after reset) the moves replay the game exactly,
+without any random draws; the later checkpoints let analyses start in the
+middle of a game.
+
+A game's moves and checkpoints are written before its games.bin entry, so
+an interrupted run never leaves a half-recorded game in the index; the
+writer drops the trailing bytes of such a game, and of a partly written
+index entry, when it reopens the files. Games already in the index are not
+appended again, so a resumed run that replays a recorded game keeps one copy.
+All three files are read with np.memmap, so statistics over millions of
+moves are plain NumPy operations on the mapped arrays.
+"""
+
+import os
+import numpy as np
+from Game2048 import Game2048
+from Bitboard import DIRECTIONS, DIRECTION_INDEX, decode_board
+
+MOVE_DTYPE = np.dtype(
+    [
+        ("direction", np.uint8),  # Bitboard.DIRECTIONS index
+        ("spawn_cell", np.uint8),  # Row-major cell 0-15
+        ("spawn_rank", np.uint8),  # log2 of the spawned tile, 0 for none
+        ("score_delta", "<u4"),
+    ]
+)
+GAME_DTYPE = np.dtype(
+    [
+        ("game", "<u4"),  # Index of the game in its simulation run
+        ("moves", "<u4"),
+        ("move_offset", "<u8"),
+        ("checkpoint_offset", "<u8"),
+        ("score", "<u8"),
+        ("max_tile", "<u4"),
+        ("final_board", "<u8"),
+    ]
+)
+CHECKPOINT_INTERVAL = 64
+
+GAMES_FILE = "games.bin"
+MOVES_FILE = "moves.bin"
+CHECKPOINTS_FILE = "checkpoints.bin"
+
+
+def checkpoint_count(moves):
+    return moves // CHECKPOINT_INTERVAL + 1
+
+
+class GameRecord:
+    """Moves and checkpoints of one game, collected while it is played."""
+
+    def __init__(self, game):
+        self.moves = []
+        self.checkpoints = [game.get_packed_state()]
+        self.score = 0
+        self.max_tile = 0
+        self.final_board = 0
+
+    def add_move(self, game, direction, score_delta):
+        """Record the move ``game`` just made and the tile it spawned."""
+        if game.last_spawn is None:
+            cell, rank = 0, 0
+        else:
+            cell, value = game.last_spawn
+            rank = int(value).bit_length() - 1
+        self.moves.append((DIRECTION_INDEX[direction], cell, rank, score_delta))
+        if len(self.moves) % CHECKPOINT_INTERVAL == 0:
+            self.checkpoints.append(game.get_packed_state())
+
+    def finish(self, game):
+        self.score = int(game.get_score())
+        self.max_tile = int(game.get_max_tile())
+        self.final_board = game.get_packed_state()
+        return self
+
+
+class GameRecordWriter:
+    """Append-only writer for a record directory."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        games = _read(os.path.join(path, GAMES_FILE), GAME_DTYPE)
+        self.recorded = set(games["game"].tolist())
+        game_count = len(games)  # Whole entries only
+        self.move_offset = 0
+        self.checkpoint_offset = 0
+        if len(games):
+            last = games[-1]
+            self.move_offset = int(last["move_offset"] + last["moves"])
+            self.checkpoint_offset = int(
+                last["checkpoint_offset"] + checkpoint_count(int(last["moves"]))
+            )
+        del games
+
+        # Drop a partly written index entry and the moves and checkpoints of
+        # a game cut short by a crash
+        self.files = {}
+        for name, dtype, count in (
+            (GAMES_FILE, GAME_DTYPE, game_count),
+            (MOVES_FILE, MOVE_DTYPE, self.move_offset),
+            (CHECKPOINTS_FILE, np.uint64, self.checkpoint_offset),
+        ):
+            file = open(os.path.join(path, name), "ab")
+            file.truncate(count * np.dtype(dtype).itemsize)
+            self.files[name] = file
+
+    def append(self, index, record):
+        """Append game ``index``, unless it is already recorded."""
+        if index in self.recorded:
+            return
+        moves = np.array(record.moves, dtype=MOVE_DTYPE)
+        checkpoints = np.array(record.checkpoints, dtype=np.uint64)
+        entry = np.array(
+            [
+                (
+                    index,
+                    len(moves),
+                    self.move_offset,
+                    self.checkpoint_offset,
+                    record.score,
+                    record.max_tile,
+                    record.final_board,
+                )
+            ],
+            dtype=GAME_DTYPE,
+        )
+        self.files[MOVES_FILE].write(moves.tobytes())
+        self.files[CHECKPOINTS_FILE].write(checkpoints.tobytes())
+        self.files[MOVES_FILE].flush()
+        self.files[CHECKPOINTS_FILE].flush()
+        self.files[GAMES_FILE].write(entry.tobytes())
+        self.files[GAMES_FILE].flush()
+        self.move_offset += len(moves)
+        self.checkpoint_offset += len(checkpoints)
+        self.recorded.add(index)
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+
+def _read(path, dtype):
+    # np.memmap cannot map an empty file
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    count = os.path.getsize(path) // np.dtype(dtype).itemsize
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class GameRecords:
+    """Memory-mapped reader for a record directory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.games = _read(os.path.join(path, GAMES_FILE), GAME_DTYPE)
+        self.moves = _read(os.path.join(path, MOVES_FILE), MOVE_DTYPE)
+        self.checkpoints = _read(os.path.join(path, CHECKPOINTS_FILE), np.uint64)
+
+    def __len__(self):
+        return len(self.games)
+
+    def game_moves(self, i):
+        entry = self.games[i]
+        start = int(entry["move_offset"])
+        return self.moves[start : start + int(entry["moves"])]
+
+    def game_checkpoints(self, i):
+        entry = self.games[i]
+        start = int(entry["checkpoint_offset"])
+        return self.checkpoints[start : start + checkpoint_count(int(entry["moves"]))]
+
+    def replay(self, i, until=None, engine=Game2048):
+        """
+        Replay game ``i`` on a new ``engine`` game, up to (not including) move
+        ``until``, starting from the closest checkpoint before it.
+        """
+        moves = self.game_moves(i)
+        until = len(moves) if until is None else until
+        start = until // CHECKPOINT_INTERVAL * CHECKPOINT_INTERVAL
+        game = engine()
+        game.board = decode_board(
+            int(self.game_checkpoints(i)[start // CHECKPOINT_INTERVAL])
+        )
+        game.score = int(moves["score_delta"][:start].sum())
+        for direction, cell, rank, score_delta in moves[start:until].tolist():
+            spawn = (cell, 1 << rank) if rank else None
+            game.apply_move(DIRECTIONS[direction], spawn)
+        return game
+
+    def direction_counts(self):
+        """Number of recorded moves in each direction, over all games."""
+        return np.bincount(self.moves["direction"], minlength=len(DIRECTIONS))
@@ -0,0 +1,120 @@
+"""
+Optional pygame frontend for Game2048.
+
+The engine in Game2048.py never imports pygame; this module is only imported
+when a board is actually drawn or a game is played with the keyboard.
+"""
+
+import os
+import sys
+
+sys.stdout = open(os.devnull, "w")
+sys.stderr = open(os.devnull, "w")
+
+import pygame
+
+sys.stdout = sys.__stdout__
+sys.stderr = sys.__stderr__
+
+from Game2048 import (
+    Game2048,
+    BACKGROUND_COLOR,
+    EMPTY_TILE_COLOR,
+    TILE_COLORS,
+    FONT_COLOR,
+    WIDTH,
+    HEIGHT,
+)
+
+# Initialize Pygame
+pygame.init()
+
+FONT = pygame.font.SysFont("arial", 24)
+BOLD_FONT = pygame.font.SysFont("arial", 24, bold=True)
+
+
+def draw_board(game, screen):
+    screen.fill(BACKGROUND_COLOR)
+    tile_size = WIDTH // game.size
+    for i in range(game.size):
+        for j in range(game.size):
+            value = game.board[i][j]
+            color = TILE_COLORS.get(value, EMPTY_TILE_COLOR)
+            pygame.draw.rect(
+                screen, color, (j * tile_size, i * tile_size, tile_size, tile_size)
+            )
+            if value != 0:
+                text_surface = BOLD_FONT.render(
+                    str(value), True, FONT_COLOR if value <= 4 else (255, 255, 255)
+                )
+                text_rect = text_surface.get_rect(
+                    center=(
+                        j * tile_size + tile_size / 2,
+                        i * tile_size + tile_size / 2,
+                    )
+                )
+                screen.blit(text_surface, text_rect)
+
+    draw_winning_message(screen) if game.is_win() else None
+    pygame.display.flip()
+
+
+def draw_winning_message(screen):
+    # Create a semi-transparent overlay
+    overlay = pygame.Surface((WIDTH, HEIGHT))
+    overlay.set_alpha(200)  # Set transparency level (0-255)
+    overlay.fill((0, 0, 0))  # Fill it with black color
+    screen.blit(overlay, (0, 0))
+
+    # Render the winning text
+    winning_text = BOLD_FONT.render("You won!", True, (255, 255, 255))
+    text_rect = winning_text.get_rect(center=(WIDTH / 2, HEIGHT / 2))
+    screen.blit(winning_text, text_rect)
+
+
+def create_screen(caption="2048"):
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption(caption)
+    return screen
+
+
+def handle_quit_events():
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            sys.exit()
+
+
+# Main loop
+def main():
+    # Initialize game
+    game = Game2048()
+
+    # Suppress stdout
+    sys.stdout = open(os.devnull, "w")
+    screen = create_screen("2048")
+    game.reset()
+
+    while not game.is_game_over():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT:
+                    game.move("left")
+                elif event.key == pygame.K_RIGHT:
+                    game.move("right")
+                elif event.key == pygame.K_UP:
+                    game.move("up")
+                elif event.key == pygame.K_DOWN:
+                    game.move("down")
+
+        draw_board(game, screen)
+
+    # Restore stdout
+    sys.stdout = sys.__stdout__
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Bitboard game that keeps the TableHeuristic components up to date.
+
+Every change of the packed board (moves, tile spawns, restores) goes through
+one setter that compares the old and new board and only re-reads what
+changed: the table entries of the rows and columns whose 16-bit value
+differs, and the clustering penalty of the changed cells and their
+neighbours. A spawn touches one row, one column and at most 9 cells, so
+scoring a rollout step no longer rescans the whole board.
+
+The running components are exactly those of TableHeuristic.components.
+"""
+
+from BitboardGame2048 import BitboardGame2048
+from Bitboard import ROW_MASK, transpose
+from TableHeuristic import NEIGHBORS, TILE_VALUES, TableHeuristic
+
+SHIFTS = (0, 16, 32, 48)
+
+# Bit mask of each cell and its neighbours: the cells whose clustering
+# penalty can change when that cell changes
+NEIGHBORHOOD_MASKS = [
+    sum(1 << n for n in NEIGHBORS[cell]) | 1 << cell for cell in range(16)
+]
+
+
+class HeuristicGame2048(BitboardGame2048):
+    def __init__(self, rng=None, evaluator=None):
+        self.evaluator = evaluator if evaluator is not None else TableHeuristic()
+        self._clear_components()
+        super().__init__(rng)
+
+    @classmethod
+    def from_game(cls, game, evaluator=None, rng=None):
+        """Copy of any 4x4 Game2048 without resetting it (no spawns are drawn)."""
+        if game.size != 4:
+            raise ValueError(
+                f"HeuristicGame2048 only plays 4x4 boards, not {game.size}x{game.size}"
+            )
+        copy = cls.__new__(cls)
+        copy.evaluator = evaluator if evaluator is not None else TableHeuristic()
+        copy._clear_components()
+        copy.rng = rng if rng is not None else game.rng
+        copy._valid_mask = None
+        copy.last_spawn = None
+        copy.size = 4
+        copy.bitboard = game.get_packed_state()
+        copy.score = game.score
+        return copy
+
+    def _clear_components(self):
+        # Running components of the empty board
+        self._bitboard = 0
+        self._transposed = 0
+        self.empty_cells = 16
+        self.row_max = [0, 0, 0, 0]
+        self.monotonicity = 0
+        self.smoothness = 0
+        self.weighted_tiles = 0
+        self.values = [0] * 16
+        self.cell_clustering = [0] * 16
+        self.clustering = 0
+
+    @property
+    def bitboard(self):
+        return self._bitboard
+
+    @bitboard.setter
+    def bitboard(self, board):
+        old = self._bitboard
+        if board == old:
+            return
+        self._bitboard = board
+        evaluator = self.evaluator
+
+        for i, shift in enumerate(SHIFTS):
+            old_row = (old >> shift) & ROW_MASK
+            new_row = (board >> shift) & ROW_MASK
+            if old_row != new_row:
+                self.empty_cells += (
+                    evaluator.empty_table[new_row] - evaluator.empty_table[old_row]
+                )
+                self.row_max[i] = evaluator.max_table[new_row]
+                self.monotonicity += (
+                    evaluator.monotonicity_table[new_row]
+                    - evaluator.monotonicity_table[old_row]
+                )
+                self.smoothness += (
+                    evaluator.smoothness_table[new_row]
+                    - evaluator.smoothness_table[old_row]
+                )
+                weighted_table = evaluator.weighted_tables[i]
+                self.weighted_tiles += weighted_table[new_row] - weighted_table[old_row]
+
+        old_transposed = self._transposed
+        transposed = self._transposed = transpose(board)
+        for shift in SHIFTS:
+            old_col = (old_transposed >> shift) & ROW_MASK
+            new_col = (transposed >> shift) & ROW_MASK
+            if old_col != new_col:
+                self.monotonicity += (
+                    evaluator.monotonicity_table[new_col]
+                    - evaluator.monotonicity_table[old_col]
+                )
+                self.smoothness += (
+                    evaluator.smoothness_table[new_col]
+                    - evaluator.smoothness_table[old_col]
+                )
+
+        # Clustering of a cell depends on its 3x3 neighbourhood
+        values = self.values
+        changed = old ^ board
+        affected = 0
+        for cell in range(16):
+            if (changed >> (4 * cell)) & 0xF:
+                values[cell] = TILE_VALUES[(board >> (4 * cell)) & 0xF]
+                affected |= NEIGHBORHOOD_MASKS[cell]
+        cell_clustering = self.cell_clustering
+        total = self.clustering
+        for cell in range(16):
+            if affected >> cell & 1:
+                value = values[cell]
+                if value:
+                    clustering = min([abs(value - values[n]) for n in NEIGHBORS[cell]])
+                else:
+                    clustering = 0
+                total += clustering - cell_clustering[cell]
+                cell_clustering[cell] = clustering
+        self.clustering = total
+
+    def clone(self, rng=None):
+        clone = super().clone(rng)
+        # copy.copy shares the running lists with this game
+        clone.row_max = self.row_max.copy()
+        clone.values = self.values.copy()
+        clone.cell_clustering = self.cell_clustering.copy()
+        return clone
+
+    def heuristic_components(self):
+        """Same tuple as TableHeuristic.components for the current board."""
+        return (
+            self.empty_cells,
+            max(self.row_max),
+            self.monotonicity,
+            self.smoothness,
+            self.weighted_tiles,
+            self.clustering,
+        )
+
+    def heuristic_score(self):
+        return self.evaluator.combine(self.heuristic_components())
@@ -0,0 +1,552 @@
+"""
+Optional JIT-compiled rollout kernel for the packed 4x4 board.
+
+When Numba is installed, whole batches of rollouts (moves, merges, spawns and
+the per-step heuristic) run in one compiled loop; otherwise the agents keep
+using the NumPy BatchSimulator. The choice is made once at import time and
+can be forced to NumPy with ``GAME2048_ENGINE=numpy``.
+
+Numba itself is only imported when the first JitSimulator is created, so
+importing the agents stays cheap. Compiled kernels are cached on disk
+(``cache=True``): only the first process ever compiles them and later
+processes, including joblib workers, load the cached machine code.
+``warm_up()`` compiles or loads them up front, before a worker pool starts.
+
+Randomness comes in as an array of uniforms drawn from the caller's NumPy
+Generator, consumed exactly like the Python engines consume ``rng.random()``
+(one draw per rollout move, two per spawn), so a kernel rollout can be
+replayed move for move on Game2048 (see test/jit_parity.py). Rollout moves
+are picked by a RolloutPolicy, uniformly at random by default.
+"""
+
+import importlib.util
+import os
+import numpy as np
+import Bitboard
+from BatchSimulator import BatchSimulator, ROW_SHIFTS, batch_ranks
+from RolloutPolicy import (
+    CORNER,
+    CORNER_PRIORITY,
+    EPSILON_GREEDY,
+    GREEDY,
+    RANDOM,
+    GreedyPolicy,
+)
+from TableHeuristic import NEIGHBORS
+
+JIT_AVAILABLE = (
+    importlib.util.find_spec("numba") is not None
+    and os.environ.get("GAME2048_ENGINE") != "numpy"
+)
+ENGINE = "numba" if JIT_AVAILABLE else "numpy"
+
+# Kernels replaced by their compiled versions on first use. Without Numba
+# they stay plain Python, which is slow but lets the parity check run anywhere
+KERNELS = [
+    "_transpose",
+    "_move",
+    "_spawn",
+    "_score",
+    "_choose",
+    "_rollouts",
+    "_policy_rollouts",
+    "_first_moves",
+]
+_compiled = False
+
+
+# One row per direction: left/right tables take rows, up/down take the rows
+# of the transposed board
+MOVE_TABLES = np.array(
+    [
+        Bitboard.ROW_LEFT_TABLE,
+        Bitboard.ROW_RIGHT_TABLE,
+        Bitboard.COL_UP_TABLE,
+        Bitboard.COL_DOWN_TABLE,
+    ],
+    dtype=np.uint64,
+)
+SCORE_TABLES = np.array(
+    [
+        Bitboard.SCORE_LEFT_TABLE,
+        Bitboard.SCORE_RIGHT_TABLE,
+        Bitboard.SCORE_LEFT_TABLE,
+        Bitboard.SCORE_RIGHT_TABLE,
+    ],
+    dtype=np.int64,
+)
+
+# Neighbour cells of each cell, padded with -1
+NEIGHBOR_TABLE = np.full((16, 8), -1, dtype=np.int64)
+for _cell, _neighbors in enumerate(NEIGHBORS):
+    NEIGHBOR_TABLE[_cell, : len(_neighbors)] = _neighbors
+
+# Uniforms used by one rollout step: the random move and the spawn
+DRAWS_PER_STEP = 3
+
+_ROW_MASK = np.uint64(0xFFFF)
+_NIBBLE_MASK = np.uint64(0xF)
+
+
+# LineScores unpickled in this process, by source. Unpickled TableHeuristics
+# are shared per process too, so their identity is a valid key
+_unpickled = {}
+
+
+def _unpickle_line_score(name, *args):
+    if (name,) + args not in _unpickled:
+        _unpickled[(name,) + args] = getattr(LineScore, name)(*args)
+    return _unpickled[(name,) + args]
+
+
+class LineScore:
+    """
+    Heuristic in the form the kernel evaluates:
+
+        sum(row_tables[i][row i]) + sum(col_table[column j])
+        + max_weight * max_tile - clustering_weight * clustering
+
+    which covers the Monte Carlo agents' max tile, the Enhanced agent's
+    empty cells + max tile and every TableHeuristic.
+    """
+
+    def __init__(self, row_tables, col_table, max_weight=0.0, clustering_weight=0.0):
+        self.row_tables = np.asarray(row_tables, dtype=np.float64)
+        self.col_table = np.asarray(col_table, dtype=np.float64)
+        self.max_weight = float(max_weight)
+        self.clustering_weight = float(clustering_weight)
+        self._lists = None
+        # (constructor name, arguments) of the tables built by a classmethod
+        self.source = None
+
+    def __reduce__(self):
+        # Tables built by a classmethod are rebuilt in the worker, once per
+        # process, instead of being pickled (about 2.6 MB) with every task
+        if self.source is not None:
+            return _unpickle_line_score, self.source
+        return LineScore, (
+            self.row_tables,
+            self.col_table,
+            self.max_weight,
+            self.clustering_weight,
+        )
+
+    @classmethod
+    def max_tile(cls):
+        line_score = cls(np.zeros((4, 1 << 16)), np.zeros(1 << 16), max_weight=1.0)
+        line_score.source = ("max_tile",)
+        return line_score
+
+    @classmethod
+    def empty_and_max(cls):
+        rows = np.arange(1 << 16)
+        empty = sum(((rows >> shift) & 0xF) == 0 for shift in (0, 4, 8, 12))
+        line_score = cls(np.tile(empty, (4, 1)), np.zeros(1 << 16), max_weight=1.0)
+        line_score.source = ("empty_and_max",)
+        return line_score
+
+    @classmethod
+    def from_heuristic(cls, evaluator):
+        tables = evaluator.tables
+        w = evaluator.weights
+        lines = w["smoothness"] * tables["smoothness"] - w["monotonicity"] * (
+            tables["monotonicity"]
+        )
+        rows = (
+            w["empty_cells"] * tables["empty_cells"]
+            + lines
+            + w["weighted_tiles"] * tables["weighted_tiles"]
+        )
+        line_score = cls(rows, lines, w["max_tile"], w["clustering"])
+        line_score.source = ("from_heuristic", evaluator)
+        return line_score
+
+    def score(self, board):
+        """The kernel's score of one packed board, with the same arithmetic."""
+        if self._lists is None:
+            self._lists = self.row_tables.tolist(), self.col_table.tolist()
+        row_tables, col_table = self._lists
+        total = 0.0
+        t = Bitboard.transpose(board)
+        for i in range(4):
+            total += row_tables[i][(board >> (16 * i)) & 0xFFFF]
+            total += col_table[(t >> (16 * i)) & 0xFFFF]
+
+        ranks = [(board >> (4 * i)) & 0xF for i in range(16)]
+        values = [1 << rank if rank else 0 for rank in ranks]
+        total += self.max_weight * max(values)
+        if self.clustering_weight != 0.0:
+            clustering = sum(
+                min(abs(value - values[n]) for n in NEIGHBORS[i])
+                for i, value in enumerate(values)
+                if value
+            )
+            total -= self.clustering_weight * clustering
+        return total
+
+    def batch_score(self, boards):
+        """score for a (N,) array of packed boards, with NumPy."""
+        boards = np.asarray(boards, dtype=np.uint64)
+        rows = ((boards[:, None] >> ROW_SHIFTS) & _ROW_MASK).astype(np.int64)
+        t = Bitboard.transpose(boards)
+        cols = ((t[:, None] >> ROW_SHIFTS) & _ROW_MASK).astype(np.int64)
+        # Summed in the order of score, so both give the same floats
+        total = np.zeros(len(boards))
+        for i in range(4):
+            total += self.row_tables[i, rows[:, i]]
+            total += self.col_table[cols[:, i]]
+
+        ranks = batch_ranks(boards)
+        values = np.where(ranks > 0, 1 << ranks, 0)
+        total += self.max_weight * values.max(axis=1)
+        if self.clustering_weight != 0.0:
+            differences = np.where(
+                NEIGHBOR_TABLE >= 0,
+                np.abs(values[:, :, None] - values[:, NEIGHBOR_TABLE]),
+                1 << 40,
+            )
+            clustering = np.where(values > 0, differences.min(axis=2), 0).sum(axis=1)
+            total -= self.clustering_weight * clustering
+        return total
+
+
+def _transpose(board):
+    a1 = board & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = board & np.uint64(0x0000F0F00000F0F0)
+    a3 = board & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << np.uint64(12)) | (a3 >> np.uint64(12))
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> np.uint64(24)) | (b3 << np.uint64(24))
+
+
+def _move(board, direction, move_tables, score_tables):
+    """Board and score increment after a direction index, without spawning."""
+    result = np.uint64(0)
+    score = 0
+    if direction < 2:
+        for i in range(4):
+            shift = np.uint64(16 * i)
+            row = (board >> shift) & _ROW_MASK
+            result |= move_tables[direction, row] << shift
+            score += score_tables[direction, row]
+    else:
+        t = _transpose(board)
+        for i in range(4):
+            row = (t >> np.uint64(16 * i)) & _ROW_MASK
+            result |= move_tables[direction, row] << np.uint64(4 * i)
+            score += score_tables[direction, row]
+    return result, score
+
+
+def _spawn(board, cell_draw, rank_draw):
+    """Game2048.add_new_tile on a packed board, given its two uniform draws."""
+    count = 0
+    for i in range(16):
+        if (board >> np.uint64(4 * i)) & _NIBBLE_MASK == 0:
+            count += 1
+    if count == 0:
+        return board
+    k = int(cell_draw * count)
+    for i in range(16):
+        if (board >> np.uint64(4 * i)) & _NIBBLE_MASK == 0:
+            if k == 0:
+                rank = np.uint64(1) if rank_draw < 0.9 else np.uint64(2)
+                return board | (rank << np.uint64(4 * i))
+            k -= 1
+    return board
+
+
+def _score(board, row_tables, col_table, max_weight, clustering_weight, neighbors):
+    total = 0.0
+    t = _transpose(board)
+    for i in range(4):
+        shift = np.uint64(16 * i)
+        total += row_tables[i, (board >> shift) & _ROW_MASK]
+        total += col_table[(t >> shift) & _ROW_MASK]
+
+    values = np.zeros(16, dtype=np.int64)
+    max_value = 0
+    for i in range(16):
+        rank = np.int64((board >> np.uint64(4 * i)) & _NIBBLE_MASK)
+        if rank:
+            values[i] = np.int64(1) << rank
+            max_value = max(max_value, values[i])
+    total += max_weight * max_value
+
+    if clustering_weight != 0.0:
+        clustering = 0
+        for i in range(16):
+            if values[i]:
+                closest = 1 << 40
+                for n in neighbors[i]:
+                    if n < 0:
+                        break
+                    closest = min(closest, abs(values[i] - values[n]))
+                clustering += closest
+        total -= clustering_weight * clustering
+    return total
+
+
+def _choose(
+    board,
+    draw,
+    kind,
+    epsilon,
+    moves,
+    values,
+    move_tables,
+    score_tables,
+    row_tables,
+    col_table,
+    max_weight,
+    clustering_weight,
+    neighbors,
+):
+    """
+    Board after the move a rollout policy picks (RolloutPolicy.pick), without
+    spawning; the board itself when no move is valid.
+    """
+    count = 0
+    for direction in range(4):
+        result, score = _move(board, direction, move_tables, score_tables)
+        if result != board:
+            moves[count] = result
+            if kind == GREEDY:
+                values[count] = score
+            elif kind == CORNER:
+                values[count] = CORNER_PRIORITY[direction]
+            elif kind == EPSILON_GREEDY:
+                values[count] = _score(
+                    result,
+                    row_tables,
+                    col_table,
+                    max_weight,
+                    clustering_weight,
+                    neighbors,
+                )
+            else:
+                values[count] = 0.0
+            count += 1
+    if count == 0:
+        return board
+    if draw < epsilon:
+        return moves[min(int(draw / epsilon * count), count - 1)]
+
+    best = values[0]
+    for i in range(1, count):
+        best = max(best, values[i])
+    ties = 0
+    for i in range(count):
+        if values[i] == best:
+            ties += 1
+    k = min(int((draw - epsilon) / (1.0 - epsilon) * ties), ties - 1)
+    for i in range(count):
+        if values[i] == best:
+            if k == 0:
+                return moves[i]
+            k -= 1
+    return board
+
+
+def _rollouts(
+    boards,
+    search_length,
+    draws,
+    move_tables,
+    score_tables,
+    row_tables,
+    col_table,
+    max_weight,
+    clustering_weight,
+    neighbors,
+):
+    """
+    Play ``search_length`` random moves on every board, summing the score
+    after each move until that board's game is over. ``draws[i]`` holds the
+    DRAWS_PER_STEP * search_length uniforms of board i.
+    """
+    totals = np.zeros(len(boards))
+    moves = np.empty(4, dtype=np.uint64)
+    for b in range(len(boards)):
+        board = boards[b]
+        for step in range(search_length):
+            count = 0
+            for direction in range(4):
+                result, _ = _move(board, direction, move_tables, score_tables)
+                if result != board:
+                    moves[count] = result
+                    count += 1
+            if count == 0:
+                break  # No valid move, game over
+            offset = step * DRAWS_PER_STEP
+            board = moves[int(draws[b, offset] * count)]
+            board = _spawn(board, draws[b, offset + 1], draws[b, offset + 2])
+            totals[b] += _score(
+                board, row_tables, col_table, max_weight, clustering_weight, neighbors
+            )
+    return totals
+
+
+def _policy_rollouts(
+    boards,
+    search_length,
+    draws,
+    move_tables,
+    score_tables,
+    row_tables,
+    col_table,
+    max_weight,
+    clustering_weight,
+    neighbors,
+    kind,
+    epsilon,
+    policy_row_tables,
+    policy_col_table,
+    policy_max_weight,
+    policy_clustering_weight,
+):
+    """
+    _rollouts with the moves picked by the rollout policy ``kind``; the
+    policy_* tables are the EpsilonGreedyPolicy's line score. A separate
+    kernel, so the random rollouts stay as fast as before.
+    """
+    totals = np.zeros(len(boards))
+    moves = np.empty(4, dtype=np.uint64)
+    values = np.empty(4)
+    for b in range(len(boards)):
+        board = boards[b]
+        for step in range(search_length):
+            offset = step * DRAWS_PER_STEP
+            result = _choose(
+                board,
+                draws[b, offset],
+                kind,
+                epsilon,
+                moves,
+                values,
+                move_tables,
+                score_tables,
+                policy_row_tables,
+                policy_col_table,
+                policy_max_weight,
+                policy_clustering_weight,
+                neighbors,
+            )
+            if result == board:
+                break  # No valid move, game over
+            board = _spawn(result, draws[b, offset + 1], draws[b, offset + 2])
+            totals[b] += _score(
+                board, row_tables, col_table, max_weight, clustering_weight, neighbors
+            )
+    return totals
+
+
+def _first_moves(board, directions, draws, move_tables, score_tables):
+    """Boards after each first move and its spawn (two draws per board)."""
+    boards = np.empty(len(directions), dtype=np.uint64)
+    for i in range(len(directions)):
+        result, _ = _move(board, directions[i], move_tables, score_tables)
+        boards[i] = _spawn(result, draws[i, 0], draws[i, 1])
+    return boards
+
+
+def _compile():
+    global _compiled
+    if JIT_AVAILABLE and not _compiled:
+        from numba import njit
+
+        for name in KERNELS:
+            globals()[name] = njit(cache=True)(globals()[name])
+        _compiled = True
+
+
+class JitSimulator:
+    """BatchSimulator's first-move rollouts on the compiled kernel."""
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        _compile()
+
+    def rollout(self, boards, search_length, line_score, draws=None, policy=None):
+        boards = np.asarray(boards, dtype=np.uint64)
+        if draws is None:
+            draws = self.rng.random((len(boards), DRAWS_PER_STEP * search_length))
+        args = (
+            boards,
+            search_length,
+            draws,
+            MOVE_TABLES,
+            SCORE_TABLES,
+            line_score.row_tables,
+            line_score.col_table,
+            line_score.max_weight,
+            line_score.clustering_weight,
+            NEIGHBOR_TABLE,
+        )
+        if policy is None or policy.kind == RANDOM:
+            return _rollouts(*args)
+        policy_score = line_score if policy.line_score is None else policy.line_score
+        return _policy_rollouts(
+            *args,
+            policy.kind,
+            policy.epsilon,
+            policy_score.row_tables,
+            policy_score.col_table,
+            policy_score.max_weight,
+            policy_score.clustering_weight,
+        )
+
+    def first_move_rollouts(
+        self,
+        board,
+        first_moves,
+        searches_per_move,
+        search_length,
+        line_score,
+        policy=None,
+    ):
+        directions = np.repeat(
+            [Bitboard.DIRECTION_INDEX[move] for move in first_moves],
+            searches_per_move,
+        ).astype(np.int64)
+        draws = self.rng.random((len(directions), 2))
+        boards = _first_moves(
+            np.uint64(board), directions, draws, MOVE_TABLES, SCORE_TABLES
+        )
+        total_scores = self.rollout(boards, search_length, line_score, policy=policy)
+        return total_scores.reshape(len(first_moves), searches_per_move)
+
+    def evaluate_first_moves(
+        self,
+        board,
+        first_moves,
+        searches_per_move,
+        search_length,
+        line_score,
+        policy=None,
+    ):
+        return self.first_move_rollouts(
+            board, first_moves, searches_per_move, search_length, line_score, policy
+        ).sum(axis=1)
+
+
+def rollout_simulator(rng, score_fn, line_score):
+    """
+    Simulator and score for batch rollouts: the JIT kernel with ``line_score``
+    when it is available, else BatchSimulator with the NumPy ``score_fn``.
+    """
+    if JIT_AVAILABLE:
+        return JitSimulator(rng), line_score
+    return BatchSimulator(rng), score_fn
+
+
+def warm_up():
+    """Compile the kernels, or load them from the on-disk cache."""
+    if JIT_AVAILABLE:
+        simulator = JitSimulator(np.random.default_rng(0))
+        for policy in (None, GreedyPolicy()):
+            simulator.evaluate_first_moves(
+                0x1100, ["left"], 1, 1, LineScore.max_tile(), policy
+            )
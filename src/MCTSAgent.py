@@ -0,0 +1,298 @@
+"""
+Monte Carlo Tree Search agent with chance nodes for the tile spawns.
+
+Decision nodes hold a board with the player to move; their children are
+chance nodes, one per valid move, holding the board right after the slide.
+The children of a chance node are the decision nodes of the spawns sampled
+so far. Decision children are picked with UCB1 on min-max normalized mean
+values, spawns are sampled with the game's probabilities and new leaves are
+scored with a random rollout.
+
+Nodes live in preallocated NumPy arrays (children as first child / next
+sibling links) instead of Python objects, so the tree has a fixed memory
+size. After a move the subtree of the spawn that actually happened becomes
+the new root and everything else is dropped by compacting the arrays, so the
+next search starts from the visits already collected.
+"""
+
+import math
+import time
+import numpy as np
+from Game2048 import Game2048
+from Bitboard import DIRECTIONS, MOVE_FUNCTIONS, empty_cells, valid_move_mask
+
+DECISION = 0
+CHANCE = 1
+
+# Direction indices of each 4-bit valid move mask
+MASK_DIRECTIONS = [[d for d in range(4) if mask >> d & 1] for mask in range(16)]
+
+
+class MCTSAgent:
+    def __init__(
+        self,
+        simulations=400,
+        rollout_length=10,
+        exploration=1.0,
+        capacity=1 << 18,
+        rng=None,
+    ):
+        self.simulations = simulations
+        self.rollout_length = rollout_length
+        self.exploration = exploration
+        self.capacity = capacity
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.boards = np.zeros(capacity, dtype=np.uint64)
+        self.parents = np.full(capacity, -1, dtype=np.int32)
+        self.first_children = np.full(capacity, -1, dtype=np.int32)
+        self.next_siblings = np.full(capacity, -1, dtype=np.int32)
+        self.kinds = np.zeros(capacity, dtype=np.int8)
+        self.directions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+
+        self.rollouts = 0
+        self.search_seconds = 0.0
+        self.reused_nodes = 0
+
+    @property
+    def nbytes(self):
+        return sum(
+            array.nbytes
+            for array in (
+                self.boards,
+                self.parents,
+                self.first_children,
+                self.next_siblings,
+                self.kinds,
+                self.directions,
+                self.rewards,
+                self.visits,
+                self.values,
+            )
+        )
+
+    def stats(self):
+        return {
+            "nodes": self.size,
+            "capacity": self.capacity,
+            "tree_bytes": self.nbytes,
+            "rollouts": self.rollouts,
+            "rollouts_per_second": self.rollouts / max(self.search_seconds, 1e-9),
+            "reused_nodes": self.reused_nodes,
+        }
+
+    def _new_node(self, parent, kind, board, direction=0, reward=0.0):
+        """Append a node as the first child of ``parent``; None when full."""
+        if self.size == self.capacity:
+            return None
+        node = self.size
+        self.size += 1
+        self.boards[node] = board
+        self.parents[node] = parent
+        self.first_children[node] = -1
+        self.kinds[node] = kind
+        self.directions[node] = direction
+        self.rewards[node] = reward
+        self.visits[node] = 0
+        self.values[node] = 0.0
+        if parent >= 0:
+            self.next_siblings[node] = self.first_children[parent]
+            self.first_children[parent] = node
+        else:
+            self.next_siblings[node] = -1
+        return node
+
+    def _children(self, node):
+        child = int(self.first_children[node])
+        while child >= 0:
+            yield child
+            child = int(self.next_siblings[child])
+
+    def _spawn(self, board):
+        empty = empty_cells(board)
+        if not empty:
+            return board
+        cell = empty[int(self.rng.random() * len(empty))]
+        rank = 1 if self.rng.random() < 0.9 else 2
+        return board | rank << (4 * cell)
+
+    def _rollout(self, board):
+        """Merge score of a random game of ``rollout_length`` moves."""
+        total = 0
+        for _ in range(self.rollout_length):
+            directions = MASK_DIRECTIONS[valid_move_mask(board)]
+            if not directions:
+                break
+            direction = directions[int(self.rng.random() * len(directions))]
+            board, score = MOVE_FUNCTIONS[direction](board)
+            total += score
+            board = self._spawn(board)
+        self.rollouts += 1
+        return total
+
+    def _expand(self, node):
+        board = int(self.boards[node])
+        for direction, move_function in enumerate(MOVE_FUNCTIONS):
+            afterstate, reward = move_function(board)
+            if afterstate != board:
+                if self._new_node(node, CHANCE, afterstate, direction, reward) is None:
+                    break
+
+    def _select(self, node):
+        children = list(self._children(node))
+        for child in children:
+            if self.visits[child] == 0:
+                return child
+
+        visits = self.visits[children]
+        means = self.values[children] / visits + self.rewards[children]
+        low, high = means.min(), means.max()
+        normalized = (means - low) / (high - low) if high > low else means * 0
+        ucb = normalized + self.exploration * np.sqrt(
+            math.log(self.visits[node]) / visits
+        )
+        return children[int(np.argmax(ucb))]
+
+    def _sample_spawn(self, node):
+        # Decision child for a sampled spawn, created when it is new
+        board = self._spawn(int(self.boards[node]))
+        for child in self._children(node):
+            if self.boards[child] == board:
+                return child, False
+        return self._new_node(node, DECISION, board), True
+
+    def _simulate(self, root):
+        node = root
+        path = [node]
+        while True:
+            if self.kinds[node] == DECISION:
+                if self.first_children[node] < 0:
+                    self._expand(node)
+                    if self.first_children[node] < 0:
+                        # Game over (worth 0), or no room left to expand
+                        value = self._rollout(int(self.boards[node]))
+                        break
+                node = self._select(node)
+            else:
+                child, new = self._sample_spawn(node)
+                if child is None:
+                    # Tree is full: score the chance node's board instead
+                    value = self._rollout(self._spawn(int(self.boards[node])))
+                    break
+                node = child
+                if new:
+                    path.append(node)
+                    value = self._rollout(int(self.boards[node]))
+                    break
+            path.append(node)
+
+        # Chance nodes store the value after their move's merge score, which
+        # is added back on the way to the parent decision node
+        for node in reversed(path):
+            self.values[node] += value
+            self.visits[node] += 1
+            if self.kinds[node] == CHANCE:
+                value += self.rewards[node]
+
+    def _reroot(self, node):
+        """Keep only the subtree of ``node``, compacted to the array start."""
+        if node is None:
+            self.size = 0
+            return
+        count = self.size
+        parents = self.parents[:count]
+        keep = np.zeros(count, dtype=bool)
+        keep[node] = True
+        # Children are always created after their parent, so every pass
+        # extends the kept set by one more level of the tree
+        while True:
+            extended = keep | ((parents >= 0) & keep[np.maximum(parents, 0)])
+            if (extended == keep).all():
+                break
+            keep = extended
+
+        new_index = np.cumsum(keep) - 1
+        new_index = np.append(new_index, -1)  # Remaps the -1 links to -1
+        for array in (self.parents, self.first_children, self.next_siblings):
+            kept = array[:count][keep]
+            array[: keep.sum()] = new_index[kept]
+        for array in (
+            self.boards,
+            self.kinds,
+            self.directions,
+            self.rewards,
+            self.visits,
+            self.values,
+        ):
+            array[: keep.sum()] = array[:count][keep]
+
+        self.size = int(keep.sum())
+        self.parents[0] = -1
+        self.next_siblings[0] = -1
+        self.reused_nodes = self.size
+
+    def move(self, game, searches_per_move=None, search_length=None):
+        # With the Monte Carlo agents' arguments, use the same rollout budget
+        board = game.get_packed_state()
+        simulations = self.simulations
+        if searches_per_move is not None:
+            simulations = searches_per_move * len(
+                MASK_DIRECTIONS[valid_move_mask(board)]
+            )
+        if search_length is not None:
+            self.rollout_length = search_length
+
+        # Reuse the tree if it was re-rooted on this board after the last move
+        if self.size == 0 or self.boards[0] != board:
+            self.size = 0
+            self.reused_nodes = 0
+            self._new_node(-1, DECISION, board)
+
+        start = time.perf_counter()
+        for _ in range(simulations):
+            self._simulate(0)
+        self.search_seconds += time.perf_counter() - start
+
+        children = list(self._children(0))
+        best = children[int(np.argmax(self.visits[children]))]
+        direction = DIRECTIONS[self.directions[best]]
+        game.move(direction)
+
+        # Re-root on the tile that was actually spawned, if it was explored
+        spawned = game.get_packed_state()
+        root = None
+        for child in self._children(best):
+            if self.boards[child] == spawned:
+                root = child
+        self._reroot(root)
+
+        return game.get_state(), direction
+
+
+def main():
+    game = Game2048()
+    agent = MCTSAgent()
+    game.reset()
+
+    while not game.is_game_over():
+        final_board, best_move = agent.move(game)
+        print(f"Best move: {best_move}")
+        print(f"Final board:\n{final_board}")
+
+    if game.is_win():
+        print("You won!")
+    else:
+        print("Game over!")
+
+    print(game.get_score())
+    print(agent.stats())
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    main()
+    print("--- %s seconds ---" % (time.time() - start_time))
@@ -1,46 +1,62 @@
 import numpy as np
 from Game2048 import Game2048
-import copy
+from Bitboard import encode_board
+from BatchSimulator import batch_max_tile
+from JitEngine import LineScore, rollout_simulator
+from RolloutPolicy import RandomPolicy
 
 
 class MonteCarloAgent:
+    def __init__(self, rng=None, rollout_policy=None, batch=False):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # With batch=True, move() simulates all rollouts of a decision in one
+        # batch through batch_move
+        self.batch = batch
+        # The max tile score as tables for the JIT rollout kernel
+        self.line_score = LineScore.max_tile()
+        # Picks the moves of every rollout, uniformly random by default (see
+        # RolloutPolicy.py)
+        self.rollout_policy = (
+            rollout_policy if rollout_policy is not None else RandomPolicy()
+        )
+
     def initialize_game(self):
         return Game2048()
 
-    def random_move(self, game):
-        moves = game.get_valid_moves()
-        if moves:
-            return np.random.choice(moves)
-        return None
-
     def simulate(self, game, search_length):
-        simulated_game = copy.deepcopy(
-            game
-        )  # Deep copy to not affect the original game
+        snapshot = game.snapshot()  # Undo afterwards to not affect the original game
         total_score = 0
 
         for _ in range(search_length):
-            move = self.random_move(simulated_game)
+            move = self.rollout_policy(game)
             if move:
-                simulated_game.move(move)
-                total_score += simulated_game.get_max_tile()
+                game.move(move)
+                total_score += game.get_max_tile()
             else:
                 break  # No valid move, game over
 
+        game.restore(snapshot)
         return total_score
 
     def move(self, game, searches_per_move, search_length):
+        if self.batch:
+            return self.batch_move(game, searches_per_move, search_length)
+
         first_moves = game.get_valid_moves()
         scores = np.zeros(len(first_moves))
 
+        # Clone the game once to not affect the original board, and give it the
+        # agent's generator so the real game's spawn sequence stays untouched
+        cloned_game = game.clone(rng=self.rng)
+        snapshot = cloned_game.snapshot()
+
         for i, move in enumerate(first_moves):
             total_score = 0
 
             for _ in range(searches_per_move):
-                # Clone the game to not affect the original board
-                cloned_game = copy.deepcopy(game)
                 cloned_game.move(move)
                 total_score += self.simulate(cloned_game, search_length)
+                cloned_game.restore(snapshot)
 
             scores[i] = total_score
 
@@ -50,20 +66,46 @@ class MonteCarloAgent:
 
         return game.get_state(), best_move
 
+    def batch_move(self, game, searches_per_move, search_length):
+        # Same decision as move, with all rollouts simulated in one batch
+        first_moves = game.get_valid_moves()
+        simulator, score_fn = rollout_simulator(
+            self.rng, batch_max_tile, self.line_score
+        )
+        scores = simulator.evaluate_first_moves(
+            encode_board(game.get_state()),
+            first_moves,
+            searches_per_move,
+            search_length,
+            score_fn,
+            self.rollout_policy,
+        )
+
+        best_move_index = np.argmax(scores)
+        best_move = first_moves[best_move_index]
+        game.move(best_move)
+
+        return game.get_state(), best_move
+
 
 # Test the MonteCarloAgent class
-agent = MonteCarloAgent()
-game = agent.initialize_game()
+def main():
+    agent = MonteCarloAgent()
+    game = agent.initialize_game()
+
+    number_of_searches = 40
+    search_length = 10
+
+    while not game.is_game_over():
+        final_board, best_move = agent.move(game, number_of_searches, search_length)
+        print(f"Best move: {best_move}")
+        print(f"Final board:\n{final_board}")
 
-number_of_searches = 40
-search_length = 10
+    if game.is_win():
+        print("You won!")
+    else:
+        print("Game over!")
 
-while not game.is_game_over():
-    final_board, best_move = agent.move(game, number_of_searches, search_length)
-    print(f"Best move: {best_move}")
-    print(f"Final board:\n{final_board}")
 
-if game.is_win():
-    print("You won!")
-else:
-    print("Game over!")
+if __name__ == "__main__":
+    main()
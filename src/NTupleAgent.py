@@ -0,0 +1,183 @@
+"""
+N-tuple network agent trained with afterstate TD(0) learning.
+
+The value of a board is the sum of weights looked up by the tiles on a few
+fixed groups of cells (the n-tuples). Every tuple is also read on the 7 other
+rotations and reflections of the board, with the same weights, so one game
+trains all symmetric positions at once.
+
+The agent values afterstates, the board right after a slide and before the
+new tile appears, and picks the move with the best merge score plus
+afterstate value. Learning moves each afterstate value towards the next
+reward plus the next afterstate value.
+"""
+
+import time
+import numpy as np
+from Game2048 import Game2048
+from Bitboard import DIRECTIONS, MOVE_FUNCTIONS, max_rank, symmetries
+
+# Cells of each tuple, numbered row * 4 + col: the outer and inner row and
+# three 2x2 squares, which cover the whole board under the 8 symmetries
+DEFAULT_TUPLES = (
+    (0, 1, 2, 3),
+    (4, 5, 6, 7),
+    (0, 1, 4, 5),
+    (1, 2, 5, 6),
+    (5, 6, 9, 10),
+)
+
+
+def _symmetric_cells():
+    # Board whose cell c holds the number c; cell c of a symmetric board then
+    # holds the cell of the original board it was moved from
+    numbered = sum(cell << (4 * cell) for cell in range(16))
+    return np.array(
+        [
+            [(board >> (4 * cell)) & 0xF for cell in range(16)]
+            for board in symmetries(numbered)
+        ]
+    )
+
+
+SYMMETRIC_CELLS = _symmetric_cells()
+
+
+class NTupleAgent:
+    def __init__(self, tuples=DEFAULT_TUPLES, learning_rate=0.1):
+        tuple_length = len(tuples[0])
+        if any(len(cells) != tuple_length for cells in tuples):
+            raise ValueError("All tuples must have the same number of cells")
+
+        self.tuples = np.array(tuples)
+        self.learning_rate = learning_rate
+        table_size = 16**tuple_length
+        self.weights = np.zeros(len(tuples) * table_size, dtype=np.float32)
+
+        # One feature per tuple and symmetry: the bit shifts of its cells and
+        # the start of its tuple's table in the flat weight array
+        cells = SYMMETRIC_CELLS[:, self.tuples]  # (8, tuples, length)
+        self.shifts = (4 * cells.transpose(1, 0, 2).reshape(-1, tuple_length)).astype(
+            np.uint64
+        )
+        self.offsets = np.repeat(np.arange(len(tuples)) * table_size, 8)
+        self.digits = (4 * np.arange(tuple_length)).astype(np.uint64)
+
+    @property
+    def nbytes(self):
+        return self.weights.nbytes
+
+    def feature_indices(self, boards):
+        """Weight indices of every feature for a (N,) array of packed boards."""
+        boards = np.asarray(boards, dtype=np.uint64)
+        ranks = (boards[:, None, None] >> self.shifts) & np.uint64(0xF)
+        return (ranks << self.digits).sum(axis=2).astype(np.int64) + self.offsets
+
+    def value(self, boards):
+        return self.weights[self.feature_indices(boards)].sum(axis=1)
+
+    def update(self, board, target):
+        """Move the value of ``board`` towards ``target``."""
+        indices = self.feature_indices([board])[0]
+        error = target - self.weights[indices].sum()
+        # Symmetric boards can hit the same weight more than once
+        np.add.at(self.weights, indices, self.learning_rate / len(indices) * error)
+
+    def best_afterstate(self, board):
+        """
+        Return (direction, afterstate, reward) of the best move on a packed
+        board, or None when no move changes it.
+        """
+        moves = []
+        for direction, move_function in zip(DIRECTIONS, MOVE_FUNCTIONS):
+            afterstate, reward = move_function(board)
+            if afterstate != board:
+                moves.append((direction, afterstate, reward))
+        if not moves:
+            return None
+
+        values = self.value([afterstate for _, afterstate, _ in moves])
+        values += [reward for _, _, reward in moves]
+        return moves[int(np.argmax(values))]
+
+    def move(self, game, searches_per_move=None, search_length=None):
+        # The search arguments of the Monte Carlo agents are accepted so the
+        # agent plugs into the same game loops; the network needs no search
+        direction, _, _ = self.best_afterstate(game.get_packed_state())
+        game.move(direction)
+
+        return game.get_state(), direction
+
+    def learn_episode(self, game):
+        """Play one game on ``game`` and learn from it; returns the final game."""
+        game.reset()
+        previous = None
+        while True:
+            choice = self.best_afterstate(game.get_packed_state())
+            if choice is None:
+                break
+            direction, afterstate, reward = choice
+            if previous is not None:
+                self.update(previous, reward + self.value([afterstate])[0])
+            game.move(direction)
+            previous = afterstate
+
+        if previous is not None:
+            # Nothing follows the last afterstate
+            self.update(previous, 0.0)
+        return game
+
+    def save(self, path):
+        np.savez(path, weights=self.weights, tuples=self.tuples)
+
+    @classmethod
+    def load(cls, path, learning_rate=0.1):
+        data = np.load(path)
+        agent = cls([tuple(cells) for cells in data["tuples"]], learning_rate)
+        agent.weights[:] = data["weights"]
+        return agent
+
+
+def train_ntuple_agent(episodes=10000, seed=None, agent=None, report_every=100):
+    """
+    Train an NTupleAgent on Game2048, printing the training throughput and
+    scores every ``report_every`` episodes. Returns the agent and per-episode
+    statistics.
+    """
+    game = Game2048(np.random.default_rng(seed))
+    if agent is None:
+        agent = NTupleAgent()
+    print(f"Weights: {agent.nbytes / 2**20:.1f} MiB")
+
+    scores = []
+    max_tiles = []
+    start = time.perf_counter()
+    for episode in range(episodes):
+        agent.learn_episode(game)
+        scores.append(game.get_score())
+        max_tiles.append(2 ** max_rank(game.get_packed_state()))
+
+        if (episode + 1) % report_every == 0:
+            elapsed = time.perf_counter() - start
+            recent = slice(-report_every, None)
+            print(
+                f"Episode {episode + 1}/{episodes}, "
+                f"{(episode + 1) / elapsed:.1f} episodes/s, "
+                f"Mean score: {np.mean(scores[recent]):.0f}, "
+                f"2048 rate: {np.mean(np.array(max_tiles[recent]) >= 2048):.0%}"
+            )
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "episodes": episodes,
+        "episodes_per_second": episodes / elapsed,
+        "weight_bytes": agent.nbytes,
+        "scores": scores,
+        "max_tiles": max_tiles,
+    }
+    return agent, stats
+
+
+if __name__ == "__main__":
+    agent, stats = train_ntuple_agent(episodes=10000)
+    agent.save("ntuple_weights.npz")
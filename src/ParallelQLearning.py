@@ -0,0 +1,239 @@
+"""
+Q-learning with actor processes and one learner.
+
+The learner keeps the QTable's slot array in shared memory. Every actor maps
+the same memory, plays a VectorGame2048 with the current epsilon-greedy
+policy read straight from it, and every ``sync_interval`` steps sends the
+transitions it collected as one compact structured array through a queue.
+The learner applies them with QLearningAgent.learn_batch, which writes into
+the shared table, so actors see the updates without the table ever being
+pickled.
+
+Run from the src folder to measure the training throughput from 1 to N
+workers:
+    python ParallelQLearning.py
+"""
+
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+from queue import Empty
+import numpy as np
+from QLearningAgent import QLearningAgent
+from QTable import QTable, SLOT_DTYPE
+from VectorGame2048 import VectorGame2048
+
+ACTIONS = ["left", "right", "up", "down"]
+
+# Seconds the learner waits for a batch before checking that the actors live
+QUEUE_TIMEOUT = 1.0
+
+TRANSITION_DTYPE = np.dtype(
+    [
+        ("state", np.uint64),
+        ("action", np.uint8),
+        ("reward", np.int32),
+        ("next_state", np.uint64),
+        ("done", np.bool_),
+    ]
+)
+
+
+def _actor(
+    index,
+    shm_name,
+    num_slots,
+    seed,
+    num_games,
+    sync_interval,
+    epsilon,
+    reward,
+    queue,
+    stop,
+):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    agent = None
+    try:
+        game_seed, agent_seed = seed.spawn(2)
+        # Only the policy is used; the shared table replaces the agent's own
+        agent = QLearningAgent(
+            ACTIONS, epsilon=epsilon, rng=np.random.default_rng(agent_seed), capacity=0
+        )
+        agent.q_table = QTable(
+            slots=np.ndarray(num_slots, dtype=SLOT_DTYPE, buffer=shm.buf)
+        )
+        env = VectorGame2048(num_games, np.random.default_rng(game_seed), reward)
+        states, _ = env.reset()
+
+        while not stop.is_set():
+            # A new buffer every interval: the queue pickles a batch later, in
+            # its feeder thread, so the buffer must not be refilled meanwhile
+            transitions = np.empty((sync_interval, num_games), dtype=TRANSITION_DTYPE)
+            finished = len(env.finished_scores)
+            for step in transitions:
+                actions = agent.choose_actions(states)
+                next_states, rewards, _, dones = env.step(actions)
+                step["state"] = states
+                step["action"] = actions
+                step["reward"] = rewards
+                step["next_state"] = next_states
+                step["done"] = dones
+                states = next_states
+            queue.put((transitions.ravel(), env.finished_scores[finished:]))
+    finally:
+        # Tell the learner this actor sent its last batch
+        queue.put((None, index))
+        agent = None  # Release the views into the shared memory
+        shm.close()
+
+
+def train_parallel(
+    episodes=100000,
+    workers=None,
+    games_per_worker=64,
+    sync_interval=16,
+    capacity=1 << 20,
+    learning_rate=0.1,
+    discount_factor=0.99,
+    epsilon=0.1,
+    reward="tile_sum",
+    seed=None,
+    verbose=True,
+):
+    """
+    Train a QLearningAgent with ``workers`` actor processes (default: one per
+    core) playing ``games_per_worker`` games each, until ``episodes`` games
+    have finished. Actors send their transitions every ``sync_interval``
+    steps. ``reward`` is that of train_2048_agent. Returns the agent, the
+    finished games' scores and the throughput statistics.
+    """
+    workers = workers or os.cpu_count()
+    agent = QLearningAgent(
+        ACTIONS,
+        learning_rate=learning_rate,
+        discount_factor=discount_factor,
+        epsilon=epsilon,
+        capacity=capacity,
+    )
+    num_slots = agent.q_table.capacity
+    shm = shared_memory.SharedMemory(create=True, size=agent.q_table.nbytes)
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    stop = context.Event()
+    actors = []
+    try:
+        slots = np.ndarray(num_slots, dtype=SLOT_DTYPE, buffer=shm.buf)
+        slots[:] = agent.q_table.slots
+        agent.q_table = QTable(slots=slots)
+
+        actors = [
+            context.Process(
+                target=_actor,
+                args=(
+                    index,
+                    shm.name,
+                    num_slots,
+                    worker_seed,
+                    games_per_worker,
+                    sync_interval,
+                    epsilon,
+                    reward,
+                    queue,
+                    stop,
+                ),
+            )
+            for index, worker_seed in enumerate(
+                np.random.SeedSequence(seed).spawn(workers)
+            )
+        ]
+        for actor in actors:
+            actor.start()
+
+        scores = []
+        transitions = 0
+        done = set()  # Actors whose last batch arrived
+        exited = set()
+        start = time.perf_counter()
+        while len(done) < workers:
+            try:
+                batch, finished = queue.get(timeout=QUEUE_TIMEOUT)
+            except Empty:
+                # An actor killed before its finally (OOM, a signal, a failed
+                # spawn) never says it is done. What it sent before exiting is
+                # readable by now, so one still missing a timeout after it was
+                # seen dead is lost
+                lost = exited - done
+                if lost:
+                    index = min(lost)
+                    raise RuntimeError(
+                        f"Actor {index} exited with code "
+                        f"{actors[index].exitcode} before its last batch"
+                    )
+                exited = {i for i, actor in enumerate(actors) if not actor.is_alive()}
+                continue
+            if batch is None:
+                done.add(finished)  # The actor's index
+                continue
+            if stop.is_set():
+                continue  # Drain what the actors sent before stopping
+
+            agent.learn_batch(
+                batch["state"],
+                batch["action"],
+                batch["reward"],
+                batch["next_state"],
+                batch["done"],
+            )
+            transitions += len(batch)
+            scores.extend(finished)
+            if verbose and len(scores) // 1000 > (len(scores) - len(finished)) // 1000:
+                print(
+                    f"Episode {len(scores)}/{episodes}, "
+                    f"Mean score: {np.mean(scores[-1000:]):.0f}"
+                )
+            if len(scores) >= episodes:
+                elapsed = time.perf_counter() - start
+                stop.set()
+
+        for actor in actors:
+            actor.join()
+        if not stop.is_set():
+            raise RuntimeError("The actors stopped before the training finished")
+
+        # Keep the learned table once the shared memory is gone
+        agent.q_table = QTable(slots=slots.copy())
+        del slots
+    finally:
+        stop.set()
+        for actor in actors:
+            if actor.is_alive():
+                actor.terminate()
+        shm.close()
+        shm.unlink()
+
+    stats = {
+        "workers": workers,
+        "episodes_per_second": len(scores) / elapsed,
+        "transitions_per_second": transitions / elapsed,
+        "states": len(agent.q_table),
+    }
+    return agent, scores[:episodes], stats
+
+
+def measure_scaling(episodes=5000, max_workers=None, **kwargs):
+    """Episodes per second with 1 to ``max_workers`` actor processes."""
+    max_workers = max_workers or os.cpu_count()
+    results = {}
+    for workers in range(1, max_workers + 1):
+        _, _, stats = train_parallel(episodes, workers, verbose=False, **kwargs)
+        results[workers] = stats
+        print(
+            f"{workers} workers: {stats['episodes_per_second']:.0f} episodes/s, "
+            f"{stats['transitions_per_second']:.0f} transitions/s"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    measure_scaling()
@@ -0,0 +1,156 @@
+"""
+Compare rollout policies by win rate against rollouts per second.
+
+Every policy plays the same seeded games with AdvancedMonteCarloAgent's batch
+search, once for each number of searches per move. A row reports the win
+rate with its 95% Wilson interval, the mean score with its standard error and
+the mean max tile of its games, the rollouts it ran and how many of them it ran
+per second of search, so a policy that plays better rollouts can be matched
+against random rollouts at a larger budget.
+
+Run from the src folder:
+    python PolicyComparison.py                              # default sweep
+    python PolicyComparison.py --games 20 --searches 5 20 80
+    python PolicyComparison.py --policies random corner --output policies.json
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from Game2048 import Game2048
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from JitEngine import ENGINE, warm_up
+from RolloutPolicy import CornerPolicy, EpsilonGreedyPolicy, GreedyPolicy, RandomPolicy
+from joblib import Parallel, delayed
+
+# Policy name -> policy for an agent (the epsilon-greedy policy uses the
+# agent's own heuristic tables)
+POLICIES = {
+    "random": lambda agent: RandomPolicy(),
+    "greedy": lambda agent: GreedyPolicy(),
+    "corner": lambda agent: CornerPolicy(),
+    "epsilon_greedy": lambda agent: EpsilonGreedyPolicy(agent.line_score, 0.1),
+}
+
+
+def wilson_interval(wins, games, z=1.96):
+    """Wilson score interval of a win rate, ``z`` standard errors wide."""
+    rate = wins / games
+    center = (rate + z**2 / (2 * games)) / (1 + z**2 / games)
+    half = (
+        z
+        * np.sqrt(rate * (1 - rate) / games + z**2 / (4 * games**2))
+        / (1 + z**2 / games)
+    )
+    return max(center - half, 0.0), min(center + half, 1.0)
+
+
+def play_game(agent, searches_per_move, search_length, seed):
+    """One game of ``agent.batch_move``, seeded like run_single_simulation."""
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    game_seed, agent_seed = seed.spawn(2)
+    agent.rng = np.random.default_rng(agent_seed)
+    game = Game2048(np.random.default_rng(game_seed))
+    game.reset()
+    rollouts = 0
+    seconds = 0.0
+    while not game.is_game_over():
+        rollouts += searches_per_move * len(game.get_valid_moves())
+        start = time.perf_counter()
+        agent.batch_move(game, searches_per_move, search_length)
+        seconds += time.perf_counter() - start
+    return game.is_win(), game.get_max_tile(), game.get_score(), rollouts, seconds
+
+
+def compare_policies(
+    policies=tuple(POLICIES),
+    games=10,
+    searches=(10, 40),
+    search_length=10,
+    seed=2048,
+    n_jobs=-1,
+):
+    """One result dict per policy and searches per move, in that order."""
+    # Compile the JIT kernels before any search is timed
+    warm_up()
+    seeds = np.random.SeedSequence(seed).spawn(games)
+    rows = []
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for name in policies:
+            agent = AdvancedMonteCarloAgent()
+            agent.rollout_policy = POLICIES[name](agent)
+            for searches_per_move in searches:
+                results = parallel(
+                    delayed(play_game)(agent, searches_per_move, search_length, s)
+                    for s in seeds
+                )
+                wins, max_tiles, scores, rollouts, seconds = zip(*results)
+                low, high = wilson_interval(int(np.sum(wins)), len(wins))
+                rows.append(
+                    {
+                        "policy": name,
+                        "searches_per_move": searches_per_move,
+                        "win_rate": float(np.mean(wins)),
+                        "win_rate_low": float(low),
+                        "win_rate_high": float(high),
+                        "mean_score": float(np.mean(scores)),
+                        "score_stderr": float(
+                            np.std(scores, ddof=1) / np.sqrt(len(scores))
+                        ),
+                        "mean_max_tile": float(np.mean(max_tiles)),
+                        "rollouts": int(sum(rollouts)),
+                        "rollouts_per_second": sum(rollouts) / sum(seconds),
+                    }
+                )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--policies", nargs="+", choices=list(POLICIES))
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--searches", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--search-length", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=2048)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--output", help="write the results JSON to this file")
+    args = parser.parse_args()
+
+    rows = compare_policies(
+        args.policies or tuple(POLICIES),
+        args.games,
+        args.searches,
+        args.search_length,
+        args.seed,
+        args.n_jobs,
+    )
+
+    print(f"Engine: {ENGINE}, {args.games} games per row")
+    print(
+        "{:<15} {:>9} {:>9} {:>13} {:>17} {:>9} {:>13}".format(
+            "policy",
+            "searches",
+            "win rate",
+            "95% interval",
+            "mean score",
+            "max tile",
+            "rollouts/sec",
+        )
+    )
+    for row in rows:
+        print(
+            "{policy:<15} {searches_per_move:>9} {win_rate:>9.0%} "
+            "{win_rate_low:>6.0%}-{win_rate_high:<6.0%} "
+            "{mean_score:>9.0f} ± {score_stderr:<5.0f} {mean_max_tile:>9.0f} "
+            "{rollouts_per_second:>13.0f}".format(**row)
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Opt-in counters and timers for the game engines and the agents.
+
+Inside a ``with Profiler() as profile:`` block the hot methods of every loaded
+engine and agent class are wrapped to count their calls and add up their wall
+time; leaving the block puts the original methods back, so code that is not
+being profiled runs exactly as before. Times are inclusive: a decision's time
+contains the moves and heuristic evaluations made inside it.
+
+A Profile converts to a JSON-friendly dict and back, and profiles from
+different games or worker processes add up with ``merge``.
+"""
+
+import sys
+import time
+from collections import defaultdict
+
+# module -> class -> method -> counter name. Only modules that are already
+# imported get patched, so profiling never loads anything new.
+HOOKS = {
+    "Game2048": {
+        "Game2048": {
+            "move": "move",
+            "peek_move": "peek_move",
+            "slide_and_merge": "slide_and_merge",
+            "get_valid_moves": "get_valid_moves",
+            "is_game_over": "is_game_over",
+            "clone": "clone",
+        }
+    },
+    "BitboardGame2048": {
+        "BitboardGame2048": {
+            "move": "move",
+            "peek_move": "peek_move",
+            "get_valid_moves": "get_valid_moves",
+            "is_game_over": "is_game_over",
+        }
+    },
+    "MonteCarloAgent": {
+        "MonteCarloAgent": {
+            "move": "decision",
+            "batch_move": "decision",
+            "simulate": "rollout",
+        }
+    },
+    "EnhancedMonteCarloAgent": {
+        "EnhancedMonteCarloAgent": {
+            "move": "decision",
+            "batch_move": "decision",
+            "simulate": "rollout",
+            "heuristic_score": "heuristic",
+            "batch_heuristic_score": "heuristic",
+        }
+    },
+    "AdvancedMonteCarloAgent": {
+        "AdvancedMonteCarloAgent": {
+            "move": "decision",
+            "batch_move": "decision",
+            "simulate": "rollout",
+            "heuristic_score": "heuristic",
+            "batch_heuristic_score": "heuristic",
+        }
+    },
+    "ExpectimaxAgent": {
+        "ExpectimaxAgent": {"move": "decision", "heuristic_score": "heuristic"}
+    },
+    "MCTSAgent": {"MCTSAgent": {"move": "decision", "_rollout": "rollout"}},
+    "NTupleAgent": {"NTupleAgent": {"move": "decision"}},
+    "BatchSimulator": {"BatchSimulator": {"rollout": "batch_rollout"}},
+    "Simulation": {"MovePool": {"__call__": "dispatch"}},
+}
+
+# Methods that play a rollout on a game; their number of game moves is
+# recorded in the "rollout_length" histogram
+ROLLOUT_METHODS = {"simulate"}
+
+_profiles = []  # Active profiles, innermost last
+_running = set()  # Counters with a call in progress
+_originals = {}  # (class, method name) -> original function
+
+
+class Profile:
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.histograms = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, seconds):
+        self.calls[name] += 1
+        self.seconds[name] += seconds
+
+    def observe(self, name, value):
+        self.histograms[name][value] += 1
+
+    def merge(self, other):
+        for name, calls in other.calls.items():
+            self.calls[name] += calls
+        for name, seconds in other.seconds.items():
+            self.seconds[name] += seconds
+        for name, histogram in other.histograms.items():
+            for value, count in histogram.items():
+                self.histograms[name][value] += count
+        return self
+
+    def to_dict(self):
+        return {
+            "calls": dict(self.calls),
+            "seconds": dict(self.seconds),
+            "histograms": {
+                name: {str(value): count for value, count in histogram.items()}
+                for name, histogram in self.histograms.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        profile = cls()
+        profile.calls.update(data["calls"])
+        profile.seconds.update(data["seconds"])
+        for name, histogram in data["histograms"].items():
+            for value, count in histogram.items():
+                profile.histograms[name][int(value)] += count
+        return profile
+
+    def summary(self):
+        lines = [f"{'counter':<20}{'calls':>12}{'seconds':>12}{'us/call':>12}"]
+        for name in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            calls = self.calls[name]
+            seconds = self.seconds[name]
+            lines.append(
+                f"{name:<20}{calls:>12}{seconds:>12.3f}{seconds / calls * 1e6:>12.1f}"
+            )
+        for name, histogram in sorted(self.histograms.items()):
+            total = sum(histogram.values())
+            mean = sum(value * count for value, count in histogram.items()) / total
+            lines.append(f"{name}: mean {mean:.2f} over {total}")
+        return "\n".join(lines)
+
+
+def _wrap(function, name, method_name):
+    if method_name in ROLLOUT_METHODS:
+
+        def wrapper(*args, **kwargs):
+            profile = _profiles[-1]
+            moves = profile.calls["move"]
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.record(name, time.perf_counter() - start)
+                profile.observe("rollout_length", profile.calls["move"] - moves)
+
+    else:
+
+        def wrapper(*args, **kwargs):
+            # A call inside another of the same counter (e.g. move() handing
+            # the decision to batch_move) is part of the outer one
+            if name in _running:
+                return function(*args, **kwargs)
+            _running.add(name)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _running.discard(name)
+                _profiles[-1].record(name, time.perf_counter() - start)
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _install():
+    for module_name, classes in HOOKS.items():
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        for class_name, methods in classes.items():
+            cls = getattr(module, class_name)
+            for method_name, name in methods.items():
+                function = cls.__dict__.get(method_name)
+                if function is not None:
+                    _originals[cls, method_name] = function
+                    setattr(cls, method_name, _wrap(function, name, method_name))
+
+
+def _uninstall():
+    for (cls, method_name), function in _originals.items():
+        setattr(cls, method_name, function)
+    _originals.clear()
+
+
+class Profiler:
+    """
+    Context manager that profiles everything run inside it into a Profile.
+    Profilers nest: while an inner one is active it gets the records.
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile if profile is not None else Profile()
+
+    def __enter__(self):
+        if not _profiles:
+            _install()
+        _profiles.append(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc_info):
+        _profiles.remove(self.profile)
+        if not _profiles:
+            _uninstall()
+        return False
+
+
+def profiled_call(func, args, kwargs):
+    """Run ``func`` under a fresh Profiler; returns (result, profile dict)."""
+    with Profiler() as profile:
+        result = func(*args, **kwargs)
+    return result, profile.to_dict()
@@ -1,64 +1,125 @@
 import numpy as np
-import random
-import matplotlib.pyplot as plt
-from collections import defaultdict
 from Game2048 import Game2048
+from Bitboard import DIRECTION_INDEX
+from QTable import QTable
+from VectorGame2048 import REWARDS, VectorGame2048
 
 
 class QLearningAgent:
-    def __init__(self, actions, learning_rate=0.1, discount_factor=0.99, epsilon=0.1):
-        self.q_table = defaultdict(float)
+    def __init__(
+        self,
+        actions,
+        learning_rate=0.1,
+        discount_factor=0.99,
+        epsilon=0.1,
+        rng=None,
+        capacity=1 << 20,
+    ):
+        # States are packed boards (Game2048.get_packed_state); the table
+        # folds symmetric boards together and evicts once it is full
+        self.q_table = QTable(capacity)
         self.actions = actions
+        self.action_indices = [DIRECTION_INDEX[action] for action in actions]
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.epsilon = epsilon
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def choose_action(self, state):
-        if random.random() < self.epsilon:
-            return random.choice(self.actions)
-        q_values = [self.q_table[(state.tobytes(), action)] for action in self.actions]
-        max_q = max(q_values)
-        return random.choice(
-            [
-                action
-                for action, q_value in zip(self.actions, q_values)
-                if q_value == max_q
-            ]
-        )
+        if self.rng.random() < self.epsilon:
+            return self.actions[int(self.rng.random() * len(self.actions))]
+        q_values = self.q_table.get(state)[self.action_indices]
+        max_q = q_values.max()
+        best_actions = [
+            action
+            for action, q_value in zip(self.actions, q_values)
+            if q_value == max_q
+        ]
+        return best_actions[int(self.rng.random() * len(best_actions))]
 
     def learn(self, state, action, reward, next_state):
-        current_q = self.q_table[(state.tobytes(), action)]
-        max_next_q = max(
-            [
-                self.q_table[(next_state.tobytes(), next_action)]
-                for next_action in self.actions
-            ]
+        current_q = self.q_table.get(state)[DIRECTION_INDEX[action]]
+        max_next_q = self.q_table.get(next_state)[self.action_indices].max()
+        self.q_table.set(
+            state,
+            DIRECTION_INDEX[action],
+            current_q
+            + self.learning_rate
+            * (reward + self.discount_factor * max_next_q - current_q),
+        )
+
+    def choose_actions(self, states):
+        """choose_action for a (K,) array of states, as direction indices."""
+        action_indices = np.array(self.action_indices)
+        q_values = self.q_table.get_many(states)[:, action_indices]
+        # Random tie-breaking among the best actions, as in choose_action
+        best = q_values == q_values.max(axis=1, keepdims=True)
+        greedy = np.argmax(np.where(best, self.rng.random(best.shape), -1), axis=1)
+        explore = self.rng.random(len(states)) < self.epsilon
+        random = (self.rng.random(len(states)) * len(action_indices)).astype(int)
+        return action_indices[np.where(explore, random, greedy)]
+
+    def learn_batch(self, states, actions, rewards, next_states, dones):
+        """learn for arrays of transitions; finished games have no next value."""
+        index = np.arange(len(states))
+        current_q = self.q_table.get_many(states)[index, actions]
+        max_next_q = self.q_table.get_many(next_states)[:, self.action_indices].max(
+            axis=1
         )
-        self.q_table[(state.tobytes(), action)] = current_q + self.learning_rate * (
-            reward + self.discount_factor * max_next_q - current_q
+        max_next_q[dones] = 0
+        self.q_table.set_many(
+            states,
+            actions,
+            current_q
+            + self.learning_rate
+            * (rewards + self.discount_factor * max_next_q - current_q),
         )
 
+    def save(self, path):
+        self.q_table.save(path)
+
+    def load(self, path, mmap_mode="c"):
+        self.q_table = QTable.load(path, mmap_mode)
+
 
-def train_2048_agent(episodes=1000000):
-    game = Game2048()
-    agent = QLearningAgent(actions=["left", "right", "up", "down"])
+def train_2048_agent(episodes=1000000, seed=None, reward="tile_sum"):
+    """
+    Train a QLearningAgent on one Game2048. The reward of a move is the change
+    in the sum of the tiles (``reward="tile_sum"``) or its merge score
+    (``reward="merge_score"``), and -1 for a move that changes nothing.
+    """
+    if reward not in REWARDS:
+        raise ValueError(f"Unknown reward: {reward}")
+    # Independent streams for the tile spawns and the agent's exploration
+    game_seed, agent_seed = np.random.SeedSequence(seed).spawn(2)
+    game = Game2048(np.random.default_rng(game_seed))
+    agent = QLearningAgent(
+        actions=["left", "right", "up", "down"],
+        rng=np.random.default_rng(agent_seed),
+    )
     rewards = []
 
     for episode in range(episodes):
-        state = game.reset()
+        game.reset()
+        state = game.get_packed_state()
+        tile_sum = np.sum(game.get_state())
         total_reward = 0
 
         while not game.is_game_over():
             action = agent.choose_action(state)
+            score = game.get_score()
             if game.move(action):
-                next_state = game.get_state()
-                reward = np.sum(next_state) - np.sum(state)
-                agent.learn(state, action, reward, next_state)
-                state = next_state
-                total_reward += reward
+                next_state = game.get_packed_state()
+                next_tile_sum = np.sum(game.get_state())
+                if reward == "tile_sum":
+                    move_reward = next_tile_sum - tile_sum
+                else:
+                    move_reward = game.get_score() - score
+                agent.learn(state, action, move_reward, next_state)
+                state, tile_sum = next_state, next_tile_sum
+                total_reward += move_reward
             else:
-                reward = -1
-                agent.learn(state, action, reward, state)
+                agent.learn(state, action, -1, state)
 
         rewards.append(total_reward)
         if (episode + 1) % 100 == 0:
@@ -67,7 +128,45 @@ def train_2048_agent(episodes=1000000):
     return agent, rewards
 
 
+def train_2048_agent_vectorized(
+    episodes=1000000, num_games=64, seed=None, reward="tile_sum"
+):
+    """
+    train_2048_agent on a VectorGame2048: ``num_games`` games are played in
+    lockstep and their transitions learned as one batch per step, with the
+    same ``reward``. The returned rewards are the final scores of the
+    finished games.
+    """
+    game_seed, agent_seed = np.random.SeedSequence(seed).spawn(2)
+    env = VectorGame2048(num_games, np.random.default_rng(game_seed), reward)
+    agent = QLearningAgent(
+        actions=["left", "right", "up", "down"],
+        rng=np.random.default_rng(agent_seed),
+    )
+    states, _ = env.reset()
+    reported = 0
+
+    while len(env.finished_scores) < episodes:
+        actions = agent.choose_actions(states)
+        next_states, rewards, _, dones = env.step(actions)
+        # An auto-reset game's next state is a new game, not a successor
+        agent.learn_batch(states, actions, rewards, next_states, dones)
+        states = next_states
+
+        finished = len(env.finished_scores)
+        if finished // 100 > reported // 100:
+            print(
+                f"Episode {finished}/{episodes}, "
+                f"Total Reward: {env.finished_scores[-1]}"
+            )
+        reported = finished
+
+    return agent, env.finished_scores[:episodes]
+
+
 def plot_rewards(rewards):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(10, 5))
     plt.plot(rewards, label="Total Reward per Episode")
     plt.xlabel("Episode")
@@ -77,5 +176,6 @@ def plot_rewards(rewards):
     plt.show()
 
 
-agent, rewards = train_2048_agent(episodes=10000)
-plot_rewards(rewards)
+if __name__ == "__main__":
+    agent, rewards = train_2048_agent(episodes=10000)
+    plot_rewards(rewards)
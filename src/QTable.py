@@ -0,0 +1,140 @@
+"""
+Compact, bounded Q-table keyed by packed boards.
+
+All entries live in one structured NumPy array with a packed 64-bit board, a
+float32 Q-value per direction and a last-use stamp, 28 bytes per state. The
+8 rotations and reflections of a board share one entry, stored under the
+smallest of the 8 packed boards with the Q-values permuted accordingly.
+
+The array is split into buckets of WAYS slots (set-associative, like a CPU
+cache). A state can only live in its hash bucket, and when the bucket is full
+the least recently used state in it is evicted, so memory never grows past
+the capacity. The table saves to a .npy file that can be memory-mapped back.
+"""
+
+import numpy as np
+from Bitboard import SYMMETRY_DIRECTIONS, canonical
+from BatchSimulator import batch_canonical
+from BatchSimulator import SYMMETRY_DIRECTIONS as BATCH_SYMMETRY_DIRECTIONS
+
+SLOT_DTYPE = np.dtype([("key", np.uint64), ("q", np.float32, 4), ("stamp", np.uint32)])
+WAYS = 4
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # 2**64 / golden ratio
+EMPTY_KEY = 0  # The empty board never occurs in a game
+
+
+class QTable:
+    def __init__(self, capacity=1 << 20, slots=None):
+        if slots is None:
+            buckets = 1 << max(0, (capacity // WAYS - 1).bit_length())
+            slots = np.zeros(buckets * WAYS, dtype=SLOT_DTYPE)
+        self.slots = slots
+        self.keys = slots["key"]
+        self.q = slots["q"]
+        self.stamps = slots["stamp"]
+        self.hash_shift = 64 - (len(slots) // WAYS).bit_length() + 1
+        self.clock = int(self.stamps.max()) if len(slots) else 0
+        self.evictions = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.keys))
+
+    @property
+    def capacity(self):
+        return len(self.slots)
+
+    @property
+    def nbytes(self):
+        return self.slots.nbytes
+
+    def _bucket(self, key):
+        start = (
+            ((key * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.hash_shift
+        ) * WAYS
+        return start, start + WAYS
+
+    def _find(self, key):
+        start, end = self._bucket(key)
+        for slot in range(start, end):
+            if self.keys[slot] == key:
+                return slot
+        return None
+
+    def _find_or_insert(self, key):
+        start, end = self._bucket(key)
+        empty = None
+        for slot in range(start, end):
+            slot_key = self.keys[slot]
+            if slot_key == key:
+                return slot
+            if slot_key == EMPTY_KEY and empty is None:
+                empty = slot
+        if empty is None:
+            # Bucket full: evict its least recently used state
+            empty = start + int(np.argmin(self.stamps[start:end]))
+            self.evictions += 1
+        self.keys[empty] = key
+        self.q[empty] = 0.0
+        return empty
+
+    def _find_many(self, keys):
+        # Vectorized _find: the slot of every key and whether it was there
+        starts = (keys * np.uint64(HASH_MULTIPLIER)) >> np.uint64(self.hash_shift)
+        slots = starts.astype(np.int64)[:, None] * WAYS + np.arange(WAYS)
+        match = self.keys[slots] == keys[:, None]
+        return slots[np.arange(len(keys)), match.argmax(axis=1)], match.any(axis=1)
+
+    def get(self, board):
+        """Q-values of a packed board, indexed like Bitboard.DIRECTIONS."""
+        key, symmetry = canonical(board)
+        slot = self._find(key)
+        if slot is None:
+            return np.zeros(4, dtype=np.float32)
+        return self.q[slot][SYMMETRY_DIRECTIONS[symmetry]]
+
+    def set(self, board, direction, value):
+        """Set the Q-value of ``direction`` (a Bitboard.DIRECTIONS index)."""
+        key, symmetry = canonical(board)
+        slot = self._find_or_insert(key)
+        self.q[slot, SYMMETRY_DIRECTIONS[symmetry][direction]] = value
+        self.clock += 1
+        self.stamps[slot] = self.clock
+
+    def get_many(self, boards):
+        """get() for a (N,) array of packed boards, as a (N, 4) array."""
+        keys, symmetry = batch_canonical(np.asarray(boards, dtype=np.uint64))
+        slots, found = self._find_many(keys)
+        q = np.where(found[:, None], self.q[slots], 0)
+        return np.take_along_axis(q, BATCH_SYMMETRY_DIRECTIONS[symmetry], axis=1)
+
+    def set_many(self, boards, directions, values):
+        """
+        set() for arrays of boards, direction indices and values. When a board
+        appears more than once, the last value wins.
+        """
+        keys, symmetry = batch_canonical(np.asarray(boards, dtype=np.uint64))
+        _, found = self._find_many(keys)
+        for key in np.unique(keys[~found]):
+            self.clock += 1
+            self.stamps[self._find_or_insert(int(key))] = self.clock
+
+        # A crowded bucket can evict a state inserted earlier in this batch
+        slots, found = self._find_many(keys)
+        slots = slots[found]
+        columns = BATCH_SYMMETRY_DIRECTIONS[
+            symmetry[found], np.asarray(directions)[found]
+        ]
+        self.q[slots, columns] = np.asarray(values)[found]
+        self.stamps[slots] = self.clock + 1 + np.arange(len(slots))
+        self.clock += len(slots)
+
+    def save(self, path):
+        np.save(path, self.slots)
+
+    @classmethod
+    def load(cls, path, mmap_mode="c"):
+        """
+        Load a saved table, memory-mapped unless ``mmap_mode`` is None. Updates
+        stay in memory by default; pass mmap_mode="r+" to write them to the file.
+        """
+        return cls(slots=np.load(path, mmap_mode=mmap_mode))
@@ -0,0 +1,148 @@
+"""
+Rollout policies for the Monte Carlo agents.
+
+A policy picks the move of every rollout step. It gives each valid move a
+value and then spends the step's single uniform draw ``u`` (see ``pick``):
+
+    u < epsilon   a uniformly random valid move, from u / epsilon
+    otherwise     a random move among the highest valued ones, from
+                  (u - epsilon) / (1 - epsilon)
+
+RandomPolicy values every move the same, which is the original uniform
+choice on the same draw. GreedyPolicy values a move by the score its merges
+gain, CornerPolicy by a fixed preference of directions that keeps the big
+tiles in the bottom left corner and EpsilonGreedyPolicy by a
+JitEngine.LineScore (a table heuristic) of the board after the move.
+
+The same rule runs on the Python engines (``policy(game)``), in
+BatchSimulator (``batch_directions``) and in the JIT kernel (from ``kind``,
+``epsilon`` and ``line_score``), so kernel rollouts still replay exactly on
+Game2048. Policies other than RandomPolicy need packed 4x4 boards.
+"""
+
+import numpy as np
+from Bitboard import DIRECTIONS, MOVE_FUNCTIONS
+
+RANDOM, GREEDY, CORNER, EPSILON_GREEDY = range(4)
+
+# CornerPolicy values of left, right, up and down: down, then left, then right
+CORNER_PRIORITY = np.array([3.0, 2.0, 1.0, 4.0])
+
+
+def pick(values, draw, epsilon=0.0):
+    """Index of the policy's choice among the ``values`` of the valid moves."""
+    if draw < epsilon:
+        return min(int(draw / epsilon * len(values)), len(values) - 1)
+    best = max(values)
+    ties = [i for i, value in enumerate(values) if value == best]
+    k = int((draw - epsilon) / (1.0 - epsilon) * len(ties))
+    return ties[min(k, len(ties) - 1)]
+
+
+class RolloutPolicy:
+    kind = RANDOM
+    epsilon = 0.0
+    line_score = None
+
+    def value(self, direction, board, score):
+        """Value of the move ``direction`` to ``board``, gaining ``score``."""
+        return 0.0
+
+    def batch_values(self, results, scores):
+        """value for (N, 4) arrays of moved boards and score increments."""
+        return np.zeros(results.shape)
+
+    def __call__(self, game):
+        """Direction of the next rollout move on ``game``, None at game over."""
+        board = game.get_packed_state()
+        directions = []
+        values = []
+        for direction, move in enumerate(MOVE_FUNCTIONS):
+            result, score = move(board)
+            if result != board:
+                directions.append(direction)
+                values.append(self.value(direction, result, score))
+        if not directions:
+            return None
+        # Rollouts draw moves and spawns from the simulated game's generator
+        index = pick(values, game.rng.random(), self.epsilon)
+        return DIRECTIONS[directions[index]]
+
+    def batch_directions(self, results, scores, valid, draws):
+        """
+        pick for N boards at once, from their (N, 4) moved boards, score
+        increments and valid moves and their (N,) draws. Boards without a
+        valid move get direction 0.
+        """
+        values = np.where(valid, self.batch_values(results, scores), -np.inf)
+        best = valid & (values == values.max(axis=1, keepdims=True))
+        if self.epsilon:
+            explore = draws < self.epsilon
+            candidates = np.where(explore[:, None], valid, best)
+            draws = np.where(
+                explore,
+                draws / self.epsilon,
+                (draws - self.epsilon) / (1.0 - self.epsilon),
+            )
+        else:
+            candidates = best
+        count = candidates.sum(axis=1)
+        k = np.minimum((draws * count).astype(np.int64), count - 1)
+        return np.argmax(
+            candidates & (np.cumsum(candidates, axis=1) == k[:, None] + 1), axis=1
+        )
+
+
+class RandomPolicy(RolloutPolicy):
+    """Uniformly random valid moves, the agents' default."""
+
+    def __call__(self, game):
+        # Only the valid moves are needed, which works on every board size
+        moves = game.get_valid_moves()
+        if moves:
+            return moves[int(game.rng.random() * len(moves))]
+        return None
+
+
+class GreedyPolicy(RolloutPolicy):
+    """The move whose merges gain the most score, ties broken at random."""
+
+    kind = GREEDY
+
+    def value(self, direction, board, score):
+        return score
+
+    def batch_values(self, results, scores):
+        return scores.astype(np.float64)
+
+
+class CornerPolicy(RolloutPolicy):
+    """Down if it is valid, else left, else right, else up."""
+
+    kind = CORNER
+
+    def value(self, direction, board, score):
+        return CORNER_PRIORITY[direction]
+
+    def batch_values(self, results, scores):
+        return np.broadcast_to(CORNER_PRIORITY, results.shape)
+
+
+class EpsilonGreedyPolicy(RolloutPolicy):
+    """
+    The move to the best board under ``line_score`` (a JitEngine.LineScore,
+    e.g. LineScore.from_heuristic(TableHeuristic())), or a random move with
+    probability ``epsilon``.
+    """
+
+    kind = EPSILON_GREEDY
+
+    def __init__(self, line_score, epsilon=0.1):
+        self.line_score = line_score
+        self.epsilon = epsilon
+
+    def value(self, direction, board, score):
+        return self.line_score.score(board)
+
+    def batch_values(self, results, scores):
+        return self.line_score.batch_score(results.ravel()).reshape(results.shape)
@@ -0,0 +1,147 @@
+"""
+Self-play transitions on disk, for offline learning.
+
+``generate_dataset`` plays any agent's games on the simulation runner's worker
+pool, recording every game (see GameRecord.py), and turns the records into
+(state, action, reward, next_state, done) transitions. The transitions are
+stored as ParallelQLearning.TRANSITION_DTYPE arrays in .npy shards of
+``shard_size`` entries. The reward is the move's merge score, as in the
+vectorized Q-learning trainer.
+
+``TransitionDataset`` memory-maps the shards and streams shuffled minibatches:
+shards are visited in random order and each one is shuffled on its own, so
+only the pages of the current minibatch are read into memory.
+``train_offline`` feeds those minibatches to QLearningAgent.learn_batch.
+"""
+
+import glob
+import os
+import numpy as np
+from Bitboard import MOVE_FUNCTIONS
+from GameRecord import GameRecords
+from ParallelQLearning import TRANSITION_DTYPE
+from QLearningAgent import QLearningAgent
+from Simulation import run_simulations_in_parallel
+
+RECORDS_DIR = "records"
+RESULTS_LOG = "results.jsonl"
+SHARD_PATTERN = "transitions-{:05d}.npy"
+SHARD_GLOB = "transitions-*.npy"
+
+
+def game_transitions(records, i):
+    """The transitions of recorded game ``i``, as a TRANSITION_DTYPE array."""
+    moves = records.game_moves(i)
+    transitions = np.empty(len(moves), dtype=TRANSITION_DTYPE)
+    board = int(records.game_checkpoints(i)[0])
+    boards = []
+    for direction, cell, rank, _ in moves.tolist():
+        board, _ = MOVE_FUNCTIONS[direction](board)
+        board |= rank << (4 * cell)
+        boards.append(board)
+    transitions["next_state"] = boards
+    transitions["state"][0] = records.game_checkpoints(i)[0]
+    transitions["state"][1:] = transitions["next_state"][:-1]
+    transitions["action"] = moves["direction"]
+    transitions["reward"] = moves["score_delta"]
+    transitions["done"] = False
+    transitions["done"][-1:] = True
+    return transitions
+
+
+def write_shards(records, path, shard_size=1 << 20):
+    """Write the transitions of every recorded game to shards; returns their count."""
+    for shard in glob.glob(os.path.join(path, SHARD_GLOB)):
+        os.remove(shard)
+
+    buffer = np.empty(shard_size, dtype=TRANSITION_DTYPE)
+    filled = 0
+    shards = 0
+    total = 0
+    for i in range(len(records)):
+        transitions = game_transitions(records, i)
+        total += len(transitions)
+        while len(transitions):
+            count = min(shard_size - filled, len(transitions))
+            buffer[filled : filled + count] = transitions[:count]
+            transitions = transitions[count:]
+            filled += count
+            if filled == shard_size:
+                np.save(os.path.join(path, SHARD_PATTERN.format(shards)), buffer)
+                shards += 1
+                filled = 0
+    if filled:
+        np.save(os.path.join(path, SHARD_PATTERN.format(shards)), buffer[:filled])
+    return total
+
+
+def generate_dataset(
+    agent,
+    path,
+    num_games,
+    move_args=(40, 10),
+    n_jobs=-1,
+    seed=None,
+    shard_size=1 << 20,
+):
+    """
+    Play ``num_games`` games of ``agent`` and store their transitions in
+    ``path``. The games are logged and recorded in ``path`` too, so calling it
+    again after an interruption resumes the run, then rewrites the shards.
+    Returns the number of transitions.
+    """
+    os.makedirs(path, exist_ok=True)
+    run_simulations_in_parallel(
+        agent,
+        num_games,
+        n_jobs=n_jobs,
+        move_args=move_args,
+        seed=seed,
+        log_path=os.path.join(path, RESULTS_LOG),
+        record_path=os.path.join(path, RECORDS_DIR),
+    )
+    records = GameRecords(os.path.join(path, RECORDS_DIR))
+    return write_shards(records, path, shard_size)
+
+
+class TransitionDataset:
+    """Memory-mapped transition shards written by generate_dataset."""
+
+    def __init__(self, path):
+        self.paths = sorted(glob.glob(os.path.join(path, SHARD_GLOB)))
+        self.shards = [np.load(shard, mmap_mode="r") for shard in self.paths]
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def minibatches(self, batch_size=4096, rng=None, epochs=1):
+        """Yield shuffled TRANSITION_DTYPE minibatches, one shard at a time."""
+        rng = rng if rng is not None else np.random.default_rng()
+        for _ in range(epochs):
+            for shard_index in rng.permutation(len(self.shards)):
+                shard = self.shards[shard_index]
+                order = rng.permutation(len(shard))
+                for start in range(0, len(shard), batch_size):
+                    # Sorted indices read the mapped file front to back
+                    yield shard[np.sort(order[start : start + batch_size])]
+
+
+def train_offline(dataset, epochs=1, batch_size=4096, agent=None, seed=None):
+    """Q-learning from a TransitionDataset; returns the agent."""
+    shuffle_seed, agent_seed = np.random.SeedSequence(seed).spawn(2)
+    if agent is None:
+        agent = QLearningAgent(
+            actions=["left", "right", "up", "down"],
+            rng=np.random.default_rng(agent_seed),
+        )
+    for batch in dataset.minibatches(
+        batch_size, np.random.default_rng(shuffle_seed), epochs
+    ):
+        agent.learn_batch(
+            batch["state"],
+            batch["action"],
+            batch["reward"],
+            batch["next_state"],
+            batch["done"],
+        )
+    return agent
@@ -1,42 +1,74 @@
-import sys
-import os
+import contextlib
 import numpy as np
 from Game2048 import Game2048, TILE_COLORS
-import matplotlib.pyplot as plt
 from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from SimulationResults import ResultsAggregator, ResultsLog
+from GameRecord import GameRecord, GameRecordWriter
+from Profiler import Profile, Profiler, profiled_call
+from JitEngine import warm_up
 from tqdm import tqdm
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
 import time
 
 
-def suppress_pygame_output(func):
-    """Decorator to suppress stdout and stderr temporarily."""
-
-    def wrapper(*args, **kwargs):
-        # Suppress output
-        original_stdout = sys.stdout
-        original_stderr = sys.stderr
-        sys.stdout = open(os.devnull, "w")
-        sys.stderr = open(os.devnull, "w")
-
-        try:
-            result = func(*args, **kwargs)
-        finally:
-            # Restore output
-            sys.stdout = original_stdout
-            sys.stderr = original_stderr
-
-        return result
-
-    return wrapper
-
-
-@suppress_pygame_output
-def run_single_simulation(agent):
-    game = Game2048()
-    game.reset()
-    while not game.is_game_over():
-        agent.move(game, 40, 10)
+def _timed_call(func, args, kwargs):
+    start = time.process_time()
+    result = func(*args, **kwargs)
+    return result, time.process_time() - start
+
+
+class MovePool:
+    """
+    Shared worker pool handed to an agent for move-level parallelism.
+
+    Agents call it like a joblib Parallel with an iterable of delayed tasks; it
+    also adds up the CPU time the tasks spent in the workers. With a
+    ``profile``, the tasks are profiled in the workers and merged into it.
+    """
+
+    def __init__(self, parallel, profile=None):
+        self.parallel = parallel
+        self.cpu_seconds = 0.0
+        self.profile = profile
+
+    def __call__(self, tasks):
+        if self.profile is not None:
+            tasks = ((profiled_call, task, {}) for task in tasks)
+        results = list(self.parallel(delayed(_timed_call)(*task) for task in tasks))
+        self.cpu_seconds += sum(cpu_seconds for _, cpu_seconds in results)
+        if self.profile is None:
+            return [result for result, _ in results]
+        for (_, profile), _ in results:
+            self.profile.merge(Profile.from_dict(profile))
+        return [result for (result, _), _ in results]
+
+
+def run_single_simulation(
+    agent, move_args=(40, 10), seed=None, profile=False, record=False
+):
+    """
+    Play one game. ``seed`` (an int or a SeedSequence) gives the game's tile
+    spawns and the agent's search independent, reproducible streams.
+
+    With ``profile=True`` the game runs under a Profiler and its profile dict
+    is appended to the result, including the move-level tasks of a
+    profiling MovePool. With ``record=True`` the game's GameRecord is
+    appended last.
+    """
+    start = time.process_time()
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    game_seed, agent_seed = seed.spawn(2)
+    agent.rng = np.random.default_rng(agent_seed)
+    game = Game2048(np.random.default_rng(game_seed))
+    with Profiler() if profile else contextlib.nullcontext() as game_profile:
+        game.reset()
+        game_record = GameRecord(game) if record else None
+        while not game.is_game_over():
+            score = game.score
+            _, direction = agent.move(game, *move_args)
+            if game_record is not None:
+                game_record.add_move(game, direction, game.score - score)
     win = game.is_win()
     board = game.get_state()
     unique, counts = np.unique(board, return_counts=True)
@@ -44,43 +76,164 @@ def run_single_simulation(agent):
     max_tile = max(tile_counts.keys())
     score = game.get_score()
 
-    return win, max_tile, score
-
+    result = bool(win), int(max_tile), int(score), time.process_time() - start
+    if profile:
+        pool_profile = getattr(getattr(agent, "parallel", None), "profile", None)
+        if pool_profile is not None:
+            # Move-level tasks profiled in the workers during this game
+            game_profile.merge(pool_profile)
+            agent.parallel.profile = Profile()
+        result += (game_profile.to_dict(),)
+    if record:
+        result += (game_record.finish(game),)
+    return result
+
+
+def _run_indexed_simulation(index, agent, move_args, seed, profile, record):
+    return index, run_single_simulation(agent, move_args, seed, profile, record)
+
+
+def run_simulations_in_parallel(
+    agent,
+    num_simulations,
+    n_jobs=-1,
+    parallelism="game",
+    chunk_size="auto",
+    move_args=(40, 10),
+    seed=None,
+    log_path=None,
+    snapshot_path=None,
+    snapshot_every=10,
+    profile=False,
+    record_path=None,
+):
+    """
+    Play ``num_simulations`` games on one long-lived worker pool.
+
+    With ``parallelism="game"`` whole games are spread over the workers in
+    chunks of ``chunk_size`` and the agent searches serially inside each game.
+    With ``parallelism="move"`` games run one after the other and the agent
+    spreads each move's search over the same pool. Pools are never nested.
+    Agents built with ``batch=True`` simulate each decision's rollouts in one
+    batch instead, which leaves no move-level work to spread, so they only
+    run with ``parallelism="game"``.
+
+    Each game gets its own child of ``seed``, so a seeded run is reproducible
+    and two agents can be compared on the same tile-spawn streams.
+
+    Results are aggregated as games finish. With ``log_path`` every game is
+    appended to a JSON Lines log, and running again with the same log resumes
+    the run, skipping the games already logged. With ``snapshot_path`` the
+    live win rate and tile distribution are written every ``snapshot_every``
+    games.
+
+    With ``profile=True`` every game is profiled (see Profiler.py): each
+    game's profile goes into its log line and the merged profile of the
+    session is returned as ``stats["profile"]``.
+
+    With ``record_path`` every game's moves and spawns are appended to a
+    GameRecord directory (see GameRecord.py) for replay and analysis.
+    """
+    workers = effective_n_jobs(n_jobs)
+    if workers > 1:
+        # Compile the JIT kernels once here, workers then load them from disk
+        warm_up()
+    aggregator = ResultsAggregator()
+    log = ResultsLog(log_path) if log_path else None
+
+    completed = {}
+    if log is not None:
+        seed, completed = log.open(num_simulations, seed, move_args)
+        for result in completed.values():
+            aggregator.add(result)
+    seeds = np.random.SeedSequence(seed).spawn(num_simulations)
+    pending = [index for index in range(num_simulations) if index not in completed]
+
+    progress = tqdm(total=num_simulations, initial=len(completed))
+    session_cpu_seconds = 0.0
+    session_profile = Profile()
+    records = GameRecordWriter(record_path) if record_path else None
+    record_games = records is not None
+
+    def record(index, result):
+        nonlocal session_cpu_seconds
+        if record_games:
+            # Skipped if the game was recorded before a crash cut its log line
+            records.append(index, result[-1])
+            result = result[:-1]
+        if profile:
+            session_profile.merge(Profile.from_dict(result[4]))
+        aggregator.add(result)
+        session_cpu_seconds += result[3]
+        if log is not None:
+            log.append(index, result)
+        if snapshot_path and aggregator.games % snapshot_every == 0:
+            aggregator.write_snapshot(snapshot_path)
+        progress.update()
+        progress.set_postfix(
+            win="{:.1f}%".format(aggregator.win_percentage),
+            best=aggregator.best_score,
+        )
 
-def run_simulations_in_parallel(agent, num_simulations):
-    results = Parallel(n_jobs=-1)(
-        delayed(run_single_simulation)(agent) for _ in tqdm(range(num_simulations))
-    )
-    win_count = sum(1 for result in results if result[0])
-
-    tile_distribution = {
-        131072: 0,
-        65536: 0,
-        32768: 0,
-        16384: 0,
-        8192: 0,
-        4096: 0,
-        2048: 0,
-        1024: 0,
-        512: 0,
-        256: 0,
-        128: 0,
-        64: 0,
-        32: 0,
-        16: 0,
-        8: 0,
-        4: 0,
-        2: 0,
+    start = time.perf_counter()
+    try:
+        if parallelism == "game":
+            with Parallel(
+                n_jobs=n_jobs, batch_size=chunk_size, return_as="generator_unordered"
+            ) as parallel:
+                agent.parallel = None
+                for index, result in parallel(
+                    delayed(_run_indexed_simulation)(
+                        index, agent, move_args, seeds[index], profile, record_games
+                    )
+                    for index in pending
+                ):
+                    record(index, result)
+        elif parallelism == "move":
+            if getattr(agent, "batch", False):
+                raise ValueError("Agents with batch=True use parallelism='game'")
+            with Parallel(
+                n_jobs=n_jobs, batch_size=chunk_size, return_as="generator"
+            ) as parallel:
+                agent.parallel = MovePool(parallel, Profile() if profile else None)
+                for index in pending:
+                    record(
+                        index,
+                        run_single_simulation(
+                            agent, move_args, seeds[index], profile, record_games
+                        ),
+                    )
+                session_cpu_seconds += agent.parallel.cpu_seconds
+                agent.parallel = None
+        else:
+            raise ValueError(f"Unknown parallelism: {parallelism}")
+    finally:
+        progress.close()
+        if log is not None:
+            log.close()
+        if records is not None:
+            records.close()
+        if snapshot_path and aggregator.games:
+            aggregator.write_snapshot(snapshot_path)
+
+    wall_seconds = time.perf_counter() - start
+
+    stats = {
+        "workers": workers,
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": session_cpu_seconds,
+        "games_per_second": len(pending) / wall_seconds,
+        "cpu_utilization": session_cpu_seconds / (wall_seconds * workers),
     }
-
-    for _, max_tile, _ in results:
-        tile_distribution[max_tile] += 1
-
-    win_percentage = (win_count / num_simulations) * 100
-
-    best_score = max(results, key=lambda x: x[2])[2]
-
-    return win_percentage, tile_distribution, best_score
+    if profile:
+        stats["profile"] = session_profile.to_dict()
+
+    return (
+        aggregator.win_percentage,
+        aggregator.tile_distribution,
+        aggregator.best_score,
+        stats,
+    )
 
 
 # Function to normalize RGB values to [0, 1] range
@@ -90,6 +243,8 @@ def normalize_rgb(color):
 
 def plot_tile_distribution(tile_distribution, win_percentage, best_score):
     """Plot the tile distribution with values on top of each bar using specific colors."""
+    import matplotlib.pyplot as plt
+
     sorted_tiles = sorted(tile_distribution.keys())
     sorted_counts = [tile_distribution[tile] for tile in sorted_tiles]
 
@@ -128,14 +283,24 @@ def plot_tile_distribution(tile_distribution, win_percentage, best_score):
 
 def main():
     num_simulations = 500  # Adjust the number of simulations as needed
-    agent = AdvancedMonteCarloAgent()
-
-    win_percentage, tile_distribution, best_score = run_simulations_in_parallel(
-        agent, num_simulations
+    # Each decision's rollouts run in one batch (the JIT kernel or BatchSimulator)
+    agent = AdvancedMonteCarloAgent(batch=True)
+
+    # Rerunning after an interruption resumes from the log
+    win_percentage, tile_distribution, best_score, stats = run_simulations_in_parallel(
+        agent,
+        num_simulations,
+        log_path="simulation_log.jsonl",
+        snapshot_path="simulation_snapshot.json",
     )
 
     print("Win Percentage: {:.0f}%".format(np.round(win_percentage)))
     print("Tile Distribution: ", tile_distribution)
+    print(
+        "Games/sec: {:.3f}, CPU utilization: {:.0f}% of {} workers".format(
+            stats["games_per_second"], stats["cpu_utilization"] * 100, stats["workers"]
+        )
+    )
 
     # Call the plot function
     plot_tile_distribution(tile_distribution, win_percentage, best_score)
@@ -0,0 +1,164 @@
+"""
+Streaming aggregation and an append-only log for simulation results.
+
+Every finished game is appended to a JSON Lines log as soon as it arrives, so
+a crashed or interrupted run keeps all games played so far and can resume
+from the log. The first line of the log records the run configuration,
+including the seed entropy, so resumed games get the same seeds they would
+have had in an uninterrupted run.
+"""
+
+import json
+import os
+import numpy as np
+
+TILES = [
+    131072,
+    65536,
+    32768,
+    16384,
+    8192,
+    4096,
+    2048,
+    1024,
+    512,
+    256,
+    128,
+    64,
+    32,
+    16,
+    8,
+    4,
+    2,
+]
+
+
+class ResultsAggregator:
+    """Incremental win rate, tile distribution and best score."""
+
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.best_score = 0
+        self.cpu_seconds = 0.0
+        self.tile_distribution = {tile: 0 for tile in TILES}
+
+    def add(self, result):
+        win, max_tile, score, cpu_seconds = result[:4]
+        self.games += 1
+        self.wins += int(win)
+        self.best_score = max(self.best_score, score)
+        self.cpu_seconds += cpu_seconds
+        self.tile_distribution[max_tile] += 1
+
+    @property
+    def win_percentage(self):
+        return (self.wins / self.games) * 100 if self.games else 0.0
+
+    def snapshot(self):
+        return {
+            "games": self.games,
+            "win_percentage": self.win_percentage,
+            "best_score": self.best_score,
+            "tile_distribution": dict(self.tile_distribution),
+        }
+
+    def write_snapshot(self, path):
+        # Write then rename, so readers never see a half-written snapshot
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temporary_path, path)
+
+
+class ResultsLog:
+    """Append-only JSON Lines log with one line per finished game."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def open(self, num_simulations, seed, move_args):
+        """
+        Open the log for appending and return ``(seed_entropy, completed)``,
+        where ``completed`` maps game index to result for the games already
+        logged by a previous run with the same configuration.
+        """
+        config = {
+            "num_simulations": num_simulations,
+            "seed_entropy": None,
+            "move_args": list(move_args),
+        }
+        completed = {}
+
+        if os.path.exists(self.path):
+            logged_config, completed, valid_bytes = self._read()
+            if logged_config is not None:
+                if seed is not None and seed != logged_config["seed_entropy"]:
+                    raise ValueError(
+                        f"{self.path} was written with seed "
+                        f"{logged_config['seed_entropy']}, not {seed}"
+                    )
+                for key in ("num_simulations", "move_args"):
+                    if logged_config[key] != config[key]:
+                        raise ValueError(
+                            f"{self.path} was written with {key}="
+                            f"{logged_config[key]}, not {config[key]}"
+                        )
+                config = logged_config
+            # Drop a line cut short by a crash before appending to the file
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+        self.file = open(self.path, "a")
+        if config["seed_entropy"] is None:
+            config["seed_entropy"] = np.random.SeedSequence(seed).entropy
+            self._write({"config": config})
+
+        return config["seed_entropy"], completed
+
+    def _read(self):
+        config = None
+        completed = {}
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                valid_bytes += len(line)
+                if "config" in record:
+                    config = record["config"]
+                else:
+                    completed[record["game"]] = (
+                        record["win"],
+                        record["max_tile"],
+                        record["score"],
+                        record["cpu_seconds"],
+                    )
+        return config, completed, valid_bytes
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def append(self, index, result):
+        win, max_tile, score, cpu_seconds = result[:4]
+        record = {
+            "game": index,
+            "win": bool(win),
+            "max_tile": int(max_tile),
+            "score": int(score),
+            "cpu_seconds": float(cpu_seconds),
+        }
+        if len(result) > 4:
+            record["profile"] = result[4]
+        self._write(record)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
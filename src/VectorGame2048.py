@@ -0,0 +1,88 @@
+"""
+Many 2048 games stepped in lockstep, for training loops.
+
+The boards of all games live in one (K,) uint64 array in the Bitboard layout
+and every step is resolved for all of them at once with the BatchSimulator
+lookup tables. The moves of the current boards are computed once per step and
+reused for the valid-move masks, the game-over flags and the next step.
+Finished games are reset automatically, so every step returns K live games.
+
+The reward of a move is the change in the sum of the tiles, like
+train_2048_agent (``reward="tile_sum"``), or its merge score
+(``reward="merge_score"``), and INVALID_MOVE_REWARD for a move that changes
+nothing.
+"""
+
+import numpy as np
+from BatchSimulator import BatchSimulator, batch_all_moves, batch_max_tile, batch_ranks
+
+INVALID_MOVE_REWARD = -1
+REWARDS = ("tile_sum", "merge_score")
+
+
+def batch_tile_sum(boards):
+    ranks = batch_ranks(boards)
+    return np.where(ranks > 0, 1 << ranks, 0).sum(axis=1)
+
+
+class VectorGame2048:
+    def __init__(self, num_games, rng=None, reward="tile_sum"):
+        if reward not in REWARDS:
+            raise ValueError(f"Unknown reward: {reward}")
+        self.num_games = num_games
+        self.reward = reward
+        self.simulator = BatchSimulator(rng)
+        self.boards = np.zeros(num_games, dtype=np.uint64)
+        self.scores = np.zeros(num_games, dtype=np.int64)
+        # Score and max tile of every game finished so far, in finishing order
+        self.finished_scores = []
+        self.finished_max_tiles = []
+        self.reset()
+
+    def _new_boards(self, count):
+        boards = np.zeros(count, dtype=np.uint64)
+        for _ in range(2):
+            boards = self.simulator.add_new_tiles(boards)
+        return boards
+
+    def _update_moves(self):
+        self.results, self.move_scores = batch_all_moves(self.boards)
+        self.valid = self.results != self.boards[:, None]
+
+    def reset(self):
+        self.boards = self._new_boards(self.num_games)
+        self.scores[:] = 0
+        self._update_moves()
+        return self.boards.copy(), self.valid.copy()
+
+    def step(self, actions):
+        """
+        Play one direction index per game.
+
+        Returns the next boards, the rewards (see the module docstring), the
+        valid-move masks of the next boards and the done flags. A game that
+        is over after this step is reported as done and its returned board is
+        already the first board of a new game.
+        """
+        index = np.arange(self.num_games)
+        moved = self.valid[index, actions]
+        boards = self.simulator.add_new_tiles(self.results[index, actions], moved)
+        move_scores = self.move_scores[index, actions]
+        if self.reward == "tile_sum":
+            gains = batch_tile_sum(boards) - batch_tile_sum(self.boards)
+        else:
+            gains = move_scores
+        rewards = np.where(moved, gains, INVALID_MOVE_REWARD)
+        self.scores += np.where(moved, move_scores, 0)
+
+        self.boards = boards
+        self._update_moves()
+        dones = ~self.valid.any(axis=1)
+        if dones.any():
+            self.finished_scores.extend(self.scores[dones].tolist())
+            self.finished_max_tiles.extend(batch_max_tile(boards[dones]).tolist())
+            self.scores[dones] = 0
+            self.boards[dones] = self._new_boards(int(dones.sum()))
+            self._update_moves()
+
+        return self.boards.copy(), rewards, self.valid.copy(), dones
@@ -0,0 +1,83 @@
+"""
+Check the rollout accounting of AdvancedMonteCarloAgent.anytime_move
+
+For seeded games and boards do the following:
+    - Run anytime searches with budgets from one rollout per first move up
+      to 40 per first move and require last_rollouts to stay within the
+      budget, and a smaller budget to raise ValueError
+    - Require a board with a single legal move to be played with 0 rollouts
+    - Require a board with a clearly dominant move to stop after the first
+      round, with at most half its budget spent, for every agent seed
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from Game2048 import Game2048
+
+# Parameters
+GAMES = 2
+SEARCH_LENGTH = 10
+DOMINANT_BUDGET = 400
+SEEDS = 20
+SEED = 2048
+
+# Only "right" is legal: every row is packed left and nothing merges
+FORCED_BOARD = [[2, 4, 2, 0], [4, 2, 4, 0], [2, 4, 2, 0], [4, 2, 4, 0]]
+# Merging the 64s leads the other moves by two standard errors after the
+# first round of the search
+DOMINANT_BOARD = [[2, 8, 0, 2], [4, 64, 0, 64], [8, 4, 4, 4], [4, 2, 2, 2]]
+
+
+def game_of(board, rng):
+    game = Game2048(rng)
+    game.restore((np.array(board), 0))
+    return game
+
+
+rng = np.random.default_rng(SEED)
+agent = AdvancedMonteCarloAgent(rng=rng)
+searches = 0
+for _ in range(GAMES):
+    game = Game2048(rng)
+    while not game.is_game_over():
+        first_moves = len(game.get_valid_moves())
+        for budget in (first_moves, first_moves + 1, 10, 37, 40 * first_moves):
+            if budget < first_moves:
+                continue
+            agent.anytime_move(game.clone(rng=rng), SEARCH_LENGTH, budget)
+            assert agent.last_rollouts <= budget, (budget, agent.last_rollouts)
+            searches += 1
+        if first_moves > 1:
+            try:
+                agent.anytime_move(game.clone(rng=rng), SEARCH_LENGTH, first_moves - 1)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("a budget below one rollout per move was accepted")
+        game.move(rng.choice(game.get_valid_moves()))
+
+game = game_of(FORCED_BOARD, rng)
+assert game.get_valid_moves() == ["right"], game.get_valid_moves()
+agent.anytime_move(game, SEARCH_LENGTH, DOMINANT_BUDGET)
+assert agent.last_rollouts == 0, agent.last_rollouts
+assert game.get_state()[:, 1:].tolist() == [
+    row[:3] for row in FORCED_BOARD
+], game.get_state()
+
+stopped = []
+for seed in range(SEEDS):
+    agent = AdvancedMonteCarloAgent(rng=np.random.default_rng([SEED, seed]))
+    game = game_of(DOMINANT_BOARD, np.random.default_rng([SEED, seed]))
+    agent.anytime_move(game, SEARCH_LENGTH, DOMINANT_BUDGET)
+    assert agent.last_rollouts <= DOMINANT_BUDGET // 2, (seed, agent.last_rollouts)
+    stopped.append(agent.last_rollouts)
+
+print(
+    f"Anytime search kept {searches} searches within budget and stopped the "
+    f"dominant board after {min(stopped)}-{max(stopped)} of {DOMINANT_BUDGET} rollouts"
+)
@@ -0,0 +1,189 @@
+"""
+Check that the NumPy BatchSimulator plays exactly like Game2048
+
+Runs with GAME2048_ENGINE=numpy (set below), so the agents' batch searches
+use BatchSimulator even where Numba is installed. For boards taken from
+seeded random games do the following:
+    - Compare batch_all_moves and BatchSimulator.move with Game2048 moves
+    - Replay add_new_tiles on Game2048 with the same uniforms, and check the
+      spawn cells are uniform over the empty cells and 4s spawn 10% of the time
+    - Replay first_move_rollouts on Game2048 move by move, feeding it the
+      uniforms the batch consumed, and require the same rollout scores, for
+      random rollouts and every rollout policy
+    - Require the agents' move() with batch=True to make the decisions of
+      their batch_move from the same seed
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["GAME2048_ENGINE"] = "numpy"
+
+import numpy as np
+from Game2048 import Game2048
+from Bitboard import DIRECTIONS, decode_board
+from BatchSimulator import BatchSimulator, batch_all_moves, batch_max_tile
+from JitEngine import ENGINE, LineScore, rollout_simulator
+from MonteCarloAgent import MonteCarloAgent
+from EnhancedMonteCarloAgent import EnhancedMonteCarloAgent
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from RolloutPolicy import RANDOM, CornerPolicy, EpsilonGreedyPolicy, GreedyPolicy
+from TableHeuristic import TableHeuristic
+
+# Parameters
+GAMES = 10
+BOARDS_PER_GAME = 5
+SPAWNS = 200000
+SEARCHES_PER_MOVE = 4
+SEARCH_LENGTH = 10
+SEED = 2048
+
+
+class RecordingRng:
+    """Generator that keeps the uniform arrays it hands out."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = []
+
+    def random(self, size=None):
+        draws = self.rng.random(size)
+        self.draws.append(draws)
+        return draws
+
+
+class ReplayRng:
+    """Stands in for a Generator, returning recorded uniforms in order."""
+
+    def __init__(self, draws):
+        self.draws = iter(draws)
+
+    def random(self):
+        return next(self.draws)
+
+
+def game_of(packed, draws=()):
+    game = Game2048()
+    game.restore((decode_board(int(packed)), 0))
+    game.rng = ReplayRng(draws)
+    return game
+
+
+assert ENGINE == "numpy"
+assert isinstance(rollout_simulator(None, None, None)[0], BatchSimulator)
+
+rng = np.random.default_rng(SEED)
+boards = []
+for _ in range(GAMES):
+    game = Game2048(rng)
+    history = []
+    while not game.is_game_over():
+        game.move(rng.choice(game.get_valid_moves()))
+        history.append(game.get_packed_state())
+    boards.extend(history[:: max(len(history) // BOARDS_PER_GAME, 1)])
+boards = np.array(boards, dtype=np.uint64)
+
+# Moves
+results, scores = batch_all_moves(boards)
+for board, board_results, board_scores in zip(boards, results, scores):
+    for d, direction in enumerate(DIRECTIONS):
+        moved, score = game_of(board).peek_move(direction)
+        assert np.array_equal(decode_board(int(board_results[d])), moved), board
+        assert board_scores[d] == score, board
+
+recording = RecordingRng(np.random.default_rng(SEED))
+simulator = BatchSimulator(recording)
+directions = rng.integers(4, size=len(boards))
+moved_boards, move_scores, moved = simulator.move(boards, directions)
+picks, ranks = recording.draws
+for i, board in enumerate(boards):
+    game = game_of(board, [picks[i], ranks[i]])
+    assert game.move(DIRECTIONS[directions[i]]) == moved[i], board
+    assert game.get_packed_state() == moved_boards[i], board
+    if moved[i]:
+        assert game.get_score() == move_scores[i], board
+
+# Spawns: exact placement, then the distribution over many empty boards
+recording.draws = []
+spawned = simulator.add_new_tiles(boards)
+picks, ranks = recording.draws
+for i, board in enumerate(boards):
+    game = game_of(board, [picks[i], ranks[i]])
+    game.add_new_tile()
+    assert game.get_packed_state() == spawned[i], board
+
+spawned = simulator.add_new_tiles(np.zeros(SPAWNS, dtype=np.uint64))
+cells = np.log2(spawned.astype(np.float64)).astype(np.int64) // 4
+fours = (spawned >> (4 * cells).astype(np.uint64)) == 2
+cell_counts = np.bincount(cells, minlength=16)
+assert len(cell_counts) == 16
+# Within about 5 standard deviations
+assert np.abs(cell_counts / SPAWNS - 1 / 16).max() < 5 * np.sqrt(1 / 16 / SPAWNS)
+assert abs(fours.mean() - 0.1) < 5 * np.sqrt(0.09 / SPAWNS), fours.mean()
+
+# Rollouts
+heuristic = LineScore.from_heuristic(TableHeuristic())
+rollouts = 0
+for policy in (None, GreedyPolicy(), CornerPolicy(), EpsilonGreedyPolicy(heuristic)):
+    for score_fn in (batch_max_tile, heuristic.batch_score):
+        for board in boards:
+            first_moves = game_of(board).get_valid_moves()
+            if not first_moves:
+                continue
+            recording.draws = []
+            totals = simulator.first_move_rollouts(
+                board,
+                first_moves,
+                SEARCHES_PER_MOVE,
+                SEARCH_LENGTH,
+                score_fn,
+                policy,
+            ).ravel()
+
+            # The first moves' spawns, then per step the move draws and spawns
+            picks, ranks = recording.draws[:2]
+            steps = [
+                recording.draws[i : i + 3] for i in range(2, len(recording.draws), 3)
+            ]
+            for i, total in enumerate(totals):
+                game = game_of(board, [picks[i], ranks[i]])
+                game.move(first_moves[i // SEARCHES_PER_MOVE])
+                expected = 0.0
+                for move_draws, step_picks, step_ranks in steps:
+                    valid = game.get_valid_moves()
+                    if not valid:
+                        break
+                    if policy is None or policy.kind == RANDOM:
+                        keys = move_draws[i]
+                        direction = max(valid, key=lambda d: keys[DIRECTIONS.index(d)])
+                        game.rng = ReplayRng([step_picks[i], step_ranks[i]])
+                    else:
+                        game.rng = ReplayRng(
+                            [move_draws[i], step_picks[i], step_ranks[i]]
+                        )
+                        direction = policy(game)
+                    game.move(direction)
+                    packed = np.array([game.get_packed_state()], dtype=np.uint64)
+                    expected += score_fn(packed)[0]
+                assert total == expected, (board, i)
+                rollouts += 1
+
+# move() with batch=True
+decisions = 0
+for agent_class in (MonteCarloAgent, EnhancedMonteCarloAgent, AdvancedMonteCarloAgent):
+    for board in boards:
+        if not game_of(board).get_valid_moves():
+            continue
+        moves = []
+        for batch in (False, True):
+            agent = agent_class(rng=np.random.default_rng(SEED), batch=batch)
+            decide = agent.move if batch else agent.batch_move
+            moves.append(decide(game_of(board, rng.random(2)), 4, 4)[1])
+        assert moves[0] == moves[1], (agent_class.__name__, board)
+        decisions += 1
+
+print(
+    f"BatchSimulator matches Game2048 on {len(boards)} boards, {SPAWNS} spawns, "
+    f"{rollouts} rollouts and {decisions} batch=True decisions"
+)
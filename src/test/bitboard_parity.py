@@ -0,0 +1,88 @@
+"""
+Check that BitboardGame2048 plays exactly like the NumPy Game2048
+
+For a number of seeded random games do the following per turn:
+    - Load the reference board into the bitboard game
+    - Compare the valid moves reported by both engines
+    - Compare the boards and score increments returned by peek_move
+    - Give both engines identically seeded generators and play the same move
+    - Compare the resulting boards, scores, move results and max tiles
+
+Boards with tiles of 32768 and more are beyond the packed tables, so on
+those Game2048's valid moves are compared with its own peek_move instead.
+"""
+
+import os
+import sys
+import random
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Game2048 import Game2048
+from BitboardGame2048 import BitboardGame2048
+
+# Parameters
+GAMES = 50
+SEED = 2048
+
+rng = random.Random(SEED)
+turns = 0
+
+for game_index in range(GAMES):
+    reference = Game2048(np.random.default_rng(rng.getrandbits(32)))
+    bitboard = BitboardGame2048()
+
+    while True:
+        bitboard.board = reference.get_state()
+        bitboard.score = reference.get_score()
+
+        valid_moves = reference.get_valid_moves()
+        assert bitboard.get_valid_moves() == valid_moves, (game_index, turns)
+        assert bitboard.is_game_over() == reference.is_game_over()
+        if not valid_moves:
+            break
+
+        for direction in ["left", "right", "up", "down"]:
+            reference_board, reference_increment = reference.peek_move(direction)
+            bitboard_board, bitboard_increment = bitboard.peek_move(direction)
+            assert (reference_board == bitboard_board).all(), (game_index, turns)
+            assert reference_increment == bitboard_increment, (game_index, turns)
+
+        # Try invalid moves as well, they must leave both boards untouched
+        direction = rng.choice(["left", "right", "up", "down"])
+        seed = rng.getrandbits(32)
+        reference.rng = np.random.default_rng(seed)
+        reference_moved = reference.move(direction)
+        bitboard.rng = np.random.default_rng(seed)
+        bitboard_moved = bitboard.move(direction)
+
+        assert reference_moved == bitboard_moved, (game_index, turns)
+        assert (reference.get_state() == bitboard.get_state()).all(), (
+            game_index,
+            turns,
+        )
+        assert reference.get_score() == bitboard.get_score(), (game_index, turns)
+        assert reference.get_max_tile() == bitboard.get_max_tile()
+        assert reference.is_win() == bitboard.is_win()
+        turns += 1
+
+# Two 32768 tiles can still merge, and a 65536 tile must not spill into the
+# next cell of a packed board
+large_boards = [
+    [[32768, 32768, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]],
+    [[65536, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4]],
+    [[2, 65536, 4, 2], [4, 2, 8, 4], [2, 4, 2, 8], [4, 2, 4, 2]],
+]
+for board in large_boards:
+    reference = Game2048()
+    reference.board = np.array(board)
+    expected = [
+        direction
+        for direction in ["left", "right", "up", "down"]
+        if not (reference.peek_move(direction)[0] == reference.board).all()
+    ]
+    assert reference.get_valid_moves() == expected, board
+    assert reference.is_game_over() == (not expected), board
+
+print(f"Bitboard engine matches Game2048 on {GAMES} games ({turns} moves)")
@@ -0,0 +1,83 @@
+"""
+Check the N x N board support against the 4x4 fast paths
+
+For seeded random games on 3x3 to 6x6 boards do the following:
+    - Compare the NumPy valid move mask with one built from peek_move
+    - On 4x4 boards also compare it with the packed-table mask
+    - On 4x4 boards require TableHeuristic.score_board to equal the table
+      score, and on every size let AdvancedMonteCarloAgent play a few moves
+    - On other sizes require the 4x4-only agent options and searches to raise
+      ValueError up front
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from Bitboard import DIRECTIONS, valid_move_mask
+from Game2048 import Game2048, array_valid_move_mask
+from HeuristicGame2048 import HeuristicGame2048
+from TableHeuristic import TableHeuristic
+
+# Parameters
+SIZES = [3, 4, 5, 6]
+GAMES = 5
+AGENT_MOVES = 5
+SEED = 2048
+
+rng = np.random.default_rng(SEED)
+heuristic = TableHeuristic()
+boards = 0
+for size in SIZES:
+    for _ in range(GAMES):
+        game = Game2048(rng, size=size)
+        while True:
+            board = game.get_state()
+            expected = sum(
+                1 << i
+                for i, direction in enumerate(DIRECTIONS)
+                if not np.array_equal(game.peek_move(direction)[0], board)
+            )
+            assert game.valid_move_mask() == expected, board
+            if size == 4:
+                packed = game.get_packed_state()
+                assert array_valid_move_mask(board) == valid_move_mask(packed), board
+                assert heuristic.score_board(board) == heuristic.score(packed), board
+            boards += 1
+            if game.is_game_over():
+                break
+            game.move(rng.choice(game.get_valid_moves()))
+
+    game = Game2048(rng, size=size)
+    agent = AdvancedMonteCarloAgent(rng=rng, size=size)
+    for _ in range(AGENT_MOVES):
+        if not game.is_game_over():
+            agent.move(game, 4, 4)
+    assert game.get_state().shape == (size, size)
+
+    if size != 4:
+        for options in ({"anytime": True}, {"incremental": True}, {"batch": True}):
+            try:
+                AdvancedMonteCarloAgent(size=size, **options)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"{options} accepted on {size}x{size}")
+        packed_only = (
+            lambda: agent.batch_move(game, 4, 4),
+            lambda: agent.anytime_move(game, 4, 16),
+            lambda: AdvancedMonteCarloAgent(rng=rng).batch_move(game, 4, 4),
+            lambda: HeuristicGame2048.from_game(game),
+        )
+        for call in packed_only:
+            try:
+                call()
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"4x4-only call accepted on {size}x{size}")
+
+print(f"Board sizes {SIZES} agree with the 4x4 paths on {boards} boards")
@@ -0,0 +1,69 @@
+"""
+Check that AdvancedMonteCarloAgent(cache_bytes=...) makes exactly the
+decisions of the agent without a cache
+
+For seeded games do the following:
+    - Play each game twice in lockstep, without and with an EvalCache small
+      enough to evict, from the same game and agent seeds
+    - Require the same move at every step, with symmetric keys, with raw
+      board keys and with a weight matrix that is not symmetric
+    - Require every cached score to equal TableHeuristic.score of its board
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from Game2048 import Game2048
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+
+# Parameters
+MOVES = 80
+SEARCHES_PER_MOVE = 5
+SEARCH_LENGTH = 10
+CACHE_BYTES = 64 << 10
+SEED = 2048
+
+CORNER_MATRIX = [[7, 6, 5, 4], [6, 5, 4, 3], [5, 4, 3, 2], [4, 3, 2, 1]]
+
+# (weight matrix, symmetric keys) of each run
+CONFIGS = ((None, True), (None, False), (CORNER_MATRIX, False))
+
+decisions = 0
+for weight_matrix, symmetric in CONFIGS:
+    games = []
+    agents = []
+    for cache_bytes in (None, CACHE_BYTES):
+        # Agents spawn from their seed, so each needs its own SeedSequence
+        game_seed, agent_seed = np.random.SeedSequence(SEED).spawn(2)
+        games.append(Game2048(np.random.default_rng(game_seed)))
+        agents.append(
+            AdvancedMonteCarloAgent(
+                weight_matrix=weight_matrix,
+                rng=np.random.default_rng(agent_seed),
+                cache_bytes=cache_bytes,
+            )
+        )
+    cache = agents[1].eval_cache
+    assert cache.symmetric == (weight_matrix is None)
+    cache.symmetric = symmetric
+
+    for _ in range(MOVES):
+        if games[0].is_game_over():
+            break
+        moves = [
+            agent.move(game, SEARCHES_PER_MOVE, SEARCH_LENGTH)[1]
+            for agent, game in zip(agents, games)
+        ]
+        assert moves[0] == moves[1], (weight_matrix, symmetric, games[0].get_state())
+        assert games[0].get_packed_state() == games[1].get_packed_state()
+        decisions += 1
+
+    stats = cache.stats()
+    assert stats["hits"] and stats["evictions"], stats
+    for key, value in zip(cache.keys, cache.values):
+        assert value == agents[1].evaluator.score(key), key
+
+print(f"EvalCache left {decisions} decisions unchanged in {len(CONFIGS)} settings")
@@ -0,0 +1,84 @@
+"""
+Check that HeuristicGame2048 keeps exactly the TableHeuristic components and
+that incremental rollouts do not change the agents' decisions
+
+For seeded random games do the following:
+    - Play the game on a HeuristicGame2048 and, at every board, play and undo
+      a few random moves through snapshot/restore
+    - Require the running components to equal TableHeuristic.components of
+      the packed board after every move, spawn and restore
+    - At some boards, let the Enhanced and Advanced agents decide with and
+      without incremental=True on a Game2048 of that board, from the same
+      seed, and require the same move
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from Game2048 import Game2048
+from HeuristicGame2048 import HeuristicGame2048
+from EnhancedMonteCarloAgent import EnhancedMonteCarloAgent
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from TableHeuristic import TableHeuristic
+
+# Parameters
+GAMES = 10
+LOOKAHEAD = 3
+DECISION_INTERVAL = 25
+SEARCHES_PER_MOVE = 5
+SEARCH_LENGTH = 10
+SEED = 2048
+
+
+def check_components(game, heuristic):
+    expected = heuristic.components(game.get_packed_state())
+    assert game.heuristic_components() == expected, game.get_state()
+
+
+heuristic = TableHeuristic()
+rng = np.random.default_rng(SEED)
+boards = 0
+decisions = 0
+for _ in range(GAMES):
+    game = HeuristicGame2048(rng, heuristic)
+    check_components(game, heuristic)
+    while not game.is_game_over():
+        # Play a few random moves and undo them
+        snapshot = game.snapshot()
+        for _ in range(LOOKAHEAD):
+            moves = game.get_valid_moves()
+            if not moves:
+                break
+            game.move(moves[rng.integers(len(moves))])
+            check_components(game, heuristic)
+        game.restore(snapshot)
+        check_components(game, heuristic)
+
+        if boards % DECISION_INTERVAL == 0:
+            seed = int(rng.integers(2**32))
+            for agent_class in (EnhancedMonteCarloAgent, AdvancedMonteCarloAgent):
+                chosen = []
+                for incremental in (False, True):
+                    agent = agent_class(
+                        rng=np.random.default_rng(seed), incremental=incremental
+                    )
+                    copy = Game2048()
+                    copy.restore((game.get_state(), game.get_score()))
+                    copy.rng = np.random.default_rng(seed)
+                    _, move = agent.move(copy, SEARCHES_PER_MOVE, SEARCH_LENGTH)
+                    chosen.append(move)
+                assert chosen[0] == chosen[1], (agent_class.__name__, game.get_state())
+                decisions += 1
+
+        moves = game.get_valid_moves()
+        game.move(moves[rng.integers(len(moves))])
+        check_components(game, heuristic)
+        boards += 1
+
+print(
+    f"HeuristicGame2048 components match TableHeuristic on {boards} boards, "
+    f"{decisions} incremental decisions match"
+)
@@ -0,0 +1,108 @@
+"""
+Check that the JitEngine rollout kernel plays exactly the rollouts of the
+reference engine
+
+For boards taken from seeded random games do the following:
+    - Run JitSimulator.first_move_rollouts for every valid first move
+    - Replay every rollout on Game2048 with the agent's own simulate, feeding
+      the game the uniforms the kernel consumed
+    - Require the rollout scores to match, for the Monte Carlo, Enhanced and
+      Advanced agents' heuristics and for every rollout policy
+
+Runs the compiled kernel when Numba is installed, else the same kernel as
+plain Python.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from Game2048 import Game2048
+from MonteCarloAgent import MonteCarloAgent
+from EnhancedMonteCarloAgent import EnhancedMonteCarloAgent
+from AdvancedMonteCarloAgent import AdvancedMonteCarloAgent
+from JitEngine import DRAWS_PER_STEP, ENGINE, JitSimulator, LineScore
+from RolloutPolicy import CornerPolicy, EpsilonGreedyPolicy, GreedyPolicy
+
+# Parameters
+GAMES = 5
+BOARDS_PER_GAME = 8
+SEARCHES_PER_MOVE = 5
+SEARCH_LENGTH = 10
+SEED = 2048
+
+
+class ReplayRng:
+    """Stands in for a Generator, returning recorded uniforms in order."""
+
+    def __init__(self, draws):
+        self.draws = iter(draws)
+
+    def random(self):
+        return next(self.draws)
+
+
+rng = np.random.default_rng(SEED)
+games = []
+for _ in range(GAMES):
+    game = Game2048(rng)
+    boards = []
+    while not game.is_game_over():
+        game.move(rng.choice(game.get_valid_moves()))
+        boards.append(game.get_state())
+    step = max(len(boards) // BOARDS_PER_GAME, 1)
+    games.extend(boards[::step])
+
+agents = [
+    (MonteCarloAgent(), LineScore.max_tile()),
+    (EnhancedMonteCarloAgent(), LineScore.empty_and_max()),
+]
+advanced = AdvancedMonteCarloAgent()
+heuristic = LineScore.from_heuristic(advanced.evaluator)
+agents.append((advanced, heuristic))
+agents += [
+    (MonteCarloAgent(rollout_policy=GreedyPolicy()), LineScore.max_tile()),
+    (MonteCarloAgent(rollout_policy=CornerPolicy()), LineScore.max_tile()),
+    (
+        AdvancedMonteCarloAgent(rollout_policy=EpsilonGreedyPolicy(heuristic, 0.2)),
+        heuristic,
+    ),
+]
+
+rollouts = 0
+for agent, line_score in agents:
+    for index, board in enumerate(games):
+        game = Game2048(rng)
+        game.board = board.copy()
+        first_moves = game.get_valid_moves()
+        if not first_moves:
+            continue
+
+        scores = JitSimulator(np.random.default_rng(index)).first_move_rollouts(
+            game.get_packed_state(),
+            first_moves,
+            SEARCHES_PER_MOVE,
+            SEARCH_LENGTH,
+            line_score,
+            agent.rollout_policy,
+        )
+
+        # Same draws, in the order JitSimulator takes them from its generator
+        draws_rng = np.random.default_rng(index)
+        count = len(first_moves) * SEARCHES_PER_MOVE
+        first_draws = draws_rng.random((count, 2))
+        rollout_draws = draws_rng.random((count, DRAWS_PER_STEP * SEARCH_LENGTH))
+
+        for i in range(count):
+            replay = Game2048(rng)
+            replay.board = board.copy()
+            replay.rng = ReplayRng(np.concatenate([first_draws[i], rollout_draws[i]]))
+            replay.move(first_moves[i // SEARCHES_PER_MOVE])
+            expected = agent.simulate(replay, SEARCH_LENGTH)
+            score = scores[i // SEARCHES_PER_MOVE, i % SEARCHES_PER_MOVE]
+            assert np.isclose(score, expected, rtol=1e-12), (board, score, expected)
+            rollouts += 1
+
+print(f"JitEngine ({ENGINE}) matches Game2048 on {rollouts} rollouts")
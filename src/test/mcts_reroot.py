@@ -0,0 +1,88 @@
+"""
+Check that MCTSAgent keeps exactly the subtree of the spawn that happened
+when it re-roots after a move
+
+For seeded games do the following:
+    - Before every re-root, read the subtree of the new root out of the node
+      arrays as nested tuples (board, kind, direction, reward, visits, value
+      and the children in a fixed order)
+    - After the move, read the tree from node 0 the same way and require it to
+      be the same, with no other nodes left and every parent link pointing to
+      the node that lists the child
+    - Also run with a small capacity, so that full trees are re-rooted too
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from Game2048 import Game2048
+from MCTSAgent import MCTSAgent
+
+# Parameters
+MOVES = 60
+SIMULATIONS = 200
+CAPACITIES = (1 << 16, 256)
+SEED = 2048
+
+
+def subtree(agent, node):
+    """The subtree of ``node`` as nested tuples; checks the parent links."""
+    children = []
+    for child in agent._children(node):
+        assert agent.parents[child] == node, (node, child)
+        children.append(subtree(agent, child))
+    return (
+        int(agent.boards[node]),
+        int(agent.kinds[node]),
+        int(agent.directions[node]),
+        float(agent.rewards[node]),
+        int(agent.visits[node]),
+        float(agent.values[node]),
+        tuple(sorted(children)),
+    )
+
+
+def count(tree):
+    return 1 + sum(count(child) for child in tree[-1])
+
+
+reroots = 0
+reused = 0
+for capacity in CAPACITIES:
+    seed = np.random.SeedSequence(SEED)
+    game_seed, agent_seed = seed.spawn(2)
+    game = Game2048(np.random.default_rng(game_seed))
+    agent = MCTSAgent(
+        simulations=SIMULATIONS,
+        capacity=capacity,
+        rng=np.random.default_rng(agent_seed),
+    )
+
+    expected = []
+    reroot = agent._reroot
+
+    def checked_reroot(node):
+        expected.append(None if node is None else subtree(agent, node))
+        reroot(node)
+
+    agent._reroot = checked_reroot
+
+    for _ in range(MOVES):
+        if game.is_game_over():
+            break
+        agent.move(game)
+        tree = expected.pop()
+        if tree is None:
+            assert agent.size == 0
+            continue
+        assert agent.parents[0] == -1 and agent.next_siblings[0] == -1
+        assert agent.boards[0] == game.get_packed_state()
+        assert subtree(agent, 0) == tree
+        assert agent.size == count(tree) == agent.reused_nodes
+        reroots += 1
+        reused += agent.size
+
+print(f"MCTSAgent kept the right subtree in {reroots} re-roots ({reused} nodes)")
@@ -0,0 +1,163 @@
+"""
+Check that QTable folds symmetric boards together and evicts the least
+recently used state of a full bucket
+
+For boards taken from seeded random games do the following:
+    - Set distinct Q-values on a board and read them back from each of its 8
+      rotations and reflections, built with NumPy on the unpacked board, with
+      the directions rotated and reflected along (checked against the moves)
+    - Drive a small table with set, set_many, get and get_many and mirror
+      every call in a plain dict model of per-bucket LRU order
+    - Require the model's states, Q-values and eviction count after every call
+"""
+
+import os
+import sys
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from Game2048 import Game2048
+from Bitboard import DIRECTIONS, SYMMETRY_DIRECTIONS, canonical, encode_board
+from QTable import QTable, WAYS
+
+# Parameters
+GAMES = 10
+CAPACITY = 32
+OPERATIONS = 3000
+BATCH = 6
+SEED = 2048
+
+# np.rot90 turns a board a quarter counterclockwise: a tile that slid left now
+# slides down. np.fliplr swaps left and right
+ROTATE = {"left": "down", "right": "up", "up": "left", "down": "right"}
+FLIP = {"left": "right", "right": "left", "up": "up", "down": "down"}
+
+
+def transforms():
+    """The 8 symmetries as (board function, direction mapping) pairs."""
+    result = []
+    for flip in (False, True):
+        for turns in range(4):
+            mapping = {d: d for d in DIRECTIONS}
+            if flip:
+                mapping = {d: FLIP[d] for d in DIRECTIONS}
+            for _ in range(turns):
+                mapping = {d: ROTATE[mapping[d]] for d in DIRECTIONS}
+
+            def apply(board, flip=flip, turns=turns):
+                return np.rot90(np.fliplr(board) if flip else board, turns)
+
+            result.append((apply, mapping))
+    return result
+
+
+def moved(board, direction):
+    game = Game2048()
+    game.restore((board, 0))
+    return game.peek_move(direction)[0]
+
+
+rng = np.random.default_rng(SEED)
+boards = []
+for _ in range(GAMES):
+    game = Game2048(rng)
+    while not game.is_game_over():
+        game.move(rng.choice(game.get_valid_moves()))
+        boards.append(game.get_state())
+
+# Symmetry folding
+TRANSFORMS = transforms()
+for board in boards[::10]:
+    for apply, mapping in TRANSFORMS:
+        for direction in DIRECTIONS:
+            assert np.array_equal(
+                apply(moved(board, direction)), moved(apply(board), mapping[direction])
+            ), (board, direction)
+
+    table = QTable(CAPACITY)
+    values = rng.standard_normal(4).astype(np.float32)
+    for index, value in enumerate(values):
+        table.set(encode_board(board), index, value)
+    for apply, mapping in TRANSFORMS:
+        packed = encode_board(apply(board))
+        q = table.get(packed)
+        q_many = table.get_many(np.array([packed], dtype=np.uint64))[0]
+        for index, direction in enumerate(DIRECTIONS):
+            expected = values[index]
+            assert q[DIRECTIONS.index(mapping[direction])] == expected, board
+            assert q_many[DIRECTIONS.index(mapping[direction])] == expected, board
+    assert len(table) == 1
+
+# LRU eviction, with Q-values kept in the canonical board's columns (the
+# folding itself is checked above)
+table = QTable(CAPACITY)
+buckets = {}  # Bucket start -> OrderedDict of key -> Q-values, oldest first
+evictions = 0
+
+
+def touch(key):
+    """Mark ``key`` as used in the model, evicting as QTable should."""
+    global evictions
+    bucket = buckets.setdefault(table._bucket(key)[0], OrderedDict())
+    if key in bucket:
+        bucket.move_to_end(key)
+    else:
+        if len(bucket) == WAYS:
+            bucket.popitem(last=False)
+            evictions += 1
+        bucket[key] = np.zeros(4, dtype=np.float32)
+    return bucket[key]
+
+
+def expected_q(board):
+    key, symmetry = canonical(board)
+    q = buckets.get(table._bucket(key)[0], {}).get(key)
+    if q is None:
+        return np.zeros(4, dtype=np.float32)
+    return q[SYMMETRY_DIRECTIONS[symmetry]]
+
+
+packed_boards = np.array([encode_board(board) for board in boards], dtype=np.uint64)
+for step in range(OPERATIONS):
+    picks = packed_boards[rng.integers(len(packed_boards), size=BATCH)]
+    directions = rng.integers(4, size=BATCH)
+    values = rng.standard_normal(BATCH).astype(np.float32)
+    kind = rng.integers(3)
+    if kind == 0:
+        board, direction = int(picks[0]), int(directions[0])
+        table.set(board, direction, values[0])
+        key, symmetry = canonical(board)
+        touch(key)[SYMMETRY_DIRECTIONS[symmetry][direction]] = values[0]
+    elif kind == 1:
+        # New states are inserted first, then every state still present is
+        # written in order, so the last value of a repeated board wins
+        table.set_many(picks, directions, values)
+        keys = [canonical(int(board)) for board in picks]
+        present = {key for bucket in buckets.values() for key in bucket}
+        for key in sorted({key for key, _ in keys} - present):
+            touch(key)
+        for (key, symmetry), direction, value in zip(keys, directions, values):
+            if key in buckets[table._bucket(key)[0]]:
+                touch(key)[SYMMETRY_DIRECTIONS[symmetry][direction]] = value
+    else:
+        # Reads never change the table
+        expected = [expected_q(int(board)) for board in picks]
+        np.testing.assert_array_equal(table.get_many(picks), expected)
+        for board, q in zip(picks, expected):
+            np.testing.assert_array_equal(table.get(int(board)), q)
+
+    # The table holds exactly the model's states and Q-values
+    assert table.evictions == evictions, step
+    assert len(table) == sum(len(bucket) for bucket in buckets.values()), step
+    for bucket in buckets.values():
+        for key, q in bucket.items():
+            slot = table._find(key)
+            assert slot is not None, (step, key)
+            np.testing.assert_array_equal(table.q[slot], q)
+
+print(
+    f"QTable folds the symmetries of {len(boards[::10])} boards and matches the "
+    f"LRU model over {OPERATIONS} calls ({evictions} evictions)"
+)
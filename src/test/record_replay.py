@@ -0,0 +1,136 @@
+"""
+Check that recorded games replay exactly
+
+Play seeded games through run_simulations_in_parallel with a record
+directory and do the following:
+    - Replay every game from its first checkpoint on Game2048 and
+      BitboardGame2048 and compare the final board and score with the
+      recorded ones and with the results the runner returned
+    - Replay up to every checkpoint and compare with the stored board
+    - Cut a game short after its moves were written and check that reopening
+      the writer drops its bytes before appending the next game
+    - Cut an index entry short and check that reopening drops it
+    - Drop a game's log line, as if the run crashed after recording it, and
+      check that resuming plays the game again without recording it twice
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from BitboardGame2048 import BitboardGame2048
+from Bitboard import DIRECTIONS, decode_board
+from Game2048 import Game2048
+from GameRecord import (
+    CHECKPOINT_INTERVAL,
+    GAMES_FILE,
+    MOVES_FILE,
+    GameRecord,
+    GameRecordWriter,
+    GameRecords,
+)
+from MonteCarloAgent import MonteCarloAgent
+from Simulation import run_simulations_in_parallel
+
+# Parameters
+GAMES = 6
+MOVE_ARGS = (4, 4)
+SEED = 2048
+
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "records")
+    log_path = os.path.join(directory, "results.jsonl")
+    run_simulations_in_parallel(
+        MonteCarloAgent(),
+        GAMES,
+        n_jobs=1,
+        move_args=MOVE_ARGS,
+        seed=SEED,
+        log_path=log_path,
+        record_path=path,
+    )
+    records = GameRecords(path)
+    assert len(records) == GAMES
+
+    moves = 0
+    for i, entry in enumerate(records.games):
+        for engine in (Game2048, BitboardGame2048):
+            game = records.replay(i, engine=engine)
+            assert game.get_packed_state() == entry["final_board"], (i, engine)
+            assert game.get_score() == entry["score"], (i, engine)
+            assert game.get_max_tile() == entry["max_tile"], (i, engine)
+            assert game.is_game_over(), (i, engine)
+
+        checkpoints = records.game_checkpoints(i)
+        for k, checkpoint in enumerate(checkpoints):
+            game = records.replay(i, until=k * CHECKPOINT_INTERVAL)
+            assert (game.get_state() == decode_board(int(checkpoint))).all(), (i, k)
+            # Replaying through the previous checkpoint gives the same board
+            if k:
+                until = k * CHECKPOINT_INTERVAL
+                game = records.replay(i, until=until - 1)
+                direction, cell, rank, _ = records.game_moves(i)[until - 1].tolist()
+                game.apply_move(DIRECTIONS[direction], (cell, 1 << rank))
+                assert game.get_packed_state() == int(checkpoint), (i, k)
+        moves += int(entry["moves"])
+
+    assert records.direction_counts().sum() == moves
+    assert sorted(records.games["game"].tolist()) == list(range(GAMES))
+    del records
+
+    # A crash between a game's moves and its index entry
+    game = Game2048(np.random.default_rng(SEED))
+    record = GameRecord(game)
+    for _ in range(10):
+        score = game.score
+        direction = game.get_valid_moves()[0]
+        game.move(direction)
+        record.add_move(game, direction, game.score - score)
+    record.finish(game)
+    with open(os.path.join(path, MOVES_FILE), "ab") as f:
+        f.write(b"\x01" * 21)  # Three moves of a game that never finished
+    writer = GameRecordWriter(path)
+    writer.append(GAMES, record)
+    writer.close()
+    records = GameRecords(path)
+    assert len(records) == GAMES + 1
+    replayed = records.replay(GAMES)
+    assert replayed.get_packed_state() == game.get_packed_state()
+    assert replayed.get_score() == game.get_score()
+    del records, replayed
+
+    # A crash in the middle of an index entry
+    with open(os.path.join(path, GAMES_FILE), "ab") as f:
+        f.write(b"\x02" * 10)
+    writer = GameRecordWriter(path)
+    writer.append(GAMES + 1, record)
+    writer.append(GAMES + 1, record)  # Already recorded, skipped
+    writer.close()
+    records = GameRecords(path)
+    assert len(records) == GAMES + 2
+    assert records.replay(GAMES + 1).get_packed_state() == game.get_packed_state()
+    del records
+
+    # A crash after a game was recorded but before its log line was written
+    with open(log_path) as f:
+        lines = f.readlines()
+    with open(log_path, "w") as f:
+        f.writelines(lines[:-1])
+    run_simulations_in_parallel(
+        MonteCarloAgent(),
+        GAMES,
+        n_jobs=1,
+        move_args=MOVE_ARGS,
+        seed=SEED,
+        log_path=log_path,
+        record_path=path,
+    )
+    records = GameRecords(path)
+    assert len(records) == GAMES + 2
+    assert sorted(records.games["game"].tolist()) == list(range(GAMES + 2))
+    del records
+
+print(f"Replayed {GAMES} recorded games ({moves} moves) exactly")
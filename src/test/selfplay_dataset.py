@@ -0,0 +1,72 @@
+"""
+Check that self-play transitions match the games they came from
+
+Generate a small dataset from seeded games in shards smaller than a game and
+do the following:
+    - Require one transition per recorded move
+    - Within every game, require each next_state to be the following state,
+      the rewards to add up to the score and the last transition to be done
+    - Stream one epoch of minibatches and require every transition exactly once
+    - Train an offline Q-learning agent on the stream
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from GameRecord import GameRecords
+from MonteCarloAgent import MonteCarloAgent
+from SelfPlayDataset import (
+    RECORDS_DIR,
+    TransitionDataset,
+    generate_dataset,
+    train_offline,
+)
+
+# Parameters
+GAMES = 4
+MOVE_ARGS = (4, 4)
+SHARD_SIZE = 100
+BATCH_SIZE = 32
+SEED = 2048
+
+with tempfile.TemporaryDirectory() as path:
+    count = generate_dataset(
+        MonteCarloAgent(),
+        path,
+        GAMES,
+        move_args=MOVE_ARGS,
+        n_jobs=1,
+        seed=SEED,
+        shard_size=SHARD_SIZE,
+    )
+    records = GameRecords(os.path.join(path, RECORDS_DIR))
+    dataset = TransitionDataset(path)
+    assert count == len(dataset) == len(records.moves)
+    assert len(dataset.shards) == -(-count // SHARD_SIZE)
+
+    transitions = np.concatenate([np.asarray(shard) for shard in dataset.shards])
+    start = 0
+    for entry in records.games:
+        game = transitions[start : start + int(entry["moves"])]
+        assert (game["state"][1:] == game["next_state"][:-1]).all()
+        assert game["reward"].sum() == entry["score"]
+        assert game["next_state"][-1] == entry["final_board"]
+        assert game["done"][-1] and not game["done"][:-1].any()
+        start += len(game)
+
+    seen = np.concatenate(
+        list(dataset.minibatches(BATCH_SIZE, np.random.default_rng(SEED)))
+    )
+    assert np.array_equal(
+        np.sort(seen, order=["state", "action", "next_state"]),
+        np.sort(transitions, order=["state", "action", "next_state"]),
+    )
+
+    agent = train_offline(dataset, epochs=2, batch_size=BATCH_SIZE, seed=SEED)
+    assert len(agent.q_table) > 0
+
+print(f"Self-play dataset matches {GAMES} recorded games ({count} transitions)")
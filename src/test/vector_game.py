@@ -0,0 +1,106 @@
+"""
+Check that VectorGame2048 steps every game exactly like Game2048
+
+For seeded runs of K games with random actions (valid or not) do the
+following, once for each reward:
+    - Record the uniforms the environment draws for its tile spawns
+    - Replay every game's step on a Game2048 that draws the same uniforms
+    - Require the same next board, reward, valid moves and done flag, and a
+      finished game's score in finished_scores
+    - Require a finished game's next board to be the new game a reset
+      Game2048 draws from the same uniforms
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from Game2048 import Game2048
+from Bitboard import DIRECTIONS
+from VectorGame2048 import INVALID_MOVE_REWARD, REWARDS, VectorGame2048
+
+# Parameters
+NUM_GAMES = 16
+STEPS = 600
+SEED = 2048
+
+
+class RecordingRng:
+    """Generator that keeps the uniform arrays it hands out."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = []
+
+    def random(self, size=None):
+        draws = self.rng.random(size)
+        self.draws.append(draws)
+        return draws
+
+
+class ReplayRng:
+    """Stands in for a Generator, returning recorded uniforms in order."""
+
+    def __init__(self, draws):
+        self.draws = iter(draws)
+
+    def random(self):
+        return next(self.draws)
+
+
+def new_game(draws, index):
+    """The Game2048 a reset draws from spawn rounds ``draws`` at ``index``."""
+    return Game2048(ReplayRng(draw[index] for draw in draws))
+
+
+rng = np.random.default_rng(SEED)
+steps = 0
+finished = 0
+for reward in REWARDS:
+    recording = RecordingRng(np.random.default_rng(rng.integers(2**32)))
+    env = VectorGame2048(NUM_GAMES, recording, reward)
+    boards = env.boards.copy()
+    games = [new_game(recording.draws, i) for i in range(NUM_GAMES)]
+    for i, game in enumerate(games):
+        assert game.get_packed_state() == boards[i], i
+    run_finished = 0
+
+    for _ in range(STEPS):
+        actions = rng.integers(4, size=NUM_GAMES)
+        recording.draws = []
+        next_boards, rewards, next_valid, dones = env.step(actions)
+        spawns = recording.draws[:2]  # The step's pick and rank uniforms
+        resets = recording.draws[2:]  # Two spawn rounds for the finished games
+
+        done_index = 0
+        for i, game in enumerate(games):
+            before = game.get_state()
+            score = game.get_score()
+            game.rng = ReplayRng(draw[i] for draw in spawns)
+            if game.move(DIRECTIONS[actions[i]]):
+                if reward == "tile_sum":
+                    expected = np.sum(game.get_state()) - np.sum(before)
+                else:
+                    expected = game.get_score() - score
+            else:
+                expected = INVALID_MOVE_REWARD
+            assert rewards[i] == expected, (reward, i)
+            assert dones[i] == game.is_game_over(), (reward, i)
+
+            if dones[i]:
+                assert env.finished_scores[run_finished] == game.get_score()
+                run_finished += 1
+                game = games[i] = new_game(resets, done_index)
+                done_index += 1
+            assert next_boards[i] == game.get_packed_state(), (reward, i)
+            mask = sum(1 << d for d, v in enumerate(next_valid[i]) if v)
+            assert mask == game.valid_move_mask(), (reward, i)
+        steps += 1
+    finished += run_finished
+
+print(
+    f"VectorGame2048 matches Game2048 on {steps * NUM_GAMES} steps "
+    f"({finished} games finished and reset)"
+)